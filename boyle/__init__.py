@@ -3,8 +3,10 @@ __version__ = "0.6.3"
 # Set up imports
 
 from boyle.core.generic import Dataset, SimulationResult
+from boyle.core.store import ScenarioStore
 from boyle.core import save, load
 from boyle.manager import Manager
+from boyle.plant import Plant
 
 # Set up imports from api in submodules
 from boyle import preprocessing
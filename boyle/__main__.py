@@ -0,0 +1,5 @@
+import sys
+
+from boyle.cli import main
+
+sys.exit(main())
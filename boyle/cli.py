@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+"""
+Command Line
+
+Batch runner for job specifications in the format of
+simulation.yaml. Every YAML file holds one job, a sweep section
+expands it into one job for every combination of its values.
+
+    python -m boyle job.yaml [job.yaml ...] --output results --jobs 4
+
+The jobs run in parallel worker processes. Every job is written
+to <output>/<name>.hdf5 by boyle.core.save in the output profile
+chosen by --profile as soon as it is done and reported with its
+wall time. With --store the results are collected in a scenario
+store instead, see boyle.core.store. A summary table of all jobs
+is printed at the end and can be written to a csv file as well.
+"""
+
+import os
+import sys
+import csv
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from boyle.core import save
+from boyle.core.store import ScenarioStore, scenario_key, scenario_inputs
+from boyle.config import load_config, load_dataset, manager_settings, \
+    data_path, expand_sweep
+from boyle.manager import Manager
+
+# Columns of the summary table
+SUMMARY_COLUMNS = ("name", "status", "rows", "t_end", "elapsed", "output",
+                   "parameters")
+
+
+def expand_jobs(paths):
+    """Jobs of YAML files with their sweeps expanded
+
+    Jobs are named after their metadata or their file, names that
+    occur more than once are numbered.
+    """
+    jobs = []
+    names = {}
+    for path in paths:
+        config = load_config(path)
+        metadata = config.setdefault("metadata", {})
+        metadata.setdefault("name", os.path.splitext(
+            os.path.basename(path))[0])
+        for job in expand_sweep(config):
+            name = job["metadata"]["name"]
+            if name in names:
+                names[name] += 1
+                job["metadata"]["name"] = "{}_{}".format(name, names[name])
+            else:
+                names[name] = 0
+            jobs.append(job)
+    return jobs
+
+
+def run_job(config, output=None, internals=False, profile="full",
+            store=None):
+    """Run a job and write its result to the output folder
+
+    With a store, the result is written to the scenario store in
+    that folder instead and the report carries the index record of
+    the run, which the writer of the store appends.
+    """
+    start = time.perf_counter()
+    metadata = config.get("metadata")
+    parameters = metadata.get("parameters") or {}
+    report = dict(name=metadata.get("name"), status="done", rows=0,
+                  t_end=None, output=None,
+                  parameters=" ".join("{}={}".format(key, value)
+                                      for key, value in parameters.items()))
+    record = None
+    try:
+        settings = manager_settings(config)
+        dataset = load_dataset(data_path(config))
+        if store is not None:
+            record = dict(key=scenario_key(config, dataset),
+                          name=report.get("name"),
+                          file=None, parameters=parameters,
+                          inputs=scenario_inputs(dataset, settings))
+        manager = Manager(dataset, **settings)
+        frame = manager.start()
+    except (IOError, ValueError) as e:
+        report.update(status="failed: {}".format(e))
+    else:
+        report.update(rows=len(manager.result))
+        if manager.result:
+            report.update(t_end=float(manager.result[-1][1]))
+        if isinstance(frame, dict):
+            report.update(status="failed: {}".format(
+                frame.get("error", "pH diverging")))
+        elif store is not None:
+            record.update(file=ScenarioStore(store).write_run(
+                record.get("key"), frame, internals, profile))
+            report.update(output=os.path.join(store, record.get("file")))
+        elif output is not None:
+            path = os.path.join(output, "{}.hdf5".format(report.get("name")))
+            save.to_hdf5(path, frame, internals=internals, profile=profile)
+            report.update(output=path)
+    if record is not None:
+        record.update(status=report.get("status"), rows=report.get("rows"),
+                      t_end=report.get("t_end"))
+        report.update(record=record)
+    report.update(elapsed=time.perf_counter() - start)
+    return report
+
+
+def run_batch(jobs, output=None, processes=1, internals=False,
+              stream=sys.stdout, profile="full", store=None):
+    """Run jobs and return their reports in the order of the jobs
+
+    Every report is printed as soon as its job is done. With a
+    store, the results go to the scenario store in that folder and
+    this process indexes them as the single writer.
+    """
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+    writer = ScenarioStore(store) if store is not None else None
+    reports = [None] * len(jobs)
+
+    def done(idx, report):
+        reports[idx] = report
+        if writer is not None and report.get("record") is not None:
+            writer.append(report.get("record"))
+        if stream is not None:
+            print("{name}: {status} in {elapsed:.2f} s".format(**report),
+                  file=stream, flush=True)
+
+    if processes > 1:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = {pool.submit(run_job, job, output, internals,
+                                   profile, store): idx
+                       for idx, job in enumerate(jobs)}
+            for future in as_completed(futures):
+                done(futures.get(future), future.result())
+    else:
+        for idx, job in enumerate(jobs):
+            done(idx, run_job(job, output, internals, profile, store))
+    return reports
+
+
+def format_summary(reports):
+    """Summary table of the reports of a batch"""
+    rows = [[str(report.get(key) if report.get(key) is not None else "")
+             for key in SUMMARY_COLUMNS] for report in reports]
+    for row, report in zip(rows, reports):
+        row[SUMMARY_COLUMNS.index("elapsed")] = \
+            "{:.2f}".format(report.get("elapsed"))
+    widths = [max([len(key)] + [len(row[idx]) for row in rows])
+              for idx, key in enumerate(SUMMARY_COLUMNS)]
+    lines = [[key for key in SUMMARY_COLUMNS],
+             ["-" * width for width in widths]] + rows
+    return "\n".join("  ".join(item.ljust(width) for item, width in
+                               zip(line, widths)).rstrip()
+                     for line in lines)
+
+
+def write_summary(path, reports):
+    """Write the reports of a batch to a csv file"""
+    with open(path, "w", newline="") as stream:
+        writer = csv.DictWriter(stream, fieldnames=SUMMARY_COLUMNS,
+                                extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(reports)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="boyle", description="Run simulation.yaml jobs.")
+    parser.add_argument("config", nargs="+", help="YAML job files")
+    parser.add_argument("-o", "--output", default="results",
+                        help="Folder of the HDF5 results")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="Number of jobs run in parallel")
+    parser.add_argument("--internals", action="store_true",
+                        help="Store henry constants and growth rates")
+    parser.add_argument("--profile", default="full",
+                        choices=sorted(save.OUTPUT_PROFILES),
+                        help="Output profile of the HDF5 results")
+    parser.add_argument("--store",
+                        help="Folder of a scenario store for the results")
+    parser.add_argument("--summary", help="csv file of the summary table")
+    args = parser.parse_args(argv)
+    # --
+    reports = run_batch(expand_jobs(args.config), output=args.output,
+                        processes=args.jobs, internals=args.internals,
+                        profile=args.profile, store=args.store)
+    print()
+    print(format_summary(reports))
+    if args.summary:
+        write_summary(args.summary, reports)
+    return 0 if all(report.get("status") == "done"
+                    for report in reports) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+
+"""
+Simulation Configuration
+
+Reading of job specifications in the format of simulation.yaml.
+A job has a metadata section naming the job and the folder of
+its input data and a settings section with the step size, the pH
+and the solver settings. The settings are translated into the
+keyword arguments of the Manager.
+
+An optional sweep section lists values for settings given as
+dotted paths into the job, e.g.
+
+    sweep:
+        settings.step_size: [0.5, 1.0]
+        settings.ph.method: [fixed, fsolve]
+
+and expands the job into one job for every combination.
+"""
+
+import os
+import copy
+import itertools
+
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.core.model import get_model
+from boyle.manager import STANDARD_PH, STANDARD_SOLVER, RECOVERY
+
+# Solver settings that are named differently in simulation.yaml
+SOLVER_KEYS = {"relative": "rtol", "absolute": "atol"}
+
+# Datasets of the data folders loaded by this process. The runs
+# do not change a Dataset, so it is shared by all jobs.
+_datasets = {}
+
+
+def load_config(path):
+    """Load a job specification from a YAML file
+
+    A relative data path in the metadata is taken relative to
+    the folder of the file.
+    """
+    import yaml
+    with open(path, "r") as stream:
+        config = yaml.safe_load(stream)
+    metadata = config.setdefault("metadata", {})
+    data = metadata.get("data")
+    if data and not os.path.isabs(data):
+        metadata["data"] = os.path.normpath(
+            os.path.join(os.path.dirname(os.path.abspath(path)), data))
+    return config
+
+
+def solver_settings(settings, model="standard"):
+    """Solver settings of the Manager from a solver section
+
+    Settings left out are those of the model or STANDARD_SOLVER.
+    """
+    default = get_model(model)
+    solver = dict(default and default.solver or STANDARD_SOLVER)
+    for key, value in (settings or {}).items():
+        key = SOLVER_KEYS.get(key, key)
+        if key != "method" and isinstance(value, str):
+            # YAML reads numbers like 1e-4 as strings
+            value = float(value)
+        solver[key] = value
+    return solver
+
+
+def manager_settings(config):
+    """Keyword arguments of the Manager from a job specification"""
+    settings = config.get("settings") or {}
+    model = settings.get("model", "standard")
+    return dict(ph=dict(STANDARD_PH, **(settings.get("ph") or {})),
+                solver=solver_settings(settings.get("solver"), model),
+                step_size=float(settings.get("step_size", 0.5)),
+                model=model,
+                integrator=settings.get("integrator", "vode"),
+                diagnostics=bool(settings.get("diagnostics", True)),
+                profile=settings.get("profile"),
+                steady_state=settings.get("steady_state"),
+                recovery=RECOVERY if settings.get("recovery", True) else (),
+                events=settings.get("events") or ())
+
+
+def data_path(config):
+    """Folder of the input data of a job specification"""
+    data = (config.get("metadata") or {}).get("data")
+    if not data:
+        raise ValueError("The job specification has no data path")
+    return data
+
+
+def load_dataset(path):
+    """Dataset of a data folder, loaded once by every process"""
+    path = os.path.abspath(path)
+    if path not in _datasets:
+        _datasets[path] = Dataset(**from_localpath(path))
+    return _datasets.get(path)
+
+
+def expand_sweep(config):
+    """Jobs for every combination of the values of a sweep
+
+    The name of every job is suffixed with its number and the
+    swept values are kept as parameters in its metadata.
+    """
+    sweep = config.get("sweep")
+    if not sweep:
+        return [config]
+    keys = list(sweep)
+    jobs = []
+    for idx, values in enumerate(itertools.product(
+            *[sweep.get(key) for key in keys])):
+        job = copy.deepcopy(config)
+        job.pop("sweep")
+        metadata = job.setdefault("metadata", {})
+        for key, value in zip(keys, values):
+            *parents, leaf = key.split(".")
+            section = job
+            for parent in parents:
+                section = section.setdefault(parent, {})
+            section[leaf] = value
+        metadata["name"] = "{}_{:03d}".format(metadata.get("name", "job"), idx)
+        metadata["parameters"] = dict(zip(keys, values))
+        jobs.append(job)
+    return jobs
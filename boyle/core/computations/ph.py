@@ -1,6 +1,10 @@
 #!/usr/bin/env/python
 
 
+import os
+import hashlib
+
+import numpy as np
 from numpy import log10
 from scipy.optimize import fsolve, brentq
 
@@ -100,3 +104,269 @@ def find_roots(data, guess=1e-8):
     # in the computation engine for pH.
     pH = - log10(x_H)
     return pH
+
+
+def solve(ph_mode, data, H=1e-8):
+    """Compute the pH with the method of the pH settings
+
+    Returns the pH together with the hydrogen ion concentration
+    used by the model. Only the Newton-Raphson iteration updates
+    H, the other methods keep the initial value.
+    """
+    if ph_mode.method == "newton-raphson":
+        Hfunc = 1
+        pH = None
+        while abs(Hfunc - H) > 1e-12 or pH is None:
+            H, Hfunc = newton_raphson(H, Hfunc, **data)
+            pH = - log10(Hfunc)
+    elif ph_mode.method == "fsolve":
+        pH = find_roots(data=data)
+    elif ph_mode.method == "brentq":
+        pH = brent_dekker(data=data)
+    elif ph_mode.method == "surrogate":
+        pH = surrogate(data=data, newton_steps=int(ph_mode.value or 0))
+    elif ph_mode.method == "fixed":
+        pH = ph_mode.value
+    else:
+        print("Unknown method")
+        raise ValueError("Unknown pH method {}".format(ph_mode.method))
+    return pH, H
+
+
+def charge_balance(co2, hac, hpr, hbut, hval, a, z, h2po4, nh3,
+                   henry_constants):
+    """Arguments of the pH computations from the concentrations
+
+    The concentrations are numbers or arrays of one shape, the acid
+    constants are taken from the henry constants.
+    """
+    hc = henry_constants
+    return {"co2": [co2, hc.get("ka1_co2"), hc.get("ka2_co2")],
+            "HAc": [hac, hc.get("ka_hac")], "HPr": [hpr, hc.get("ka_hpr")],
+            "HBut": [hbut, hc.get("ka_hbut")],
+            "HVal": [hval, hc.get("ka_hval")],
+            "Other": [a, z, hc.get("kw")],
+            "h2po4": [h2po4, hc.get("ka_h2po4")],
+            "NH3": [nh3, hc.get("ka_nh4")]}
+
+
+def state_charge_balance(y, henry_constants):
+    """Arguments of the pH computations for reactor states
+
+    The 33 reactor states run along the last axis of y.
+    """
+    y = np.asarray(y)
+    return charge_balance(y[..., 15], y[..., 12], y[..., 9], y[..., 10],
+                          y[..., 11], y[..., 19], y[..., 17], y[..., 18],
+                          y[..., 13], henry_constants)
+
+
+def sensitivities(H, **kwargs):
+    """Charge balance with its derivatives
+
+    Returns Hfunc of the charge balance, its derivative in H and
+    its derivatives in the concentrations. The concentrations are
+    keyed like the arguments, with "a" and "z" for the two ions
+    of "Other".
+    """
+    co2, ka1_co2, ka2_co2 = kwargs.get("co2")
+    hac, ka_hac = kwargs.get("HAc")
+    hpr, ka_hpr = kwargs.get("HPr")
+    hbut, ka_hbut = kwargs.get("HBut")
+    hval, ka_hval = kwargs.get("HVal")
+    a, z, kw = kwargs.get("Other")
+    h2po4, ka_h2po4 = kwargs.get("h2po4")
+    nh3, ka_nh4 = kwargs.get("NH3")
+    # --
+    partials = {
+        "co2": ka1_co2 * (H + 2 * ka2_co2) /
+        (H * (H + ka1_co2) + ka1_co2 * ka2_co2) / 44,
+        "HAc": ka_hac / (H + ka_hac) / 60,
+        "HPr": ka_hpr / (H + ka_hpr) / 74,
+        "HBut": ka_hbut / (H + ka_hbut) / 88,
+        "HVal": ka_hval / (H + ka_hval) / 102,
+        "a": 1 / 35.5,
+        "z": - 1 / 39,
+        "h2po4": (H + 2 * ka_h2po4) / (H + ka_h2po4) / 31,
+        "NH3": - H / (H + ka_nh4) / 14}
+    Hfunc = co2 * partials["co2"] + hac * partials["HAc"] + \
+        hpr * partials["HPr"] + hbut * partials["HBut"] + \
+        hval * partials["HVal"] + a * partials["a"] + z * partials["z"] + \
+        h2po4 * partials["h2po4"] + nh3 * partials["NH3"] + kw / H
+    # --
+    dhfunc_dh = - co2 / 44 * ka1_co2 * (H * (H + 4 * ka2_co2) + ka1_co2 *
+                                        ka2_co2) / (H * (H + ka1_co2) +
+                                                    ka1_co2 * ka2_co2)**2 - \
+        hac / 60 * ka_hac / (H + ka_hac)**2 - \
+        hpr / 74 * ka_hpr / (H + ka_hpr)**2 - \
+        hbut / 88 * ka_hbut / (H + ka_hbut)**2 - \
+        hval / 102 * ka_hval / (H + ka_hval)**2 - \
+        kw / (H**2) - \
+        h2po4 / 31 * ka_h2po4 / (H + ka_h2po4)**2 - \
+        nh3 / 14 * ka_nh4 / (H + ka_nh4)**2
+    return Hfunc, dhfunc_dh, partials
+
+
+# pH grid of the surrogate tables and the directory the tables
+# are cached in. The cache directory can also be given through
+# the BOYLE_PH_CACHE environment variable.
+SURROGATE_GRID = np.linspace(0, 14, 2801)
+SURROGATE_CACHE_DIR = os.environ.get("BOYLE_PH_CACHE")
+_surrogate_tables = {}
+
+
+def surrogate_table(data, cache_dir=None):
+    """Charge balance tabulated over the pH grid
+
+    Hfunc is linear in the concentrations, so for a given set of
+    acid constants, i.e. a temperature, it is tabulated as one
+    column per concentration and a constant column holding
+    kw / H - H. The tables are kept in memory and, when a cache
+    directory is set, on disk.
+    """
+    _, ka1_co2, ka2_co2 = data.get("co2")
+    _, ka_hac = data.get("HAc")
+    _, ka_hpr = data.get("HPr")
+    _, ka_hbut = data.get("HBut")
+    _, ka_hval = data.get("HVal")
+    _, _, kw = data.get("Other")
+    _, ka_h2po4 = data.get("h2po4")
+    _, ka_nh4 = data.get("NH3")
+    key = np.array([ka1_co2, ka2_co2, ka_hac, ka_hpr, ka_hbut, ka_hval,
+                    kw, ka_h2po4, ka_nh4], dtype=float)
+    digest = hashlib.sha1(key.tobytes() +
+                          SURROGATE_GRID.tobytes()).hexdigest()
+    if digest in _surrogate_tables:
+        return _surrogate_tables.get(digest)
+    # --
+    cache_dir = cache_dir or SURROGATE_CACHE_DIR
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, "ph_surrogate_{}.npy".format(digest))
+    if path and os.path.exists(path):
+        table = np.load(path)
+    else:
+        H = 10**(-SURROGATE_GRID)
+        ones = np.ones_like(H)
+        table = np.stack([
+            ka1_co2 * (H + 2 * ka2_co2) /
+            (H * (H + ka1_co2) + ka1_co2 * ka2_co2) / 44,
+            ka_hac / (H + ka_hac) / 60,
+            ka_hpr / (H + ka_hpr) / 74,
+            ka_hbut / (H + ka_hbut) / 88,
+            ka_hval / (H + ka_hval) / 102,
+            ones / 35.5,
+            - ones / 39,
+            (H + 2 * ka_h2po4) / (H + ka_h2po4) / 31,
+            - H / (H + ka_nh4) / 14,
+            kw / H - H], axis=1)
+        if path:
+            os.makedirs(cache_dir, exist_ok=True)
+            np.save(path, table)
+    _surrogate_tables[digest] = table
+    return table
+
+
+def surrogate(data, newton_steps=0, cache_dir=None):
+    """Compute pH by interpolation in the surrogate table
+
+    The root of the charge balance is located on the pH grid and
+    interpolated linearly. Each of the optional Newton steps of
+    newton_raphson refines the result further. Roots outside of
+    the grid fall back to find_roots.
+    """
+    table = surrogate_table(data, cache_dir)
+    conc = np.array([data.get("co2")[0], data.get("HAc")[0],
+                     data.get("HPr")[0], data.get("HBut")[0],
+                     data.get("HVal")[0], data.get("Other")[0],
+                     data.get("Other")[1], data.get("h2po4")[0],
+                     data.get("NH3")[0], 1.], dtype=float)
+    # Hfunc - H increases with the pH
+    balance = table @ conc
+    idx = np.searchsorted(balance, 0.)
+    if idx == 0 or idx == balance.size:
+        return find_roots(data=data)[0]
+    low, high = balance[idx - 1], balance[idx]
+    pH = SURROGATE_GRID[idx - 1] + (SURROGATE_GRID[idx] -
+                                    SURROGATE_GRID[idx - 1]) * \
+        -low / (high - low)
+    H = 10**(-pH)
+    for _ in range(newton_steps):
+        H, _ = newton_raphson(H, None, **data)
+    return - log10(H)
+
+
+def _concentrations(data):
+    """Concentrations in the column order of the surrogate table"""
+    return np.stack(np.broadcast_arrays(
+        data.get("co2")[0], data.get("HAc")[0], data.get("HPr")[0],
+        data.get("HBut")[0], data.get("HVal")[0], data.get("Other")[0],
+        data.get("Other")[1], data.get("h2po4")[0], data.get("NH3")[0],
+        1.), axis=-1).astype(float)
+
+
+def _select(data, mask):
+    """Arguments of the elements of mask"""
+    return {key: [value[mask] if np.ndim(value) else value
+                  for value in values] for key, values in data.items()}
+
+
+def surrogate_array(data, newton_steps=0, cache_dir=None):
+    """Array-aware version of surrogate
+
+    The concentrations in data are arrays of one shape, the acid
+    constants are scalars. Elements without a root on the grid are
+    solved by find_roots one by one.
+    """
+    table = surrogate_table(data, cache_dir)
+    conc = _concentrations(data)
+    balance = conc @ table.T
+    idx = np.argmax(balance >= 0., axis=-1)
+    inside = (idx > 0) & (balance[..., -1] >= 0.)
+    idx = np.where(inside, idx, 1)
+    low = np.take_along_axis(balance, idx[..., None] - 1, axis=-1)[..., 0]
+    high = np.take_along_axis(balance, idx[..., None], axis=-1)[..., 0]
+    pH = SURROGATE_GRID[idx - 1] + (SURROGATE_GRID[idx] -
+                                    SURROGATE_GRID[idx - 1]) * \
+        -low / (high - low)
+    # -- only the elements with a root on the grid are refined
+    H = 10**(-pH[inside])
+    for _ in range(newton_steps):
+        H, _ = newton_raphson(H, None, **_select(data, inside))
+    pH[inside] = - log10(H)
+    for index in zip(*np.nonzero(~inside)):
+        item = {key: [value[index] if np.ndim(value) else value
+                      for value in values] for key, values in data.items()}
+        pH[index] = find_roots(data=item)[0]
+    return pH
+
+
+def solve_array(ph_mode, data, H=1e-8, max_iterations=100):
+    """Array-aware version of solve
+
+    The concentrations in data are arrays of one shape and the
+    acid constants scalars. Every element follows the iteration of
+    solve, fsolve and brentq are replaced by the root of the
+    surrogate table refined by Newton steps.
+    """
+    shape = np.shape(_concentrations(data))[:-1]
+    H = np.full(shape, H, dtype=float)
+    if ph_mode.method == "newton-raphson":
+        Hfunc = np.ones(shape)
+        active = np.ones(shape, dtype=bool)
+        for _ in range(max_iterations):
+            if not active.any():
+                break
+            H[active], Hfunc[active] = newton_raphson(
+                H[active], None, **_select(data, active))
+            active &= np.abs(Hfunc - H) > 1e-12
+        pH = - log10(Hfunc)
+    elif ph_mode.method in ("fsolve", "brentq"):
+        pH = surrogate_array(data, newton_steps=3)
+    elif ph_mode.method == "surrogate":
+        pH = surrogate_array(data, newton_steps=int(ph_mode.value or 0))
+    elif ph_mode.method == "fixed":
+        pH = np.full(shape, ph_mode.value, dtype=float)
+    else:
+        raise ValueError("Unknown pH method {}".format(ph_mode.method))
+    return pH, H
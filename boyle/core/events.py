@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+
+"""
+Events
+
+Threshold crossings of the reactor state watched by the Manager
+during a run. An event names a column of the solution output, see
+OUTPUT_HEADERS, or the pH computed from the state, and a threshold
+crossed in a direction:
+
+    up      the value rises above the threshold
+    down    the value falls below the threshold
+    both    either of them
+
+e.g. Event("ac_ace", 2.5, "up") or Event("pH", 6.8, "down",
+terminal=True). The Manager compares the values at the ends of
+every output step and locates a crossing between them by the
+root-finding of a solve_ivp integration of the step, so the times
+are exact on coarse output grids as well. A value returning over
+the threshold within a single output step is not seen. A terminal
+event ends the run at its crossing, the others are recorded and
+the run goes on.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+import scipy.integrate
+
+from boyle.core.computations import ph
+from boyle.core.save import OUTPUT_HEADERS
+
+Event = namedtuple("Event", "column threshold direction terminal name",
+                   defaults=("both", False, None))
+
+EVENT_DIRECTIONS = {"up": 1, "down": -1, "both": 0}
+# Columns events can watch, the states of a solution row and the pH
+EVENT_COLUMNS = OUTPUT_HEADERS.get("solution")[2:35] + ["pH"]
+
+
+def create_event(event):
+    """Event from an Event, a dict or a tuple, checked and named"""
+    if isinstance(event, dict):
+        event = Event(**event)
+    elif not isinstance(event, Event):
+        event = Event(*event)
+    if event.column not in EVENT_COLUMNS:
+        raise ValueError("Unknown event column {}".format(event.column))
+    if event.direction not in EVENT_DIRECTIONS:
+        raise ValueError("Unknown event direction {}".format(event.direction))
+    return event._replace(threshold=float(event.threshold),
+                          name=event.name or "{} {} {}".format(
+                              event.column, event.direction,
+                              event.threshold))
+
+
+def state_ph(y, henry_constants, ph_mode):
+    """pH of a reactor state"""
+    _data = ph.state_charge_balance(y, henry_constants)
+    return float(np.ravel(ph.solve(ph_mode, _data)[0])[0])
+
+
+def event_values(events, y, henry_constants, ph_mode):
+    """Distance of the watched values of a state to the thresholds"""
+    values = []
+    for event in events:
+        if event.column == "pH":
+            value = state_ph(y, henry_constants, ph_mode)
+        else:
+            value = y[EVENT_COLUMNS.index(event.column)]
+        values.append(value - event.threshold)
+    return np.array(values)
+
+
+def crossed(event, before, after):
+    """Whether a distance to the threshold changes sign in direction"""
+    if before < 0 <= after:
+        return event.direction in ("up", "both")
+    if before >= 0 > after:
+        return event.direction in ("down", "both")
+    return False
+
+
+def locate(function, args, t0, y0, t1, conditions, settings, jacobian=None):
+    """Crossings of the conditions on the step from t0 to t1
+
+    PARAMETERS
+    ----------
+    function : callable
+        Right-hand side called as function(t, y, *args)
+    conditions : list
+        (event, g) of the crossed events with g(t, y) the distance
+        of the watched value to the threshold
+    settings : dict
+        Tolerances of the integration of the step
+
+    Returns (time, state, event) of every crossing in time order.
+    """
+    functions = []
+    for event, g in conditions:
+        def condition(t, y, *_, g=g):
+            return g(t, y)
+        condition.direction = EVENT_DIRECTIONS.get(event.direction)
+        functions.append(condition)
+    options = {key: value for key, value in settings.items()
+               if key in ("rtol", "atol")}
+    if jacobian is not None:
+        options["jac"] = jacobian
+    solution = scipy.integrate.solve_ivp(
+        function, (t0, t1), y0, method="BDF", args=tuple(args),
+        events=functions, **options)
+    found = [(time, state, event) for (event, _), times, states in zip(
+        conditions, solution.t_events or [], solution.y_events or [])
+        for time, state in zip(times, states)]
+    return sorted(found, key=lambda item: item[0])
@@ -32,9 +32,15 @@ pHvalue = namedtuple("pH", "method value")
 
 class Dataset:
     def __init__(self, **kwargs):
-        """Set up Frame for setting up process information"""
-        self.mu_max_data = []
-        self.hc_data = []
+        """Set up Frame for setting up process information
+
+        The Dataset holds the inputs of a simulation and is not
+        changed by running it. The state of a run is kept in a
+        RunContext, so one Dataset can back many runs.
+        """
+        # Temperature dependent constants are computed once for
+        # every distinct temperature and shared afterwards
+        self._temperature_constants = {}
         # --
         for kw in kwargs:
             payload = {"name": kw, "value": kwargs.get(kw)}
@@ -105,40 +111,112 @@ class Dataset:
         """Compute Temperature Dependent Constants"""
         payload, mmax = mu_max_standard(self.Const1.get("value"),
                                         temp=temp)
-        setattr(self, "mu_max", mmax)
-        # --
-        self.mu_max.update(payload)
         # --
-        self.mu_max_data.append(payload.get("params"))
+        mmax.update(payload)
+        return mmax
 
     def __recompute_hconstants(self, temp):
         """Compute henry constants"""
-        hc, henry_c = computeHenryConstant(arr=self.Const2.get("value"),
-                                           temp=temp)
-        setattr(self, "henry_constants", hc)
-        self.hc_data.append(henry_c)
+        return computeHenryConstant(arr=self.Const2.get("value"),
+                                    temp=temp)
+
+    def temperature_constants(self, temp):
+        """Growth rates and henry constants at a temperature"""
+        if temp not in self._temperature_constants:
+            hc, henry_c = self.__recompute_hconstants(temp=temp)
+            self._temperature_constants[temp] = \
+                (self.__recompute_mu_max(temp=temp), hc, henry_c)
+        return self._temperature_constants.get(temp)
+
+    def interval(self, index):
+        """Feed and temperature dependent constants of an interval"""
+        temp = self.feed_payload["temp"][index]
+        mu_max, hc, henry_c = self.temperature_constants(temp)
+        return dict(flow_in=self.feed_payload["flows"][index, 0],
+                    flow_out=self.feed_payload["flows"][index, 1],
+                    substrate_flow=self.feed_payload["substrates"][index],
+                    mu_max=mu_max, henry_constants=hc), henry_c
 
     def move_index_for_iteration(self, index):
-        """Process the imported dataset and update the values."""
-        # -- substrate flow information
-        temp = self.feed_payload["temp"][index]
-        self.flow_in = self.feed_payload["flows"][index, 0]
-        self.flow_out = self.feed_payload["flows"][index, 1]
-        self.substrate_flow = self.feed_payload["substrates"][index]
-        # -- Update functions
-        self.__recompute_mu_max(temp=temp)
-        self.__recompute_hconstants(temp=temp)
+        """Set the values of an interval on the dataset itself
+
+        Meant for evaluating a model outside of a simulation, the
+        Manager moves a RunContext instead.
+        """
+        values, _ = self.interval(index)
+        self.__dict__.update(values)
+
+
+class RunContext:
+    # Attributes of a run, these are never looked up on the dataset
+    RUN_ATTRIBUTES = ("state", "debug", "y_hat", "mu_max_data", "hc_data",
+                      "flow_in", "flow_out", "substrate_flow", "mu_max",
+                      "henry_constants", "headers")
+
+    def __init__(self, dataset, diagnostics=True, profile=None):
+        """Set up the state of a single run of a dataset
+
+        The context stands in for the dataset in the models. The
+        values of the current interval, the state at its start and
+        the logs of the run are kept on the context, every other
+        attribute is read from the dataset. Without diagnostics,
+        the models do not log their debug output. A run following
+        a FeedProfile is moved in time instead of by interval.
+        """
+        self.dataset = dataset
+        self.diagnostics = diagnostics
+        self.profile = profile
+        self.state = dataset.inoculum.get("value")
+        self.mu_max_data = []
+        self.hc_data = []
+
+    def __getattr__(self, name):
+        if name in RunContext.RUN_ATTRIBUTES or name == "dataset":
+            raise AttributeError(name)
+        return getattr(self.dataset, name)
+
+    # Logs of the run are appended to like those of the Dataset
+    _update = Dataset._update
+
+    def move_index_for_iteration(self, index):
+        """Move the run to the feed interval index"""
+        values, henry_c = self.dataset.interval(index)
+        self.__dict__.update(values)
+        self.mu_max_data.append(values.get("mu_max").get("params"))
+        self.hc_data.append(henry_c)
+
+    def move_to_time(self, time):
+        """Move the run to the feed of its profile at a time
+
+        Called at every evaluation of the model, so the constants
+        are not logged. Returns the row of the feed interval.
+        """
+        self.__dict__.update(self.profile(time))
+        return self.profile.index(time)
 
 
 class SimulationResult(object):
     def __init__(self, hdfile):
+        """Read the outputs of a result file of any output profile
+
+        The outputs are returned as float64 with the columns and
+        rows stored. Files written before the output profiles keep
+        their headers in a Headers group.
+        """
         self._file = hdfile
 
     def __go_down_one(self, _name_):
         return self._file.get(_name_)
 
     def getHeaders(self, header_type):
-        return self.__go_down_one("Headers").get(header_type).value
+        output = self.__go_down_one("Output").get(header_type)
+        if output is not None and "headers" in output.attrs:
+            headers = output.attrs["headers"]
+        else:
+            headers = self.__go_down_one("Headers").get(header_type)[()]
+        return [item.decode() if isinstance(item, bytes) else str(item)
+                for item in headers]
 
     def getDataset(self, category):
-        return self.__go_down_one("Output").get(category).value
+        return np.asarray(self.__go_down_one("Output").get(category)[()],
+                          dtype=float)
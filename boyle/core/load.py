@@ -10,16 +10,109 @@ simulations.
 
 import os
 import h5py as h5
+import numpy as np
 from boyle.tools.utility import load_data
+from boyle.core.generic import Dataset
 from boyle.core.internals.constant import KineticConstant, AcidConstant
+from boyle.core.save import INPUT_NAMES
 
 # Create set of supported extensions to make sure data
 # is loaded from a specific group and nothing else
 SUPPORTED_EXTENSIONS = ("npy", "npz", "constant")
+# Single files holding all inputs, see from_bundle
+BUNDLE_EXTENSIONS = (".npz", ".hdf5", ".h5")
+
+# Shapes of the numeric inputs, None for any number of rows. The
+# feed holds time, temperature, inflow and outflow and a column for
+# every state of the inoculum but the volume.
+INPUT_SHAPES = {"Const1": (10, 11), "feed": (None, 32), "inoculum": (29,),
+                "yc": (11, 16)}
+# Fields of the records of the acid constants
+ACID_FIELDS = ("name", "xt0", "t0", "a", "b", "c")
+
+
+def check_inputs(inputs):
+    """Validated inputs as from_localpath returns them
+
+    The numeric inputs have to be real and finite with the shapes
+    of INPUT_SHAPES and are returned as float64, the time points
+    of the feed have to increase. The acid constants are records
+    with the ACID_FIELDS, names stored as bytes are decoded.
+    """
+    missing = [name for name in INPUT_NAMES if name not in inputs]
+    if missing:
+        raise ValueError("Missing inputs {}".format(missing))
+    checked = dict(inputs)
+    for name, shape in INPUT_SHAPES.items():
+        value = np.asarray(inputs.get(name))
+        if value.dtype.kind not in "iuf":
+            raise ValueError("Input {} has to be real, got {}".format(
+                name, value.dtype))
+        if value.ndim != len(shape) or any(
+                size is not None and size != found
+                for size, found in zip(shape, value.shape)):
+            raise ValueError("Input {} has the shape {}, expected {}".format(
+                name, value.shape, shape))
+        if not np.all(np.isfinite(value)):
+            raise ValueError("Input {} is not finite".format(name))
+        checked[name] = value.astype(float)
+    feed = checked.get("feed")
+    if feed.shape[0] < 1 or np.any(np.diff(feed[:, 0]) <= 0):
+        raise ValueError("The feed needs rows of increasing time points")
+    acids = np.asarray(inputs.get("Const2"))
+    if not acids.dtype.names or set(ACID_FIELDS) - set(acids.dtype.names) \
+            or acids.ndim != 1:
+        raise ValueError("Input Const2 has to be records of the fields "
+                         "{}".format(ACID_FIELDS))
+    acids = acids.astype([
+        (field, acids.dtype[field].str.replace("|S", "<U")
+         if acids.dtype[field].kind == "S" else acids.dtype[field])
+        for field in acids.dtype.names])
+    checked["Const1"] = KineticConstant(checked.get("Const1"))
+    checked["Const2"] = AcidConstant(acids)
+    return checked
+
+
+def from_arrays(feed, inoculum, Const1, Const2, yc):
+    """Inputs of a simulation from arrays, checked by check_inputs
+
+    The arrays are named and laid out like the files of a data
+    folder, so the inputs work wherever those of from_localpath do.
+    """
+    return check_inputs(dict(feed=feed, inoculum=inoculum, Const1=Const1,
+                             Const2=Const2, yc=yc))
+
+
+def build_dataset(feed, inoculum, Const1, Const2, yc):
+    """Dataset from arrays, see from_arrays"""
+    return Dataset(**from_arrays(feed, inoculum, Const1, Const2, yc))
+
+
+def from_bundle(path):
+    """Load the inputs of a single file written by to_bundle
+
+    Result files of to_hdf5 hold their inputs as well and run
+    again from themselves.
+    """
+    if str(path).endswith(".npz"):
+        with np.load(path) as stored:
+            inputs = {name: stored[name] for name in stored.files}
+    else:
+        with h5.File(path, "r") as stored:
+            group = stored.get("Input")
+            if group is None:
+                raise ValueError("{} holds no inputs".format(path))
+            inputs = {name: group[name][()] for name in group}
+    return check_inputs(inputs)
 
 
 def from_localpath(path):
-    """Load files from local file path"""
+    """Load files from local file path
+
+    A path to a single file is loaded by from_bundle.
+    """
+    if os.path.isfile(path) and str(path).endswith(BUNDLE_EXTENSIONS):
+        return from_bundle(path)
     if not os.path.exists(path):
         _e = "Folder does not exist"
         raise IOError(_e)
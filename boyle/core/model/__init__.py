@@ -0,0 +1,67 @@
+#!/usr/bin/python
+
+"""
+Models
+
+Registry of the models that can be selected by name in the
+Manager. Every model provides the right-hand side function, an
+optional Jacobian, an optional function that builds the
+solver arguments for a feed interval and an optional sparsity
+pattern of the Jacobian. Models without an argument builder
+are called with (dataset, run_no, ph_mode). Models carrying
+states beyond the 33 reactor states provide a function building
+their initial state from a reactor state and a function
+extending the state scales. Models not integrating every state
+provide a function filling in the states of the output. Models
+integrated best with other solver settings than the standard
+ones provide these settings. Models whose solution rows differ
+from OUTPUT_HEADERS provide the headers of their columns.
+
+Models with costly imports are registered by a function loading
+them on their first use, get_model resolves a name either way.
+"""
+
+import importlib
+from collections import namedtuple
+
+from boyle.core.model import network, proton, reduced
+from boyle.core.model.standard import Standard
+
+Model = namedtuple("Model", "function jacobian arguments sparsity "
+                   "initial scales outputs solver headers",
+                   defaults=(None, None, None, None, None))
+
+MODELS = {
+    "standard": Model(Standard, None, None, None),
+    "network": Model(network.NetworkModel, None, network.arguments,
+                     network.STANDARD_SPARSITY),
+    "proton": Model(proton.ProtonModel, None, proton.arguments,
+                    proton.SPARSITY, proton.initial, proton.scales,
+                    headers=proton.HEADERS),
+    "reduced": Model(reduced.ReducedModel, None, None, None,
+                     outputs=reduced.outputs, solver=reduced.SOLVER),
+}
+
+
+def _load_jit():
+    """Compiled model, importing Numba takes about half a second
+
+    The compiled model falls back to the NumPy version of the
+    Standard model when Numba is not installed.
+    """
+    jit = importlib.import_module("boyle.core.model.jit")
+    if jit.AVAILABLE:
+        return Model(jit.StandardJIT, jit.StandardJacobian, jit.arguments,
+                     None)
+    return MODELS.get("standard")
+
+
+MODELS["jit"] = _load_jit
+
+
+def get_model(name):
+    """Model registered under a name, None for unknown names"""
+    model = MODELS.get(name)
+    if model is not None and not isinstance(model, Model):
+        model = MODELS[name] = model()
+    return model
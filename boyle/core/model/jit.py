@@ -0,0 +1,328 @@
+#!/usr/bin/python
+
+"""
+Compiled Standard Model
+
+The Standard model written as scalar loops over a flat
+parameter array so that it can be compiled with Numba. The
+right-hand side, the pH charge balance and a finite-difference
+Jacobian are compiled together, which removes the interpreter
+overhead of the many small array operations in the Standard
+model. When Numba is not installed the module still imports,
+AVAILABLE is False and the manager falls back to Standard.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    AVAILABLE = False
+
+    def njit(*args, **kwargs):
+        """Stand-in decorator leaving the function uncompiled"""
+        if args and callable(args[0]):
+            return args[0]
+        return lambda function: function
+else:
+    AVAILABLE = True
+
+
+# Layout of the flat parameter array. Vectors of the eight
+# degraders are stored as consecutive blocks.
+KS = 0
+KS_NH3 = 8
+PK_LOW = 16
+PK_HIGH = 24
+KI_LCFA = 32
+KI_CARBON = 40
+KI_PROT = 41
+KI_HAC_HPR = 42
+KI_HAC_HBUT = 43
+KI_HAC_HVAL = 44
+KI_NH3_HAC = 45
+K_H = 46
+KA_NH4 = 50
+KA_HAC = 51
+KA_HPR = 52
+KA_HBUT = 53
+KA_HVAL = 54
+KA1_CO2 = 55
+KA2_CO2 = 56
+KA_H2S = 57
+KA_H2PO4 = 58
+KW = 59
+FLOW_IN = 60
+FLOW_OUT = 61
+INFLOW = 62
+K0_CARBON = 90
+K0_PROT = 91
+MU_MAX = 92
+MU_MAX_T0 = 100
+YC = 108
+N_PARAMETERS = 284
+
+# pH methods of the Standard model. The scipy root finders
+# and the surrogate tables are not compiled, so fsolve, brentq
+# and surrogate are all solved with a compiled Newton iteration
+# on the same residual.
+PH_METHODS = {"fixed": 0, "newton-raphson": 1, "fsolve": 2, "brentq": 2,
+              "surrogate": 2}
+
+KD0 = 0.05
+
+
+def pack_parameters(dataset):
+    """Pack the current interval of a dataset into a flat array"""
+    const = dataset.Const1.get("params")
+    hc = dataset.henry_constants
+    growth = dataset.mu_max.get("params")
+    # --
+    p = np.zeros(N_PARAMETERS)
+    p[KS:KS + 8] = const.get("ks")
+    p[KS_NH3:KS_NH3 + 8] = const.get("ks_nh3")
+    p[PK_LOW:PK_LOW + 8] = const.get("pk_low")
+    p[PK_HIGH:PK_HIGH + 8] = const.get("pk_high")
+    p[KI_LCFA:KI_LCFA + 8] = const.get("ki_lcfa")
+    p[KI_CARBON] = const.get("ki_carbon")
+    p[KI_PROT] = const.get("ki_prot")
+    p[KI_HAC_HPR] = const.get("ki_hac_hpr")
+    p[KI_HAC_HBUT] = const.get("ki_hac_hbut")
+    p[KI_HAC_HVAL] = const.get("ki_hac_hval")
+    p[KI_NH3_HAC] = const.get("ki_nh3_hac")
+    # -- acid and henry constants
+    p[K_H:K_H + 4] = hc.get("k_h")
+    names = ["ka_nh4", "ka_hac", "ka_hpr", "ka_hbut", "ka_hval",
+             "ka1_co2", "ka2_co2", "ka_h2s", "ka_h2po4", "kw"]
+    p[KA_NH4:KW + 1] = [hc.get(item) for item in names]
+    # -- feed of the interval
+    p[FLOW_IN] = dataset.flow_in
+    p[FLOW_OUT] = dataset.flow_out
+    p[INFLOW:INFLOW + 28] = dataset.substrate_flow
+    # -- growth rates
+    p[K0_CARBON] = growth.get("k0_carbon")
+    p[K0_PROT] = growth.get("k0_prot")
+    p[MU_MAX:MU_MAX + 8] = np.ravel(growth.get("mu_max"))
+    p[MU_MAX_T0:MU_MAX_T0 + 8] = np.ravel(growth.get("mu_max_t0"))
+    p[YC:] = np.ravel(dataset.yc.get("value"))
+    return p
+
+
+def arguments(dataset, run_no, ph_mode):
+    """Solver arguments of the compiled model for one interval"""
+    if ph_mode.method not in PH_METHODS:
+        raise ValueError("Unknown pH method {}".format(ph_mode.method))
+    value = ph_mode.value if ph_mode.value is not None else 0.
+    return [pack_parameters(dataset), PH_METHODS.get(ph_mode.method),
+            float(value)]
+
+
+@njit(cache=True)
+def charge_balance(H, y, p):
+    """Charge balance of ph.calculate and its derivative in H"""
+    hpr, hbut, hval, hac, nh3 = y[9], y[10], y[11], y[12], y[13]
+    co2, z, h2po4, a = y[15], y[17], y[18], y[19]
+    ka1_co2, ka2_co2 = p[KA1_CO2], p[KA2_CO2]
+    ka_hac, ka_hpr = p[KA_HAC], p[KA_HPR]
+    ka_hbut, ka_hval = p[KA_HBUT], p[KA_HVAL]
+    ka_h2po4, ka_nh4, kw = p[KA_H2PO4], p[KA_NH4], p[KW]
+    # --
+    co2_den = H * (H + ka1_co2) + ka1_co2 * ka2_co2
+    Hfunc = co2 / 44 * ka1_co2 * (H + 2 * ka2_co2) / co2_den + \
+        hac / 60 * ka_hac / (H + ka_hac) + \
+        hpr / 74 * ka_hpr / (H + ka_hpr) + \
+        hbut / 88 * ka_hbut / (H + ka_hbut) + \
+        hval / 102 * ka_hval / (H + ka_hval) + \
+        a / 35.5 + \
+        h2po4 / 31 * (H + 2 * ka_h2po4) / (H + ka_h2po4) - \
+        nh3 / 14 * H / (H + ka_nh4) - \
+        z / 39 + \
+        kw / H
+    dhfunc_dh = - co2 / 44 * ka1_co2 * (H * (H + 4 * ka2_co2) + ka1_co2 *
+                                        ka2_co2) / co2_den**2 - \
+        hac / 60 * ka_hac / (H + ka_hac)**2 - \
+        hpr / 74 * ka_hpr / (H + ka_hpr)**2 - \
+        hbut / 88 * ka_hbut / (H + ka_hbut)**2 - \
+        hval / 102 * ka_hval / (H + ka_hval)**2 - \
+        kw / (H**2) - \
+        h2po4 / 31 * ka_h2po4 / (H + ka_h2po4)**2 - \
+        nh3 / 14 * ka_nh4 / (H + ka_nh4)**2
+    return Hfunc, dhfunc_dh
+
+
+@njit(cache=True)
+def ph_residual(H, y, p):
+    """Residual H - Hfunc of the charge balance, see ph.calculate"""
+    Hfunc, _ = charge_balance(H, y, p)
+    return H - Hfunc
+
+
+@njit(cache=True)
+def solve_ph(y, p, ph_method, ph_value):
+    """Return (pH, H) following the pH modes of Standard"""
+    H = 1e-8
+    if ph_method == 0:
+        return ph_value, H
+    if ph_method == 1:
+        # Same iteration as ph.newton_raphson, the final H is
+        # used for the rest of the model.
+        Hfunc = 1.
+        for _ in range(200):
+            if abs(Hfunc - H) <= 1e-12:
+                return -np.log10(Hfunc), H
+            Hfunc, dhfunc_dh = charge_balance(H, y, p)
+            H = H - (Hfunc - H) / (dhfunc_dh - 1)
+        raise ValueError("The pH is diverging.")
+    # Root of the residual, the model keeps the initial H
+    x_H = H
+    for _ in range(200):
+        Hfunc, dhfunc_dh = charge_balance(x_H, y, p)
+        step = (x_H - Hfunc) / (1 - dhfunc_dh)
+        x_new = x_H - step
+        if x_new <= 0:
+            x_new = 0.1 * x_H
+        if abs(x_new - x_H) <= 1e-12 * x_H:
+            return -np.log10(x_new), H
+        x_H = x_new
+    raise ValueError("The pH is diverging.")
+
+
+@njit(cache=True)
+def standard_rhs(time, y0, p, ph_method, ph_value):
+    """Compiled right-hand side of the Standard model"""
+    y_dot = np.zeros(33)
+    volume = y0[0]
+    carbo_is, prot_is = y0[1], y0[4]
+    carbon, amino, lipids, lcfa = y0[3], y0[6], y0[7], y0[8]
+    hpr, hbut, hval, hac, nh3 = y0[9], y0[10], y0[11], y0[12], y0[13]
+    ch4, co2, h2s, h2po4 = y0[14], y0[15], y0[16], y0[18]
+    dead_cells = y0[20]
+    # --
+    k_h = p[K_H:K_H + 4]
+    ka_nh4, ka_hac, ka_hpr = p[KA_NH4], p[KA_HAC], p[KA_HPR]
+    ka_hbut, ka_hval = p[KA_HBUT], p[KA_HVAL]
+    ka1_co2, ka2_co2, ka_h2s = p[KA1_CO2], p[KA2_CO2], p[KA_H2S]
+    ka_h2po4, kw = p[KA_H2PO4], p[KW]
+    flow_in, flow_out = p[FLOW_IN], p[FLOW_OUT]
+    # -- pH
+    pH, H = solve_ph(y0, p, ph_method, ph_value)
+    # -- growth rates
+    mu = np.empty(8)
+    for i in range(8):
+        pk_low, pk_high = p[PK_LOW + i], p[PK_HIGH + i]
+        f_ph = (1 + 2 * 10**(0.5 * (pk_low - pk_high))) / \
+            (1 + 10**(pH - pk_high) + 10**(pk_low - pH))
+        mu[i] = p[MU_MAX + i] * f_ph
+    ks = p[KS:KS + 8]
+    ks_nh3 = p[KS_NH3:KS_NH3 + 8]
+    ki_lcfa = p[KI_LCFA:KI_LCFA + 8]
+    ki_hac_hpr, ki_hac_hbut = p[KI_HAC_HPR], p[KI_HAC_HBUT]
+    ki_hac_hval, ki_nh3_hac = p[KI_HAC_HVAL], p[KI_NH3_HAC]
+    mu[0] *= carbon * nh3 * ki_lcfa[0] / \
+        ((ks[0] + carbon) * (ks_nh3[0] + nh3) * (lcfa + ki_lcfa[0]))
+    mu[1] *= amino * ki_lcfa[1] / ((ks[1] + amino) * (lcfa + ki_lcfa[1]))
+    mu[2] *= lipids * nh3 * ki_lcfa[2] / \
+        ((ks[2] + lipids) * (ks_nh3[2] + nh3) * (lcfa + ki_lcfa[2]))
+    mu[3] *= nh3 * lcfa / \
+        ((lcfa + ks[3] + lcfa * lcfa / ki_lcfa[3]) * (ks_nh3[3] + nh3))
+    mu[4] *= hpr * nh3 * ki_lcfa[4] * ki_hac_hpr / \
+        ((ks[4] + hpr) * (ks_nh3[4] + nh3) * (lcfa + ki_lcfa[4]) *
+         (hac + ki_hac_hpr))
+    mu[5] *= hbut * nh3 * ki_lcfa[5] * ki_hac_hbut / \
+        ((ks[5] + hbut) * (ks_nh3[5] + nh3) * (lcfa + ki_lcfa[5]) *
+         (hac + ki_hac_hbut))
+    mu[6] *= hval * nh3 * ki_lcfa[6] * ki_hac_hval / \
+        ((ks[6] + hval) * (ks_nh3[6] + nh3) * (lcfa + ki_lcfa[6]) *
+         (hac + ki_hac_hval))
+    mu[7] *= hac * nh3 * ki_lcfa[7] * ki_nh3_hac / \
+        ((ks[7] + hac) * (ks_nh3[7] + nh3) * (lcfa + ki_lcfa[7]) *
+         (nh3 * ka_nh4 / (H + ka_nh4) + ki_nh3_hac))
+    # -- reaction rates
+    rates = np.empty(11)
+    cell_decay = 0.01 * dead_cells
+    inhibition = hac + 0.811 * hpr + 0.682 * hbut + 0.588 * hval
+    rates[0] = cell_decay
+    rates[1] = carbo_is * p[K0_CARBON] * p[KI_CARBON] / \
+        (p[KI_CARBON] + inhibition)
+    rates[2] = prot_is * p[K0_PROT] * p[KI_PROT] / \
+        (p[KI_PROT] + inhibition)
+    for i in range(8):
+        rates[3 + i] = mu[i] * y0[21 + i]
+    # --
+    y_dot[0] = flow_in - flow_out
+    for j in range(16):
+        total = 0.
+        for k in range(11):
+            total += p[YC + 16 * k + j] * rates[k]
+        y_dot[1 + j] = total
+    cell_death = 0.
+    for i in range(8):
+        death = p[MU_MAX_T0 + i] * y0[21 + i] * KD0
+        cell_death += death
+        y_dot[21 + i] = rates[3 + i] - death
+    y_dot[20] = cell_death - cell_decay
+    for j in range(1, 29):
+        y_dot[j] += (p[INFLOW + j - 1] - flow_in * y0[j]) / volume
+    # -- gas flow
+    molar_mass = np.array([14., 16., 44., 34.])
+    conc = np.array([nh3, ch4, co2, h2s]) / molar_mass
+    dconc_dt = np.array([y_dot[9], y_dot[14], y_dot[15], y_dot[16]]) / \
+        molar_mass
+    co2_den = H * (H + ka1_co2) + ka1_co2 * ka2_co2
+    alpha = np.array([ka_nh4 / (H + ka_nh4), 1., H * H / co2_den,
+                      H / (H + ka_h2s)]) / k_h
+    da_dH = np.array([-ka_nh4 / (H + ka_nh4)**2, 0.,
+                      ka1_co2 * H * (H + 2 * ka2_co2) / co2_den**2,
+                      ka_h2s / (H + ka_h2s)**2]) / k_h
+    dH_dt = - (ka_hac / (ka_hac + H) * y_dot[12] / 60 +
+               ka_hpr / (ka_hac + H) * y_dot[9] / 74 +
+               ka_hbut / (ka_hac + H) * y_dot[10] / 88 +
+               ka_hval / (ka_hac + H) * y_dot[11] / 102 +
+               y_dot[19] / 35.5 -
+               y_dot[17] / 39 +
+               (1 + ka_h2po4 / (ka_h2po4 - H)) * y_dot[18] / 31) / \
+        (
+            ((ka1_co2 - 1) * ka2_co2 - H * H) * co2 / 44 / co2_den**2 +
+            ka_hac / (ka_hac + H)**2 * hac / 60 +
+            ka_hpr / (ka_hac + H)**2 * hpr / 74 +
+            ka_hbut / (ka_hac + H)**2 * hbut / 88 +
+            ka_hval / (ka_hac + H)**2 * hval / 102 -
+            kw / (H * H) - 1 +
+            ka_h2po4 / (ka_h2po4 + H)**2 * h2po4 / 31 +
+            ka_nh4 / (ka_nh4 + H)**2 * nh3 / 14)
+    gasflow_fraction = np.sum(alpha * dconc_dt + da_dH * dH_dt * conc) / \
+        np.sum(alpha**2 * conc)
+    gasflow = gasflow_fraction * alpha * conc
+    gasloss = gasflow * molar_mass
+    for i in range(4):
+        y_dot[29 + i] = gasflow[i] * 22.4 * volume
+    y_dot[13] -= gasloss[0]
+    for i in range(1, 4):
+        y_dot[13 + i] -= gasloss[i]
+    return y_dot
+
+
+@njit(cache=True)
+def standard_jacobian(time, y0, p, ph_method, ph_value):
+    """Forward-difference Jacobian of the compiled right-hand side"""
+    n = y0.shape[0]
+    f0 = standard_rhs(time, y0, p, ph_method, ph_value)
+    jac = np.empty((n, n))
+    y = y0.copy()
+    for j in range(n):
+        step = 1.4901161193847656e-08 * max(abs(y0[j]), 1e-6)
+        y[j] = y0[j] + step
+        jac[:, j] = (standard_rhs(time, y, p, ph_method, ph_value) -
+                     f0) / step
+        y[j] = y0[j]
+    return jac
+
+
+def StandardJIT(time, y0, p, ph_method, ph_value):
+    """Compiled Standard model with the solver call signature"""
+    return standard_rhs(time, y0, p, ph_method, ph_value)
+
+
+def StandardJacobian(time, y0, p, ph_method, ph_value):
+    """Jacobian of the compiled Standard model"""
+    return standard_jacobian(time, y0, p, ph_method, ph_value)
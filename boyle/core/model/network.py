@@ -0,0 +1,398 @@
+#!/usr/bin/python
+
+"""
+Reaction Network Model
+
+Declarative definition of the Standard model. Species, the
+processes acting on them and the rate-law terms of each process
+are described as data. compile_network turns a network into
+index arrays once, after which all rate terms are evaluated in
+a single vectorised pass and the stoichiometry is applied as one
+matrix product. The same structure yields the sparsity pattern
+of the Jacobian.
+
+Process rates are the product of a rate constant, the species
+the process is proportional to and the rate-law terms. Every
+term has the form (a * s + b) / ((c * s + d) * s + e) where s is
+a weighted sum of species, which covers the following kinds:
+
+    monod           s / (K + s)
+    inhibition      K / (K + s)
+    haldane         s / (K + s + s^2 / Ki)
+    free_ammonia    K / (K + s * ka_nh4 / (H + ka_nh4))
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+from boyle.core.computations import ph
+from boyle.core.save import HEADER_VOL, HEADER_CORE, HEADER_DEGRADERS
+
+# Declarations
+#   Term: kind, species as a name or a {name: weight} mapping and
+#         the constants as (name, index) references into Const1
+#   Process: name, rate constant as (source, index), the species
+#         the rate is proportional to, the rate-law terms, the row
+#         of yc holding its stoichiometry and additional
+#         stoichiometric coefficients as {name: coefficient}
+#   Gas: gas flow state, dissolved species, species whose rate of
+#         change drives the transfer, molar mass, position in the
+#         henry constants and the acid-base equilibrium
+Term = namedtuple("Term", "kind species constants")
+Process = namedtuple("Process", "name rate species terms yc stoichiometry")
+Gas = namedtuple("Gas", "name liquid rate molar_mass henry equilibrium")
+Network = namedtuple("Network", "species liquid processes gases")
+
+TERM_KINDS = ("monod", "inhibition", "haldane", "free_ammonia")
+
+# Rate constant sources. Growth rates from mu_max are inhibited
+# by the pH, death rates from mu_max_t0 are scaled by kd0.
+RATE_SOURCES = ("mu_max", "mu_max_t0", "k0_carbon", "k0_prot", "constant")
+KD0 = 0.05
+
+# Species entering the charge balance of the pH computation
+PH_SPECIES = ("dg_co2", "ac_ace", "ac_prop", "ac_buty", "ac_val",
+              "io_a", "io_z", "io_p", "dg_nh4")
+
+SPECIES = HEADER_VOL + HEADER_CORE + HEADER_DEGRADERS
+
+DEGRADERS = ["degr_carb", "degr_amino", "degr_lipid", "degr_lcfa",
+             "degr_hprop", "degr_butyr", "degr_valer", "degr_acet"]
+
+HYDROLYSIS_INHIBITION = {"ac_ace": 1., "ac_prop": 0.811,
+                         "ac_buty": 0.682, "ac_val": 0.588}
+
+
+def _growth(idx, yc, terms):
+    """Growth process of the degrader idx"""
+    degrader = DEGRADERS[idx]
+    return Process("growth_" + degrader[5:], ("mu_max", idx), degrader,
+                   terms, yc, {degrader: 1.})
+
+
+def _death(idx):
+    """Death of the degrader idx into dead cells"""
+    degrader = DEGRADERS[idx]
+    return Process("death_" + degrader[5:], ("mu_max_t0", idx), degrader,
+                   [], None, {degrader: -1., "dead_cell": 1.})
+
+
+STANDARD_NETWORK = Network(
+    species=SPECIES,
+    liquid=SPECIES[1:29],
+    processes=[
+        Process("decay", ("constant", 0.01), "dead_cell", [], 0,
+                {"dead_cell": -1.}),
+        Process("hydrolysis_carb", ("k0_carbon", None), "carb_ins",
+                [Term("inhibition", HYDROLYSIS_INHIBITION,
+                      [("ki_carbon", None)])], 1, {}),
+        Process("hydrolysis_prot", ("k0_prot", None), "prot_ins",
+                [Term("inhibition", HYDROLYSIS_INHIBITION,
+                      [("ki_prot", None)])], 2, {}),
+        _growth(0, 3, [Term("monod", "carb_sol", [("ks", 0)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 0)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 0)])]),
+        _growth(1, 4, [Term("monod", "amino", [("ks", 1)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 1)])]),
+        _growth(2, 5, [Term("monod", "lipids", [("ks", 2)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 2)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 2)])]),
+        _growth(3, 6, [Term("haldane", "ac_lcfa",
+                            [("ks", 3), ("ki_lcfa", 3)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 3)])]),
+        _growth(4, 7, [Term("monod", "ac_prop", [("ks", 4)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 4)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 4)]),
+                       Term("inhibition", "ac_ace", [("ki_hac_hpr", None)])]),
+        _growth(5, 8, [Term("monod", "ac_buty", [("ks", 5)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 5)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 5)]),
+                       Term("inhibition", "ac_ace",
+                            [("ki_hac_hbut", None)])]),
+        _growth(6, 9, [Term("monod", "ac_val", [("ks", 6)]),
+                       Term("monod", "dg_nh4", [("ks_nh3", 6)]),
+                       Term("inhibition", "ac_lcfa", [("ki_lcfa", 6)]),
+                       Term("inhibition", "ac_ace",
+                            [("ki_hac_hval", None)])]),
+        _growth(7, 10, [Term("monod", "ac_ace", [("ks", 7)]),
+                        Term("monod", "dg_nh4", [("ks_nh3", 7)]),
+                        Term("inhibition", "ac_lcfa", [("ki_lcfa", 7)]),
+                        Term("free_ammonia", "dg_nh4",
+                             [("ki_nh3_hac", None)])]),
+    ] + [_death(idx) for idx in range(8)],
+    # The Standard model takes the rate of change of ammonia from
+    # ac_prop, the position of NH3 in the old state ordering. It
+    # is kept here so that the network reproduces Standard.
+    gases=[
+        Gas("gf_nh3", "dg_nh4", "ac_prop", 14., 0, "ammonia"),
+        Gas("gf_ch4", "dg_ch4", "dg_ch4", 16., 1, "inert"),
+        Gas("gf_co2", "dg_co2", "dg_co2", 44., 2, "carbonate"),
+        Gas("gf_h2s", "dg_h2s", "dg_h2s", 34., 3, "sulphide"),
+    ])
+
+
+def compile_network(network):
+    """Resolve the declarations of a network into index arrays"""
+    index = {name: idx for idx, name in enumerate(network.species)}
+    n_species = len(network.species)
+    n_process = len(network.processes)
+    # -- rate-law terms
+    terms, term_rows = [], []
+    for process in network.processes:
+        rows = []
+        for term in process.terms:
+            if term.kind not in TERM_KINDS:
+                raise ValueError("Unknown term {}".format(term.kind))
+            rows.append(len(terms))
+            terms.append(term)
+        term_rows.append(rows)
+    n_terms = len(terms)
+    weights = np.zeros((n_terms, n_species))
+    for idx, term in enumerate(terms):
+        species = term.species
+        if isinstance(species, str):
+            species = {species: 1.}
+        for name, weight in species.items():
+            weights[idx, index[name]] = weight
+    # Processes with fewer terms point at a trailing factor of one
+    width = max([len(rows) for rows in term_rows] + [1])
+    term_index = np.full((n_process, width), n_terms)
+    for idx, rows in enumerate(term_rows):
+        term_index[idx, :len(rows)] = rows
+    # -- rates and stoichiometry
+    for process in network.processes:
+        if process.rate[0] not in RATE_SOURCES:
+            raise ValueError("Unknown rate {}".format(process.rate[0]))
+    stoichiometry = np.zeros((n_species, n_process))
+    for idx, process in enumerate(network.processes):
+        for name, coefficient in process.stoichiometry.items():
+            stoichiometry[index[name], idx] = coefficient
+    gases = network.gases
+    return dict(
+        network=network, index=index, terms=terms, weights=weights,
+        term_index=term_index,
+        rate_species=np.array([index[p.species]
+                               for p in network.processes]),
+        ph_processes=np.array([idx for idx, p in
+                               enumerate(network.processes)
+                               if p.rate[0] == "mu_max"], dtype=int),
+        ionised=np.array([t.kind == "free_ammonia" for t in terms]),
+        yc_rows=[(idx, p.yc) for idx, p in enumerate(network.processes)
+                 if p.yc is not None],
+        stoichiometry=stoichiometry,
+        liquid=np.array([index[name] for name in network.liquid]),
+        gas=np.array([index[g.name] for g in gases]),
+        gas_liquid=np.array([index[g.liquid] for g in gases]),
+        gas_rate=np.array([index[g.rate] for g in gases]),
+        molar_mass=np.array([g.molar_mass for g in gases]),
+        henry=np.array([g.henry for g in gases]),
+        equilibrium=[g.equilibrium for g in gases])
+
+
+def _constant(params, reference):
+    """Look up a (name, index) reference into Const1 parameters"""
+    name, idx = reference
+    value = params.get(name)
+    return value if idx is None else value[idx]
+
+
+def network_parameters(structure, dataset):
+    """Numeric arrays of a compiled network for one feed interval"""
+    const = dataset.Const1.get("params")
+    growth = dataset.mu_max.get("params")
+    yieldc = dataset.yc.get("value")
+    terms = structure.get("terms")
+    # -- term coefficients of (a * s + b) / ((c * s + d) * s + e)
+    coefficients = np.zeros((5, len(terms)))
+    for idx, term in enumerate(terms):
+        K = _constant(const, term.constants[0])
+        if term.kind == "monod":
+            coefficients[:, idx] = (1., 0., 0., 1., K)
+        elif term.kind == "haldane":
+            Ki = _constant(const, term.constants[1])
+            coefficients[:, idx] = (1., 0., 1. / Ki, 1., K)
+        else:
+            coefficients[:, idx] = (0., K, 0., 1., K)
+    # -- rate constants
+    processes = structure.get("network").processes
+    base = np.zeros(len(processes))
+    for idx, process in enumerate(processes):
+        source, ref = process.rate
+        if source == "mu_max":
+            base[idx] = growth.get("mu_max")[ref, 0]
+        elif source == "mu_max_t0":
+            base[idx] = growth.get("mu_max_t0")[ref, 0] * KD0
+        elif source == "constant":
+            base[idx] = ref
+        else:
+            base[idx] = growth.get(source)
+    ph_refs = [processes[idx].rate[1] for idx in
+               structure.get("ph_processes")]
+    # -- stoichiometry with the yield coefficients of the dataset
+    stoichiometry = structure.get("stoichiometry").copy()
+    for process_idx, row in structure.get("yc_rows"):
+        stoichiometry[1:1 + yieldc.shape[1], process_idx] += yieldc[row]
+    return dict(coefficients=coefficients, base=base,
+                pk_low=const.get("pk_low")[ph_refs],
+                pk_high=const.get("pk_high")[ph_refs],
+                stoichiometry=stoichiometry,
+                henry_constants=dataset.henry_constants,
+                flow_in=dataset.flow_in, flow_out=dataset.flow_out,
+                inflow=dataset.substrate_flow)
+
+
+def arguments(dataset, run_no, ph_mode):
+    """Solver arguments of the network model for one interval"""
+    return [STANDARD_STRUCTURE,
+            network_parameters(STANDARD_STRUCTURE, dataset), ph_mode]
+
+
+def _equilibrium(kind, H, hc):
+    """Dissolved fraction of a gas and its derivative in H"""
+    if kind == "ammonia":
+        ka = hc.get("ka_nh4")
+        return ka / (H + ka), -ka / (H + ka)**2
+    elif kind == "carbonate":
+        ka1, ka2 = hc.get("ka1_co2"), hc.get("ka2_co2")
+        den = H * (H + ka1) + ka1 * ka2
+        return H * H / den, ka1 * H * (H + 2 * ka2) / den**2
+    elif kind == "sulphide":
+        ka = hc.get("ka_h2s")
+        return H / (H + ka), ka / (H + ka)**2
+    return 1., 0.
+
+
+def ph_data(y0, structure, hc):
+    """Arguments of the pH computations for a state"""
+    index = structure.get("index")
+    return ph.charge_balance(*[y0[index[name]] for name in PH_SPECIES], hc)
+
+
+def NetworkModel(time, y0, structure, params, ph_mode):
+    """Right-hand side generated from a compiled network"""
+    _data = ph_data(y0, structure, params.get("henry_constants"))
+    pH, H = ph.solve(ph_mode, _data)
+    y_dot, _ = network_rhs(y0, structure, params, pH, H)
+    return y_dot
+
+
+def network_rhs(y0, structure, params, pH, H):
+    """Rates of change of a network at a given pH and H
+
+    Returns the rates of change of the states together with the
+    rate of change of the hydrogen ion concentration.
+    """
+    index = structure.get("index")
+    hc = params.get("henry_constants")
+    volume = y0[0]
+    conc = {name: y0[index[name]] for name in PH_SPECIES}
+    # -- all rate-law terms in one pass
+    a, b, c, d, e = params.get("coefficients")
+    ka_nh4 = hc.get("ka_nh4")
+    d = np.where(structure.get("ionised"), d * ka_nh4 / (H + ka_nh4), d)
+    s = structure.get("weights") @ y0
+    values = np.append((a * s + b) / ((c * s + d) * s + e), 1.)
+    rates = params.get("base") * y0[structure.get("rate_species")] * \
+        values[structure.get("term_index")].prod(axis=1)
+    pk_low, pk_high = params.get("pk_low"), params.get("pk_high")
+    rates[structure.get("ph_processes")] *= \
+        (1 + 2 * 10**(0.5 * (pk_low - pk_high))) / \
+        (1 + 10**(pH - pk_high) + 10**(pk_low - pH))
+    # -- stoichiometry and transport
+    y_dot = params.get("stoichiometry") @ rates
+    flow_in = params.get("flow_in")
+    liquid = structure.get("liquid")
+    y_dot[0] = flow_in - params.get("flow_out")
+    y_dot[liquid] += (params.get("inflow") - flow_in * y0[liquid]) / volume
+    # -- gas transfer
+    molar_mass = structure.get("molar_mass")
+    gas_conc = y0[structure.get("gas_liquid")] / molar_mass
+    dconc_dt = y_dot[structure.get("gas_rate")] / molar_mass
+    k_h = hc.get("k_h")[structure.get("henry")]
+    fractions = [_equilibrium(kind, H, hc)
+                 for kind in structure.get("equilibrium")]
+    alpha = np.array([item[0] for item in fractions]) / k_h
+    da_dH = np.array([item[1] for item in fractions]) / k_h
+    dH_dt = _proton_rate(H, y_dot, conc, index, hc)
+    gasflow_fraction = (np.sum(alpha * dconc_dt + da_dH * dH_dt * gas_conc)
+                        / np.sum(alpha**2 * gas_conc))
+    gasflow = gasflow_fraction * alpha * gas_conc
+    y_dot[structure.get("gas")] = gasflow * 22.4 * volume
+    y_dot[structure.get("gas_liquid")] -= gasflow * molar_mass
+    return y_dot, dH_dt
+
+
+def _proton_rate(H, y_dot, conc, index, hc):
+    """Rate of change of the hydrogen ion concentration"""
+    ka_hac, ka_hpr = hc.get("ka_hac"), hc.get("ka_hpr")
+    ka_hbut, ka_hval = hc.get("ka_hbut"), hc.get("ka_hval")
+    ka1_co2, ka2_co2 = hc.get("ka1_co2"), hc.get("ka2_co2")
+    ka_h2po4, ka_nh4, kw = hc.get("ka_h2po4"), hc.get("ka_nh4"), hc.get("kw")
+    return - (ka_hac / (ka_hac + H) * y_dot[index["ac_ace"]] / 60 +
+              ka_hpr / (ka_hac + H) * y_dot[index["ac_prop"]] / 74 +
+              ka_hbut / (ka_hac + H) * y_dot[index["ac_buty"]] / 88 +
+              ka_hval / (ka_hac + H) * y_dot[index["ac_val"]] / 102 +
+              y_dot[index["io_a"]] / 35.5 -
+              y_dot[index["io_z"]] / 39 +
+              (1 + ka_h2po4 / (ka_h2po4 - H)) * y_dot[index["io_p"]] / 31) / \
+        (
+            ((ka1_co2 - 1) * ka2_co2 - H * H) * conc["dg_co2"] / 44 /
+            (H * (H + ka1_co2) + ka1_co2 * ka2_co2)**2 +
+            ka_hac / (ka_hac + H)**2 * conc["ac_ace"] / 60 +
+            ka_hpr / (ka_hac + H)**2 * conc["ac_prop"] / 74 +
+            ka_hbut / (ka_hac + H)**2 * conc["ac_buty"] / 88 +
+            ka_hval / (ka_hac + H)**2 * conc["ac_val"] / 102 -
+            kw / (H * H) - 1 +
+            ka_h2po4 / (ka_h2po4 + H)**2 * conc["io_p"] / 31 +
+            ka_nh4 / (ka_nh4 + H)**2 * conc["dg_nh4"] / 14)
+
+
+def jacobian_sparsity(structure, yieldc_shape=(11, 16)):
+    """Sparsity pattern of the Jacobian of a compiled network
+
+    The pattern is conservative: growth rates depend on every
+    species of the charge balance since the pH may be computed.
+    Yield coefficients are assumed to be non-zero for every
+    species covered by yc.
+    """
+    index = structure.get("index")
+    n_species = len(index)
+    processes = structure.get("network").processes
+    stoichiometry = structure.get("stoichiometry") != 0
+    for process_idx, row in structure.get("yc_rows"):
+        stoichiometry[1:1 + yieldc_shape[1], process_idx] = True
+    # -- dependency of every process rate on the species
+    ph_species = [index[name] for name in PH_SPECIES]
+    rates = np.zeros((len(processes), n_species), dtype=bool)
+    weights = structure.get("weights") != 0
+    for idx, rows in enumerate(structure.get("term_index")):
+        rates[idx, structure.get("rate_species")[idx]] = True
+        for row in rows[rows < len(weights)]:
+            rates[idx] |= weights[row]
+    ionised = structure.get("ionised")
+    for idx, rows in enumerate(structure.get("term_index")):
+        if np.any(ionised[rows[rows < len(weights)]]):
+            rates[idx, ph_species] = True
+    rates[structure.get("ph_processes")[:, None], ph_species] = True
+    pattern = (stoichiometry.astype(int) @ rates.astype(int)) > 0
+    # -- transport
+    liquid = structure.get("liquid")
+    pattern[liquid, liquid] = True
+    pattern[liquid, 0] = True
+    # -- gas transfer couples the dissolved gases to everything
+    # the pH balance and the transfer rates depend on
+    drivers = list(structure.get("gas_rate")) + \
+        [index[name] for name in PH_SPECIES]
+    coupled = np.any(pattern[drivers], axis=0)
+    coupled[ph_species] = True
+    coupled[structure.get("gas_liquid")] = True
+    coupled[0] = True
+    pattern[structure.get("gas")] |= coupled
+    pattern[structure.get("gas_liquid")] |= coupled
+    pattern[np.diag_indices(n_species)] = True
+    return pattern
+
+
+STANDARD_STRUCTURE = compile_network(STANDARD_NETWORK)
+STANDARD_SPARSITY = jacobian_sparsity(STANDARD_STRUCTURE)
@@ -0,0 +1,75 @@
+#!/usr/bin/python
+
+"""
+Proton Model
+
+Formulation of the network model carrying the hydrogen ion
+concentration H as an additional state after the 33 states of
+the reactor. Instead of solving the charge balance for the pH in
+every evaluation, H follows the time derivative of the charge
+balance
+
+    H - Hfunc(H, c) = 0
+    dH/dt = (dHfunc/dc . dc/dt - drift * (H - Hfunc)) / (1 - dHfunc/dH)
+
+The drift term pulls H back onto the charge balance at the rate
+drift (1/h), so that integration errors do not accumulate. The
+pH settings of the manager are not used by this model.
+"""
+
+import numpy as np
+
+from boyle.core.computations import ph
+from boyle.core.save import OUTPUT_HEADERS
+from boyle.core.model.network import network_rhs, network_parameters, \
+    ph_data, STANDARD_STRUCTURE, STANDARD_SPARSITY
+
+DRIFT_RATE = 100.
+# Typical magnitude of H for the scaled absolute tolerances
+H_SCALE = 1e-7
+
+# Species behind the concentrations of the charge balance
+CHARGE_SPECIES = {"co2": "dg_co2", "HAc": "ac_ace", "HPr": "ac_prop",
+                  "HBut": "ac_buty", "HVal": "ac_val", "a": "io_a",
+                  "z": "io_z", "h2po4": "io_p", "NH3": "dg_nh4"}
+
+# Growth rates depend on H and H on every rate of change
+SPARSITY = np.pad(STANDARD_SPARSITY, ((0, 1), (0, 1)), constant_values=True)
+# Columns of the solution rows, H follows the reactor states
+HEADERS = OUTPUT_HEADERS.get("solution")[:35] + ["H"]
+
+
+def ProtonModel(time, y0, structure, params, drift):
+    """Network model with the hydrogen ion concentration as state"""
+    y, H = y0[:-1], y0[-1]
+    if not H > 0:
+        raise ValueError("The hydrogen ion concentration is not positive.")
+    y_dot, _ = network_rhs(y, structure, params, -np.log10(H), H)
+    # -- derivative of the charge balance
+    index = structure.get("index")
+    _data = ph_data(y, structure, params.get("henry_constants"))
+    Hfunc, dhfunc_dh, partials = ph.sensitivities(H, **_data)
+    rate = sum(partials[key] * y_dot[index[name]]
+               for key, name in CHARGE_SPECIES.items())
+    dH_dt = (rate - drift * (H - Hfunc)) / (1 - dhfunc_dh)
+    return np.append(y_dot, dH_dt)
+
+
+def arguments(dataset, run_no, ph_mode):
+    """Solver arguments of the proton model for one interval"""
+    return [STANDARD_STRUCTURE,
+            network_parameters(STANDARD_STRUCTURE, dataset), DRIFT_RATE]
+
+
+def initial(y0, structure, params, drift):
+    """Append H on the charge balance to a reactor state"""
+    if len(y0) > len(structure.get("index")):
+        return y0
+    _data = ph_data(y0, structure, params.get("henry_constants"))
+    H = 10**(-ph.find_roots(data=_data)[0])
+    return np.append(y0, H)
+
+
+def scales(reactor_scales):
+    """State scales of the proton model"""
+    return np.append(reactor_scales, H_SCALE)
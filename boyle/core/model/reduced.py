@@ -0,0 +1,236 @@
+#!/usr/bin/python
+
+"""
+Reduced Model
+
+Quasi-steady-state formulation of the Standard model for
+screening studies. The soluble substrates consumed by the fast
+degraders (carbon, amino acids, lipids, LCFA, propionate, butyrate
+and acetate) equilibrate within hours while the hydrolysis of the
+insoluble fractions and the growth of the degraders take days.
+The reduced model takes the fast substrates at their quasi-steady
+state: for a fast substrate s consumed by degrader j
+
+    0 = B - D * s - c * phi(s)
+
+with B the production by all other processes and the feed, D the
+dilution rate, c the largest uptake by degrader j and phi the
+Monod (or Haldane for LCFA) term of s. The balances are solved in
+the order of the degradation chain, in closed form for Monod
+terms and by Newton's method for the Haldane term, and repeated
+until the inhibition by LCFA and acetate and the pH settle.
+
+The fast states keep their place in the state vector so results
+have the layout of the Standard model, they are not integrated
+but replaced by their quasi-steady values in the output. The
+rates of change of all other states are those of the Standard
+model at the quasi-steady state. The inert fractions carbo_in and
+prot_in neither feed back nor are stiff and stay integrated.
+
+Without the fast time scales the solver takes more than ten times
+fewer steps once its order may grow, which SOLVER allows. The
+accuracy loss against the Standard model is estimated by
+boyle.tools.analysis.compareModels. On the reference data the slow
+states stay within ten percent, the fast substrates deviate most
+right after a change of the feed, when they lag behind their
+quasi-steady state in the Standard model.
+"""
+
+import math
+
+import numpy as np
+
+from boyle.core.computations import ph
+from boyle.core.model.standard import Standard
+
+# Fast states with the degrader consuming them, in the order the
+# balances are solved along the degradation chain
+FAST = ((3, 0), (6, 1), (7, 2), (8, 3), (9, 4), (10, 5), (12, 7))
+FAST_STATES = [state for state, _ in FAST]
+# Passes mixed into the next start values of the fast states
+ANDERSON = 3
+# Relative tolerances of the fast states in the model, tight enough
+# for the finite-difference Jacobian of the solver, and in the output
+MODEL_TOLERANCE = 1e-10
+OUTPUT_TOLERANCE = 1e-6
+# Solver settings of the reduced model, without the fast time scales
+# steps of higher order pay off
+SOLVER = {"method": "bdf", "order": 5, "nsteps": 1e6,
+          "rtol": 1e-4, "atol": 1e-8}
+
+
+def _monod(production, dilution, uptake, ks):
+    """Root of B - D s - c s / (ks + s) = 0 with s >= 0"""
+    b = uptake + dilution * ks - production
+    root = math.sqrt(b * b + 4 * dilution * production * ks)
+    if b > 0:
+        return 2 * production * ks / (b + root) if b + root > 0 else 0.
+    return (root - b) / (2 * dilution)
+
+
+def _haldane(production, dilution, uptake, ks, ki, s, iterations=20):
+    """Root of B - D s - c s / (ks + s + s^2 / ki) = 0 near s"""
+    s = max(s, 0.)
+    for _ in range(iterations):
+        denominator = ks + s + s * s / ki
+        g = production - dilution * s - uptake * s / denominator
+        dg = - dilution - uptake * (ks - s * s / ki) / denominator**2
+        step = g / dg
+        s = max(s - step, 0.5 * s)
+        if abs(step) <= 1e-12 * (s + 1e-12):
+            break
+    return s
+
+
+def quasi_steady(y0, dataset, ph_mode, guess=None, tolerance=1e-8,
+                 max_sweeps=50):
+    """State with the fast substrates at their quasi-steady state
+
+    PARAMETERS
+    ----------
+    y0 : numpy.array
+        State of the reactor
+    dataset : Dataset or RunContext
+        Set to the feed interval
+    ph_mode : pHvalue
+    guess : numpy.array
+        Start values of the fast states, those of y0 otherwise
+    tolerance : float
+        Relative change of the fast states between two passes at
+        which they are taken as settled
+    """
+    y = np.array(y0, dtype=float)
+    if guess is not None:
+        y[FAST_STATES] = guess
+    # The passes run on floats, which is much faster than on the
+    # elements of small arrays
+    params = dataset.Const1.get("params")
+    ks, ks_nh3, pk_low, pk_high, ki_lcfa = [
+        np.asarray(params.get(name), dtype=float).tolist()
+        for name in ("ks", "ks_nh3", "pk_low", "pk_high", "ki_lcfa")]
+    ki_carbon, ki_prot, ki_hac_hpr, ki_hac_hbut, ki_hac_hval, \
+        ki_nh3_hac = [float(params.get(name)) for name in (
+            "ki_carbon", "ki_prot", "ki_hac_hpr", "ki_hac_hbut",
+            "ki_hac_hval", "ki_nh3_hac")]
+    hc = dataset.henry_constants
+    ka_nh4 = float(hc.get("ka_nh4"))
+    mu_max = dataset.mu_max.get("params")
+    growth = np.ravel(mu_max.get("mu_max")).tolist()
+    k0_carbon = float(mu_max.get("k0_carbon"))
+    k0_prot = float(mu_max.get("k0_prot"))
+    yieldc = np.asarray(dataset.yc.get("value"), dtype=float)
+    # -- stoichiometry of the processes producing every fast state
+    producers = [[(row, float(yieldc[row, state - 1]))
+                  for row in np.flatnonzero(yieldc[:, state - 1])
+                  if row != 3 + j] for state, j in FAST]
+    consumption = [float(yieldc[3 + j, state - 1]) for state, j in FAST]
+    volume = y[0]
+    dilution = float(dataset.flow_in / volume)
+    feed = (dataset.substrate_flow / volume).tolist()
+    carbo_is, _, _, prot_is, _, _, _, _, _, _, hval, _, nh3, _, co2, _, \
+        z_ion, h2po4, a = y[1:20].tolist()
+    degraders = y[21:29].tolist()
+    nh3_terms = [nh3 / (k + nh3) if k > 0 else 1. for k in ks_nh3]
+    z = [0.] * yieldc.shape[0]
+    z[0] = 0.01 * float(y[20])
+
+    def ph_terms(pH, H):
+        """Growth rates without the substrate terms at a pH"""
+        pH = float(np.ravel(pH)[0])
+        return [growth[j] * nh3_terms[j] *
+                (1 + 2 * 10**(0.5 * (pk_low[j] - pk_high[j]))) /
+                (1 + 10**(pH - pk_high[j]) + 10**(pk_low[j] - pH))
+                for j in range(8)], float(H)
+
+    fixed = ph_terms(*ph.solve(ph_mode, None)) \
+        if ph_mode.method == "fixed" else None
+
+    def sweep(x):
+        """Fast states of one pass along the chain starting from x"""
+        values = x.tolist()
+        carbon, amino, lipids, lcfa, hpr, hbut, hac = values
+        # -- pH at the current fast states
+        if fixed is not None:
+            rates, H = fixed
+        else:
+            _data = ph.charge_balance(co2, hac, hpr, hbut, hval, a, z_ion,
+                                      h2po4, nh3, hc)
+            rates, H = ph_terms(*ph.solve(ph_mode, _data))
+        # -- growth rates without the term of the consumed substrate
+        base = [rate * ki / (lcfa + ki) for rate, ki in zip(rates, ki_lcfa)]
+        base[3] = base[3] * (lcfa + ki_lcfa[3]) / ki_lcfa[3]
+        base[4] *= ki_hac_hpr / (hac + ki_hac_hpr)
+        base[5] *= ki_hac_hbut / (hac + ki_hac_hbut)
+        base[6] *= ki_hac_hval / (hac + ki_hac_hval)
+        base[7] *= ki_nh3_hac / (nh3 * ka_nh4 / (H + ka_nh4) + ki_nh3_hac)
+        uptake = [item * degrader for item, degrader in zip(base, degraders)]
+        # -- rates of all processes at the current state
+        acids = hac + 0.811 * hpr + 0.682 * hbut + 0.588 * hval
+        z[1] = carbo_is * k0_carbon * ki_carbon / (ki_carbon + acids)
+        z[2] = prot_is * k0_prot * ki_prot / (ki_prot + acids)
+        for j, s in enumerate((carbon, amino, lipids, lcfa, hpr, hbut, hval,
+                               hac)):
+            z[3 + j] = uptake[j] * s / (ks[j] + s)
+        z[6] = uptake[3] * lcfa / (lcfa + ks[3] + lcfa * lcfa / ki_lcfa[3])
+        # -- balances along the degradation chain
+        for idx, ((state, j), sources) in enumerate(zip(FAST, producers)):
+            coefficient = - consumption[idx]
+            production = feed[state - 1]
+            for row, c in sources:
+                production += c * z[row]
+            if j == 3:
+                s = _haldane(production, dilution, coefficient * uptake[j],
+                             ks[j], ki_lcfa[j], values[idx])
+                z[3 + j] = uptake[j] * s / (s + ks[j] + s * s / ki_lcfa[j])
+            else:
+                s = _monod(production, dilution, coefficient * uptake[j],
+                           ks[j])
+                z[3 + j] = uptake[j] * s / (ks[j] + s)
+            values[idx] = s
+        return np.array(values)
+
+    # -- the passes are a fixed point iteration, which is sped up by
+    # Anderson mixing of the last passes
+    x = y[FAST_STATES].copy()
+    previous = None
+    steps, changes = [], []
+    for _ in range(max_sweeps):
+        g = sweep(x)
+        residual = g - x
+        x = g
+        if np.all(np.abs(residual) <= tolerance * (np.abs(g) + tolerance)):
+            break
+        if previous is not None:
+            steps.append(g - previous[0])
+            changes.append(residual - previous[1])
+            gamma = np.linalg.lstsq(np.array(changes[-ANDERSON:]).T,
+                                    residual, rcond=None)[0]
+            x = np.maximum(g - np.array(steps[-ANDERSON:]).T @ gamma,
+                           0.5 * g)
+        previous = (g, residual)
+    y[FAST_STATES] = x
+    return y
+
+
+def ReducedModel(time, y0, dataset, run_no, ph_mode):
+    """Standard model with the fast substrates at quasi-steady state"""
+    y = quasi_steady(y0, dataset, ph_mode,
+                     getattr(dataset, "quasi_steady", None),
+                     tolerance=MODEL_TOLERANCE)
+    # Start the next evaluation from this solution, the Manager rolls
+    # it back with the logs of evaluations that are not kept
+    dataset.quasi_steady = y[FAST_STATES]
+    y_dot = Standard(time, y, dataset, run_no, ph_mode)
+    y_dot[FAST_STATES] = 0.
+    return y_dot
+
+
+def outputs(time, y0, dataset, run_no, ph_mode):
+    """State of the reactor with the fast states filled in
+
+    The output does not enter finite differences of the solver, so
+    a looser tolerance than in the model suffices.
+    """
+    return quasi_steady(y0, dataset, ph_mode,
+                        getattr(dataset, "quasi_steady", None),
+                        tolerance=OUTPUT_TOLERANCE)
@@ -97,33 +97,14 @@ def Standard(time, y0, dataset, run_no, ph_mode):
     #       Section 2: pH Computation
     #
     # ---------------------------------------------------
-    H = 1e-8
-    Hfunc = 1
-    pH = 8
-
     # -- Create data for arguments
-    _data = {"co2": [co2, ka1_co2, ka2_co2],
-             "HAc": [hac, ka_hac], "HPr": [hpr, ka_hpr],
-             "HBut": [hbut, ka_hbut], "HVal": [hval, ka_hval],
-             "Other": [a, z, kw], "h2po4": [h2po4, ka_h2po4],
-             "NH3": [nh3, ka_nh4]}
+    _data = ph.charge_balance(co2, hac, hpr, hbut, hval, a, z, h2po4, nh3,
+                              dataset.henry_constants)
     # --
     # TODO: Most cases, the pH fails horribly due to some external factors
     # which could either be the constants not working properly or other
     # issues that are stemming from the substrate / feed definitions.
-    if ph_mode.method == "newton-raphson":
-        while abs(Hfunc - H) > 1e-12 or pH is None:
-            H, Hfunc = ph.newton_raphson(H, Hfunc, **_data)
-            pH = - np.log10(Hfunc)
-    elif ph_mode.method == "fsolve":
-        pH = ph.find_roots(data=_data)
-    elif ph_mode.method == "brentq":
-        pH = ph.brent_dekker(data=_data)
-    elif ph_mode.method == "fixed":
-        pH = ph_mode.value
-    else:
-        print("Unknown method")
-        raise
+    pH, H = ph.solve(ph_mode, _data)
 
     try:
         assert pH is not None
@@ -269,10 +250,13 @@ def Standard(time, y0, dataset, run_no, ph_mode):
     #       Appendix A: Data Logging
     #
     # --------------------------------------------
-    test = np.copy(yieldc.transpose())
-    test[test > 0] = 0
-    dataset._update("debug", [run_no, time] +
-                    mu[:, 0].tolist() + [pH, dataset.flow_in, flow_in] +
-                    ((test) @ (z)).tolist())
+    # The log can be switched off and recomputed after the run by
+    # boyle.tools.analysis.recomputeDiagnostics
+    if getattr(dataset, "diagnostics", True):
+        test = np.copy(yieldc.transpose())
+        test[test > 0] = 0
+        dataset._update("debug", [run_no, time] +
+                        mu[:, 0].tolist() + [pH, dataset.flow_in, flow_in] +
+                        ((test) @ (z)).tolist())
 
     return y_dot
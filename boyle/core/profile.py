@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+Feed Profiles
+
+Feed of a dataset as a function of time. The rows of the feed
+are taken as samples of a feed schedule at their time points and
+the flows, the temperature and the substrate flows in between are
+interpolated:
+
+    step    the value of the feed interval a time falls in, the
+            same feed as the Manager uses between restarts
+    linear  piecewise-linear between the rows
+    cubic   shape preserving piecewise cubic (PCHIP) between the
+            rows, which does not overshoot into negative flows
+
+Before the first row and after the last row the feed is held at
+the value of that row. The temperature dependent constants are
+computed once on a grid of temperatures spanning the feed and
+interpolated linearly at the temperature of the profile.
+
+A profile lets a single integration cover the whole schedule, so
+smooth or high resolution feeds do not restart the solver at every
+row. Only models reading the feed from the dataset at every call,
+like the Standard model, follow a profile.
+"""
+
+import numpy as np
+from scipy.interpolate import PchipInterpolator
+
+PROFILE_KINDS = ("step", "linear", "cubic")
+
+# Layout of the packed temperature dependent constants
+MU_MAX_KEYS = (("k0_carbon", ()), ("k0_prot", ()), ("mu_max_t0", (8, 1)),
+               ("mu_max", (8, 1)))
+HENRY_KEYS = (("k_h", (4,)), ("ka1_lcfa", ()), ("ka_nh4", ()),
+              ("ka_hac", ()), ("ka_hpr", ()), ("ka_hbut", ()),
+              ("ka_hval", ()), ("ka1_co2", ()), ("ka2_co2", ()),
+              ("ka_h2s", ()), ("ka_h2po4", ()), ("kw", ()))
+
+
+def _pack(values, layout):
+    """Flat array of the values of a dictionary"""
+    return np.hstack([np.ravel(np.asarray(values.get(key), dtype=float))
+                      for key, _ in layout])
+
+
+def _slices(layout, start=0):
+    """Positions of the values of a layout in a flat array"""
+    slices = []
+    for key, shape in layout:
+        size = int(np.prod(shape))
+        slices.append((key, start if shape == () else
+                       slice(start, start + size), shape))
+        start += size
+    return slices
+
+
+def _unpack(array, slices):
+    """Dictionary of the values of a flat array"""
+    return {key: array[idx] if shape == () else array[idx].reshape(shape)
+            for key, idx, shape in slices}
+
+
+class FeedProfile:
+    def __init__(self, dataset, kind="linear", resolution=0.5):
+        """Set up the feed of a dataset as a function of time
+
+        PARAMETERS
+        ----------
+        dataset : Dataset
+        kind : str
+            Interpolation between the rows of the feed, one of
+            PROFILE_KINDS
+        resolution : float
+            Largest spacing in degrees of the temperatures the
+            constants are computed at
+        """
+        if kind not in PROFILE_KINDS:
+            raise ValueError("Unknown feed profile {}".format(kind))
+        self.kind = kind
+        payload = dataset.feed_payload
+        self.times = np.asarray(payload["tp"], dtype=float)
+        self.temperatures = np.asarray(payload["temp"], dtype=float)
+        # -- flows, temperature and substrate flows of every row
+        self._feed = np.column_stack([payload["flows"], self.temperatures,
+                                      payload["substrates"]])
+        self._spline = None
+        if kind == "cubic" and self.times.size > 1:
+            self._spline = PchipInterpolator(self.times, self._feed, axis=0,
+                                             extrapolate=False)
+        # -- temperature dependent constants on a temperature grid
+        low, high = self.temperatures.min(), self.temperatures.max()
+        grid = np.union1d(self.temperatures, np.linspace(
+            low, high, int(np.ceil((high - low) / resolution)) + 1))
+        self._grid = grid
+        self._constants = np.array([
+            np.hstack([_pack(mu_max.get("params"), MU_MAX_KEYS),
+                       _pack(hc, HENRY_KEYS)])
+            for mu_max, hc, _ in (dataset.temperature_constants(temp)
+                                  for temp in grid)])
+        self._mu_max_slices = _slices(MU_MAX_KEYS)
+        self._henry_slices = _slices(
+            HENRY_KEYS, self._mu_max_slices[-1][1].stop)
+        # -- constants of the last temperature, which mostly repeats
+        self._last = (None, None)
+
+    def index(self, time):
+        """Row of the feed interval a time falls in"""
+        return min(int(np.searchsorted(self.times, time)),
+                   self.times.size - 1)
+
+    def feed(self, time):
+        """Flows, temperature and substrate flows at a time"""
+        times = self.times
+        if self.kind == "step" or times.size == 1:
+            return self._feed[self.index(time)]
+        time = min(max(time, times[0]), times[-1])
+        if self._spline is not None:
+            return self._spline(time)
+        idx = min(max(int(np.searchsorted(times, time)), 1), times.size - 1)
+        weight = (time - times[idx - 1]) / (times[idx] - times[idx - 1])
+        return self._feed[idx - 1] + weight * \
+            (self._feed[idx] - self._feed[idx - 1])
+
+    def constants(self, temp):
+        """Growth rates and henry constants at a temperature"""
+        if temp == self._last[0]:
+            return self._last[1]
+        grid = self._grid
+        if grid.size == 1:
+            constants = self._constants[0]
+        else:
+            idx = min(max(int(np.searchsorted(grid, temp)), 1), grid.size - 1)
+            weight = (temp - grid[idx - 1]) / (grid[idx] - grid[idx - 1])
+            constants = self._constants[idx - 1] + weight * \
+                (self._constants[idx] - self._constants[idx - 1])
+        values = dict(params=_unpack(constants, self._mu_max_slices)), \
+            _unpack(constants, self._henry_slices)
+        self._last = (temp, values)
+        return values
+
+    def __call__(self, time):
+        """Values of the feed at a time, like those of an interval"""
+        feed = self.feed(time)
+        mu_max, hc = self.constants(feed[2])
+        return dict(flow_in=feed[0], flow_out=feed[1],
+                    substrate_flow=feed[3:], mu_max=mu_max,
+                    henry_constants=hc)
+
+
+def ProfiledModel(time, y0, dataset, ph_mode, function):
+    """Evaluate a model at the feed of the profile of a run
+
+    The run context is moved to the time first, the model sees the
+    row of the feed interval the time falls in as run number.
+    """
+    run_no = dataset.move_to_time(time)
+    return function(time, y0, dataset, run_no, ph_mode)
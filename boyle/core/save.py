@@ -12,7 +12,7 @@ or saving to disk for later.
 import os
 import time
 import h5py as h5
-from numpy import string_
+import numpy as np
 
 
 # Splitting Header Items
@@ -35,49 +35,201 @@ HEADER_DEGRADERS = ["dead_cell", "degr_carb", "degr_amino", "degr_lipid",
 
 HEADER_END = ["gasrate"]
 
+HEADER_RATES = ["rate_{}".format(item) for item in HEADER_CORE[:16]]
+
 # Set a dictionary of headers that are to be set when saving
 # outputs to file.
 OUTPUT_HEADERS = dict(
-    debug=HEADER_START + HEADER_DEBUG + HEADER_VOL + HEADER_CORE +
-    HEADER_DEGRADERS,
+    debug=HEADER_START + HEADER_DEBUG + HEADER_RATES,
     solution=HEADER_START + HEADER_VOL + HEADER_CORE + HEADER_DEGRADERS +
     HEADER_END
 )
 
+# Output profiles of to_hdf5. A profile sets the dtype of the
+# outputs, the columns kept of every output by name (all columns
+# when not given, none drops the output), the decimation keeping
+# every n-th row in time and the compression and shuffle filters.
+# run_no and time are always kept.
+OUTPUT_PROFILES = {
+    "full": dict(dtype="float64", columns={}, decimation=1,
+                 compression=None, compression_opts=None, shuffle=False),
+    "compact": dict(dtype="float32", columns={}, decimation=1,
+                    compression="gzip", compression_opts=4, shuffle=True),
+    "archive": dict(dtype="float32", columns={"debug": []}, decimation=2,
+                    compression="gzip", compression_opts=9, shuffle=True),
+}
+COMPRESSION_FILTERS = (None, "gzip", "lzf")
+# Rows of a chunk of a compressed output
+CHUNK_ROWS = 4096
+
+# Inputs of a simulation by the names of the files of a data folder
+INPUT_NAMES = ("Const1", "Const2", "feed", "inoculum", "yc")
+# States the Dataset appends to the inoculum, the accumulated gas
+GAS_STATES = 4
+
+
+def output_profile(profile):
+    """Settings of an output profile given by name or as a dict
+
+    Settings left out of a dict are those of the full profile.
+    """
+    if isinstance(profile, str):
+        if profile not in OUTPUT_PROFILES:
+            raise ValueError("Unknown output profile {}".format(profile))
+        return dict(OUTPUT_PROFILES.get(profile), name=profile)
+    settings = dict(OUTPUT_PROFILES.get("full"), name="custom")
+    settings.update(profile or {})
+    if np.dtype(settings.get("dtype")) not in (np.float32, np.float64):
+        raise ValueError("Outputs are stored as float32 or float64")
+    if settings.get("compression") not in COMPRESSION_FILTERS:
+        raise ValueError("Unknown compression filter {}".format(
+            settings.get("compression")))
+    if int(settings.get("decimation")) < 1:
+        raise ValueError("The decimation keeps every n-th row, n >= 1")
+    return settings
+
+
+def dataset_inputs(dataset):
+    """Input arrays of a Dataset or RunContext as they were given"""
+    inputs = {}
+    for name in INPUT_NAMES:
+        item = getattr(dataset, name, None)
+        if item is not None:
+            inputs[name] = np.asarray(item.get("value"))
+    if "inoculum" in inputs:
+        inputs["inoculum"] = inputs.get("inoculum")[:-GAS_STATES]
+    return inputs
+
+
+def _write_inputs(group, inputs):
+    """Write input arrays to a group, strings of records as bytes"""
+    for name in INPUT_NAMES:
+        value = inputs.get(name)
+        if value is None:
+            continue
+        value = np.asarray(value)
+        if value.dtype.names:
+            # -- HDF5 has no unicode strings of fixed length
+            value = value.astype([
+                (field, value.dtype[field].str.replace("<U", "S")
+                 if value.dtype[field].kind == "U" else value.dtype[field])
+                for field in value.dtype.names])
+        group[name] = value
 
-def to_hdf5(path, dataset, internals=False):
-    """Save the dataset to hdf5 file"""
-    _out_ = h5.File(path, "w")
-    # --
-    input_data_grp = _out_.create_group("Input")
-    input_data_grp["feed"] = dataset.feed.get("value")
-    input_data_grp["inoculum"] = dataset.inoculum.get("value")
-    # --
-    output_data_grp = _out_.create_group("Output")
-    output_data_grp["debug"] = dataset.debug[1:]
-    output_data_grp["solution"] = dataset.y_hat
-    # --
-    headers = _out_.create_group("Headers")
-    headers["debug"] = [string_(item) for item in
-                        OUTPUT_HEADERS.get("debug")]
-    headers["solution"] = [string_(item) for item in
-                           OUTPUT_HEADERS.get("solution")]
-    # -- save functions for process computations
-    if dataset.dump_internals:
-        hc = _out_.create_group("henryconstants")
-        hc["data"] = dataset.hc_data
-        # -- mu_max dataset
-        mu_max = _out_.create_group("GrowthData")
-        for key in dataset.mu_max_data[0]:
-            payload = []
-            for row in dataset.mu_max_data:
-                payload.append(row.get(key))
-            # --
-            mu_max[key] = payload
+
+def to_bundle(path, inputs):
+    """Save the inputs of a simulation to a single file
+
+    The inputs are given as a dict like from_localpath returns or
+    as a Dataset. Paths ending in .npz hold one array per input,
+    other paths are HDF5 files with an Input group like to_hdf5
+    writes. Load them by boyle.core.load.from_bundle.
+    """
+    if not isinstance(inputs, dict):
+        inputs = dataset_inputs(inputs)
+    missing = [name for name in INPUT_NAMES if name not in inputs]
+    if missing:
+        raise ValueError("Missing inputs {}".format(missing))
+    if str(path).endswith(".npz"):
+        np.savez(path, **{name: np.asarray(inputs.get(name))
+                          for name in INPUT_NAMES})
+        return
+    with h5.File(path, "w") as _out_:
+        _write_inputs(_out_.create_group("Input"), inputs)
+
+
+def _write_output(group, name, values, settings, headers=None):
+    """Write an output with the columns, rows and filters of a profile
+
+    The headers of the columns written are stored as an attribute
+    of the output, those of OUTPUT_HEADERS unless given. Outputs
+    with more columns than headers are rejected. The last row is
+    always kept.
+    """
+    values = np.asarray(values, dtype=float)
+    known = headers or OUTPUT_HEADERS.get(name)
+    if values.shape[1] > len(known):
+        raise ValueError("The {} output has {} columns but {} headers".format(
+            name, values.shape[1], len(known)))
+    headers = known[:values.shape[1]]
+    columns = settings.get("columns").get(name)
+    if columns is not None:
+        if not columns:
+            return
+        unknown = set(columns) - set(headers)
+        if unknown:
+            raise ValueError("Columns {} are not in the {} output".format(
+                sorted(unknown), name))
+        headers = [item for item in headers
+                   if item in HEADER_START or item in columns]
+        values = values[:, [known.index(item)
+                            for item in headers]]
+    step = int(settings.get("decimation"))
+    if step > 1 and values.shape[0]:
+        rows = np.arange(0, values.shape[0], step)
+        if rows[-1] != values.shape[0] - 1:
+            rows = np.append(rows, values.shape[0] - 1)
+        values = values[rows]
+    filters = {}
+    if values.size and (settings.get("compression") or
+                        settings.get("shuffle")):
+        # -- filters need chunks, these hold whole rows
+        filters = dict(compression=settings.get("compression"),
+                       compression_opts=settings.get("compression_opts"),
+                       shuffle=bool(settings.get("shuffle")),
+                       chunks=(min(CHUNK_ROWS, values.shape[0]),
+                               values.shape[1]))
+    output = group.create_dataset(name, data=values.astype(
+        settings.get("dtype")), **filters)
+    # -- bytes, h5py 2 does not store lists of str as attributes
+    output.attrs["headers"] = np.array([item.encode() for item in headers],
+                                       dtype=bytes)
+
+
+def to_hdf5(path, dataset, internals=False, profile="full"):
+    """Save the dataset to hdf5 file
+
+    With internals, the henry constants and growth rates of every
+    feed interval are stored as well. The debug output is only
+    stored by models that log it. The outputs are written with the
+    output profile, see OUTPUT_PROFILES, the headers of their
+    columns are attributes of the outputs. All inputs are stored
+    in the Input group, so the file can be run again, see
+    boyle.core.load.from_bundle.
+    """
+    settings = output_profile(profile)
+    with h5.File(path, "w") as _out_:
+        input_data_grp = _out_.create_group("Input")
+        _write_inputs(input_data_grp, dataset_inputs(dataset))
+        # --
+        output_data_grp = _out_.create_group("Output")
+        output_data_grp.attrs["profile"] = settings.get("name")
+        headers = getattr(dataset, "headers", None) or {}
+        debug = getattr(dataset, "debug", None)
+        if debug is not None and len(debug) > 1:
+            _write_output(output_data_grp, "debug", debug[1:], settings)
+        _write_output(output_data_grp, "solution", dataset.y_hat, settings,
+                      headers.get("solution"))
+        # -- save functions for process computations
+        if internals:
+            hc = _out_.create_group("henryconstants")
+            hc["data"] = dataset.hc_data
+            # -- mu_max dataset
+            mu_max = _out_.create_group("GrowthData")
+            for key in dataset.mu_max_data[0]:
+                payload = []
+                for row in dataset.mu_max_data:
+                    payload.append(row.get(key))
+                # --
+                mu_max[key] = payload
 
 
 def to_file(_path, _dset):
-    """Save as file function for sending it to file."""
+    """Save as file function for sending it to file.
+
+    The file is named after the time and the process, runs of
+    several processes go to boyle.core.store.ScenarioStore.
+    """
     output_time = time.gmtime()
     # - get identifiers from the values.
     _year = output_time.tm_year
@@ -85,10 +237,11 @@ def to_file(_path, _dset):
     _day = output_time.tm_mday
     _hour = output_time.tm_hour
     _minute = output_time.tm_min
+    _second = output_time.tm_sec
     # - generate file name
-    file_name = "output_Y{year}M{month}D{day}_{hour}H{m}M.hdf5".format(
-        year=_year, month=_month, day=_day, hour=_hour, m=_minute
-    )
+    file_name = "output_Y{year}M{month}D{day}_{hour}H{m}M{s}S_{pid}" \
+        ".hdf5".format(year=_year, month=_month, day=_day, hour=_hour,
+                       m=_minute, s=_second, pid=os.getpid())
     # - create path to the filename
     output_path = os.path.join(_path, file_name)
     # -- creating file by trying
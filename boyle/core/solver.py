@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+"""
+Solvers
+
+Creation of the solver backends used by the Manager and the
+absolute tolerances scaled to the magnitude of every state. The
+stiff solvers of scipy.integrate.solve_ivp are wrapped to give
+them the interface of scipy.integrate.ode. Unlike vode and lsoda,
+these solvers accept a sparsity pattern of the Jacobian, which
+keeps the finite-difference Jacobian cheap for models with many
+weakly coupled states.
+"""
+
+import numpy as np
+import scipy.integrate
+from scipy.integrate import BDF, Radau
+
+# Solver names accepted by the Manager next to vode and lsoda
+IVP_METHODS = {"bdf": BDF, "radau": Radau}
+
+# Settings of STANDARD_SOLVER that are understood by the
+# solve_ivp solvers. The remaining vode settings are ignored.
+IVP_SETTINGS = ("rtol", "atol", "first_step", "max_step")
+
+# Settings understood by the scipy.integrate.ode backends
+ODE_SETTINGS = {
+    "vode": ("method", "with_jacobian", "rtol", "atol", "lband", "uband",
+             "order", "nsteps", "max_step", "min_step", "first_step"),
+    "lsoda": ("with_jacobian", "rtol", "atol", "lband", "uband", "nsteps",
+              "max_step", "min_step", "first_step", "ixpr", "max_hnil",
+              "max_order_ns", "max_order_s"),
+}
+
+BACKENDS = tuple(ODE_SETTINGS) + tuple(IVP_METHODS)
+
+
+def create_solver(model, name, settings):
+    """Create the solver backend of the given name for a model"""
+    if name in ODE_SETTINGS:
+        options = {key: value for key, value in settings.items()
+                   if key in ODE_SETTINGS.get(name)}
+        return scipy.integrate.ode(model.function, model.jacobian) \
+            .set_integrator(name, **options)
+    elif name in IVP_METHODS:
+        return IVPSolver(model.function, model.jacobian, model.sparsity) \
+            .set_integrator(name, **settings)
+    raise ValueError("Unknown Solver {}".format(name))
+
+
+def solver_statistics(solver):
+    """Steps and right-hand side calls since the initial value"""
+    if isinstance(solver, IVPSolver):
+        return dict(steps=solver.steps, rhs_calls=solver.rhs_calls)
+    # vode and lsoda keep them in IWORK(11) and IWORK(12)
+    iwork = solver._integrator.iwork
+    return dict(steps=int(iwork[10]), rhs_calls=int(iwork[11]))
+
+
+def state_scales(dataset):
+    """Typical magnitude of every state of a dataset
+
+    The scale of a species is the larger of its inoculum value
+    and its largest feed concentration. The gas flow states start
+    empty and scale with the reactor volume. States that are zero
+    everywhere get the smallest scale found among the others.
+    """
+    inoculum = np.abs(np.asarray(dataset.inoculum.get("value"), dtype=float))
+    feed = np.abs(dataset.feed.get("value")[:, 4:]).max(axis=0)
+    scales = inoculum.copy()
+    scales[1:1 + feed.size] = np.maximum(scales[1:1 + feed.size], feed)
+    scales[29:] = np.maximum(scales[29:], inoculum[0])
+    return np.maximum(scales, scales[scales > 0].min())
+
+
+def scaled_settings(settings, scales):
+    """Replace atol_scale in solver settings by a vector atol"""
+    settings = dict(settings)
+    factor = settings.pop("atol_scale", None)
+    if factor is not None:
+        settings["atol"] = factor * np.asarray(scales)
+    return settings
+
+
+class IVPSolver:
+    def __init__(self, f, jac=None, sparsity=None):
+        """Set up an ode-like solver around a solve_ivp method
+
+        PARAMETERS
+        ----------
+        f : callable
+            Right-hand side called as f(t, y, *f_params)
+        jac : callable
+            Optional Jacobian called as jac(t, y, *jac_params)
+        sparsity : array_like
+            Optional sparsity pattern of the Jacobian
+        """
+        self.f = f
+        self.jac = jac
+        self.sparsity = sparsity
+        self.f_params = ()
+        self.jac_params = ()
+        self._method = BDF
+        self._settings = {}
+        self._stepper = None
+        self._status = True
+        self.steps = 0
+        self.rhs_calls = 0
+        self.t = 0.
+        self.y = None
+
+    def set_integrator(self, name, **integrator_params):
+        """Select the solve_ivp method and its tolerances"""
+        self._method = IVP_METHODS.get(name)
+        if self._method is None:
+            raise ValueError("Unknown Solver {}".format(name))
+        self._settings = {key: value for key, value in
+                          integrator_params.items()
+                          if key in IVP_SETTINGS}
+        return self
+
+    def set_initial_value(self, y, t=0.):
+        self.y = np.array(y, dtype=float)
+        self.t = t
+        self._stepper = None
+        self._status = True
+        self.steps = 0
+        self.rhs_calls = 0
+        return self
+
+    def set_f_params(self, *args):
+        self.f_params = args
+        self._stepper = None
+        return self
+
+    def set_jac_params(self, *args):
+        self.jac_params = args
+        self._stepper = None
+        return self
+
+    def successful(self):
+        return self._status
+
+    def get_return_code(self):
+        return 1 if self._status else -1
+
+    def _start(self):
+        """Create the stepper from the current state"""
+        def fun(t, y):
+            self.rhs_calls += 1
+            return self.f(t, y, *self.f_params)
+        options = dict(self._settings)
+        if self.jac is not None:
+            options["jac"] = lambda t, y: self.jac(t, y, *self.jac_params)
+        elif self.sparsity is not None:
+            options["jac_sparsity"] = self.sparsity
+        self._stepper = self._method(fun, self.t, self.y, np.inf,
+                                     **options)
+
+    def integrate(self, t, step=False, relax=False):
+        """Integrate to t and return the state
+
+        With step, a single internal step is taken instead. With
+        relax, the state at the end of the internal step passing
+        t is returned, like vode's relaxed mode.
+        """
+        if self._stepper is None:
+            self._start()
+        stepper = self._stepper
+        while stepper.t < t:
+            stepper.step()
+            self.steps += 1
+            if stepper.status == "failed":
+                # Keep the last accepted state like ode does
+                self._status = False
+                return self.y
+            if step:
+                break
+        if step or relax or stepper.t == t:
+            self.t, self.y = stepper.t, stepper.y.copy()
+        else:
+            self.t, self.y = t, stepper.dense_output()(t)
+        return self.y
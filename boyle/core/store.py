@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+"""
+Scenario Store
+
+Container of the results of many runs. A store is a folder with
+one HDF5 file of every run, written by to_hdf5 and named after
+the parameter hash of the run, and a compact index of JSON lines
+with one record of every run:
+
+    key         parameter hash of the job specification
+    name        name of the job
+    file        result file relative to the folder of the store
+    status      status of the run, done or failed: <reason>
+    rows, t_end size and end time of the result
+    parameters  swept values of the job
+    inputs      key scalar inputs of the run, see scenario_inputs
+
+Result files are written to a temporary name and renamed, so any
+process can write them. The index is only appended to by the
+process owning the store, the single writer, and under a file
+lock, so workers hand their records to it. Queries only read the
+index and return handles that open a result file when it is read:
+
+    store.query(temp__gt=38, ph_method="fsolve")
+
+A run of a job specification on input data that was stored before
+replaces its result file, the index keeps the latest record of
+every key. Changed input data give a new key, see scenario_key.
+"""
+
+import os
+import json
+import hashlib
+import operator
+from datetime import datetime, timezone
+
+try:
+    import fcntl
+except ImportError:
+    # -- Windows locks byte ranges of a file instead
+    fcntl = None
+    import msvcrt
+
+import h5py as h5
+import numpy as np
+
+from boyle.core.generic import SimulationResult
+from boyle.core.save import to_hdf5, dataset_inputs
+
+INDEX = "index.jsonl"
+RUNS = "runs"
+
+# Comparisons of the queries, written as <field>__<operator>
+OPERATORS = {"eq": operator.eq, "ne": operator.ne, "gt": operator.gt,
+             "ge": operator.ge, "lt": operator.lt, "le": operator.le,
+             "in": lambda value, options: value in options}
+
+
+def lock_file(stream, locked=True):
+    """Take or release an exclusive lock of an open file"""
+    if fcntl is not None:
+        fcntl.flock(stream, fcntl.LOCK_EX if locked else fcntl.LOCK_UN)
+        return
+    # -- the first byte stands for the file, appending ignores the
+    # position
+    stream.seek(0)
+    msvcrt.locking(stream.fileno(), msvcrt.LK_LOCK if locked else
+                   msvcrt.LK_UNLCK, 1)
+
+
+def inputs_digest(dataset):
+    """Hash of the input arrays of a dataset"""
+    digest = hashlib.sha256()
+    for name, value in sorted(dataset_inputs(dataset).items()):
+        value = np.ascontiguousarray(value)
+        digest.update("{}{}{}".format(name, value.dtype.str,
+                                      value.shape).encode())
+        digest.update(value.tobytes())
+    return digest.hexdigest()
+
+
+def scenario_key(config, dataset=None):
+    """Parameter hash of a job specification
+
+    The name and the description of the job do not enter the hash.
+    With the dataset of the job, the hash takes its input arrays
+    instead of the path of the data, so a job run again after its
+    data changed gets a new key. Two jobs with the same data and
+    settings share their key.
+    """
+    config = dict(config)
+    metadata = dict(config.get("metadata") or {})
+    for item in ("name", "description", "tags"):
+        metadata.pop(item, None)
+    if dataset is not None:
+        metadata.pop("data", None)
+        metadata["inputs"] = inputs_digest(dataset)
+    config["metadata"] = metadata
+    payload = json.dumps(config, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+
+def scenario_inputs(dataset, settings):
+    """Key scalar inputs of a run of a dataset
+
+    PARAMETERS
+    ----------
+    dataset : Dataset
+    settings : dict
+        Keyword arguments of the Manager, like manager_settings
+        returns them
+    """
+    payload = dataset.feed_payload
+    temp = np.asarray(payload["temp"], dtype=float)
+    ph_mode = settings.get("ph") or {}
+    solver = settings.get("solver") or {}
+    return dict(temp=float(temp.mean()), temp_min=float(temp.min()),
+                temp_max=float(temp.max()),
+                feed_rows=int(np.size(payload["tp"])),
+                days=float(np.max(payload["tp"])) / 24,
+                flow_in=float(np.mean(payload["flows"][:, 0])),
+                ph_method=ph_mode.get("method"),
+                ph_value=ph_mode.get("value"),
+                model=settings.get("model", "standard"),
+                integrator=settings.get("integrator", "vode"),
+                step_size=settings.get("step_size"),
+                rtol=solver.get("rtol"), atol=solver.get("atol"))
+
+
+class StoredRun:
+    def __init__(self, store, record):
+        """Handle of a run in a store, read when it is used"""
+        self.store = store
+        self.record = record
+
+    def __getattr__(self, name):
+        if name in ("key", "name", "status", "rows", "t_end", "parameters",
+                    "inputs"):
+            return self.record.get(name)
+        raise AttributeError(name)
+
+    def __repr__(self):
+        return "StoredRun({}, {})".format(self.key, self.name)
+
+    @property
+    def path(self):
+        """Path of the result file, None for a failed run"""
+        if self.record.get("file") is None:
+            return None
+        return os.path.join(self.store.path, self.record.get("file"))
+
+    def open(self):
+        """SimulationResult of the run, close its file when done"""
+        return SimulationResult(h5.File(self.path, "r"))
+
+    def getDataset(self, category):
+        """An output of the run read from its file"""
+        with h5.File(self.path, "r") as stored:
+            return SimulationResult(stored).getDataset(category)
+
+    def getHeaders(self, header_type):
+        """The headers of an output of the run"""
+        with h5.File(self.path, "r") as stored:
+            return SimulationResult(stored).getHeaders(header_type)
+
+
+class ScenarioStore:
+    def __init__(self, path):
+        """Open the store in a folder, creating it if needed"""
+        self.path = os.path.abspath(path)
+        os.makedirs(os.path.join(self.path, RUNS), exist_ok=True)
+        self._index = os.path.join(self.path, INDEX)
+        # -- records read so far and the size of the index read
+        self._records = []
+        self._read = 0
+
+    def write_run(self, key, frame, internals=False, profile="full"):
+        """Write the result of a run to the store
+
+        Can be called from any process. Returns the path of the
+        result file relative to the store.
+        """
+        name = os.path.join(RUNS, "{}.hdf5".format(key))
+        path = os.path.join(self.path, name)
+        partial = "{}.{}.partial".format(path, os.getpid())
+        to_hdf5(partial, frame, internals=internals, profile=profile)
+        os.replace(partial, path)
+        return name
+
+    def append(self, record):
+        """Append a record to the index, only done by the writer"""
+        record = dict(record)
+        record.setdefault("created", datetime.now(timezone.utc).isoformat())
+        with open(self._index, "a") as stream:
+            lock_file(stream)
+            try:
+                stream.write(json.dumps(record, default=str) + "\n")
+                stream.flush()
+            finally:
+                lock_file(stream, False)
+        return StoredRun(self, record)
+
+    def add(self, key, frame, name=None, parameters=None, inputs=None,
+            internals=False, profile="full"):
+        """Write the result of a run and index it"""
+        y_hat = np.asarray(frame.y_hat)
+        return self.append(dict(
+            key=key, name=name, file=self.write_run(key, frame, internals,
+                                                    profile),
+            status="done", rows=int(y_hat.shape[0]),
+            t_end=float(y_hat[-1, 1]) if y_hat.size else None,
+            parameters=parameters or {}, inputs=inputs or {}))
+
+    def records(self):
+        """Latest record of every key in the index
+
+        Only the lines appended since the last call are read.
+        """
+        try:
+            with open(self._index, "r") as stream:
+                stream.seek(self._read)
+                lines = stream.read()
+        except FileNotFoundError:
+            return []
+        # -- a line being appended is read on the next call
+        complete = lines[:lines.rfind("\n") + 1]
+        self._read += len(complete.encode())
+        self._records.extend(json.loads(line) for line in
+                             complete.splitlines() if line.strip())
+        latest = {}
+        for record in self._records:
+            latest[record.get("key")] = record
+        return list(latest.values())
+
+    def query(self, status="done", **conditions):
+        """Runs whose inputs, parameters or record fields match
+
+        Every condition is written as <field>=value or
+        <field>__<operator>=value with an operator of OPERATORS.
+        A field is looked up in the inputs, the parameters and the
+        record in turn. Runs lacking a field do not match.
+        """
+        checks = []
+        for condition, value in conditions.items():
+            field, _, name = condition.partition("__")
+            if (name or "eq") not in OPERATORS:
+                raise ValueError("Unknown operator {}".format(name))
+            checks.append((field, OPERATORS.get(name or "eq"), value))
+        found = []
+        for record in self.records():
+            if status is not None and record.get("status") != status:
+                continue
+            fields = dict(record)
+            fields.update(record.get("parameters") or {})
+            fields.update(record.get("inputs") or {})
+            if all(field in fields and fields.get(field) is not None and
+                   compare(fields.get(field), value)
+                   for field, compare, value in checks):
+                found.append(StoredRun(self, record))
+        return found
+
+    def __len__(self):
+        return len(self.records())
+
+    def __getitem__(self, key):
+        for record in self.records():
+            if record.get("key") == key:
+                return StoredRun(self, record)
+        raise KeyError(key)
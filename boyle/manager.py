@@ -9,29 +9,86 @@ to the main application.
 """
 
 
+import time
+
 import numpy as np
-import scipy.integrate
 
-from boyle.core.generic import Dataset, pHvalue
+from boyle.core.generic import Dataset, RunContext, pHvalue
 from boyle.core.load import from_localpath
-from boyle.core.model.standard import Standard
+from boyle.core.events import create_event, event_values, crossed, locate
+from boyle.core.model import MODELS, get_model
+from boyle.core.profile import FeedProfile, ProfiledModel
+from boyle.core.solver import create_solver, state_scales, \
+    scaled_settings, solver_statistics, BACKENDS
 
 # GENERIC SETTINGS
 STANDARD_PH = {"method": "fixed", "value": 7.5}
 STANDARD_SOLVER = {"method": "bdf", "order": 1, "nsteps": 1e6,
                    "rtol": 1e-4, "atol": 1e-8}
+# Absolute tolerances proportional to the scale of every state
+SCALED_SOLVER = {"method": "bdf", "order": 1, "nsteps": 1e6,
+                 "rtol": 1e-4, "atol_scale": 1e-6}
+# Steady state detection, the tolerance is the largest rate of change
+# of a state per hour relative to its scale, which every output row
+# of the trailing window of hours has to stay below
+STEADY_STATE = {"tolerance": 1e-5, "window": 48, "fill": "repeat"}
+# States accumulating the produced gas, these grow at a steady rate
+# at steady state
+ACCUMULATED = slice(29, 33)
+# Attempts made in turn on a failing feed interval, each retrying
+# it from its start. An attempt divides the tolerances by tighten,
+# overrides solver settings, the integrator or the pH mode.
+RECOVERY = (
+    {"name": "tighten", "tighten": 100},
+    {"name": "first_step", "solver": {"first_step": 1e-6}},
+    {"name": "lsoda", "integrator": "lsoda"},
+    {"name": "bdf", "integrator": "bdf"},
+    {"name": "radau", "integrator": "radau"},
+    {"name": "newton-raphson", "ph": {"method": "newton-raphson"}},
+)
+# Values models keep on the run context between evaluations, rolled
+# back together with the logs
+WARM_STARTS = ("quasi_steady",)
+# Tight settings the pilot integration compares candidates against
+PILOT_REFERENCE = {"method": "bdf", "nsteps": 1e6,
+                   "rtol": 1e-7, "atol_scale": 1e-10}
 
 
 class Manager:
-    def __init__(self, source, ph=None, solver=STANDARD_SOLVER,
-                 step_size=0.5, model="standard"):
+    def __init__(self, source, ph=None, solver=None,
+                 step_size=0.5, model="standard", integrator="vode",
+                 diagnostics=True, profile=None, steady_state=None,
+                 recovery=RECOVERY, events=()):
         """Initialize manager for creating a simulation
 
         PARAMETERS
         ----------
         path : data
         model_name : str
-        config : dict
+        solver : dict
+            Solver settings, the settings of the model or
+            STANDARD_SOLVER by default
+        diagnostics : bool
+            Log the debug output of the model during the run. It can
+            be recomputed afterwards by recomputeDiagnostics.
+        profile : str or FeedProfile
+            Follow the feed as a function of time in a single
+            integration instead of restarting the solver at every
+            feed interval, one of step, linear or cubic
+        steady_state : bool or dict
+            Skip the remaining intervals of an identical feed once
+            the run is at steady state, see STEADY_STATE for the
+            settings. The fill setting repeat keeps the output grid,
+            coarse stores a single row for every skipped interval.
+        recovery : tuple
+            Attempts retrying a failing feed interval, see RECOVERY.
+            The attempts made are reported in recoveries. Without
+            attempts, a run stops when the pH diverges and goes on
+            with the state reached when the solver fails.
+        events : list
+            Threshold crossings of state columns or the pH watched
+            during the run, see boyle.core.events. The crossings
+            are reported in events, a terminal one ends the run.
         """
         # Get data from the local path
         if isinstance(source, Dataset):
@@ -40,8 +97,8 @@ class Manager:
             _data = from_localpath(source)
             self._frame = Dataset(**_data)
         # -- Get model information for setting model parameters
-        if model == "standard":
-            self._model = Standard
+        if model in MODELS:
+            self._model = get_model(model)
         else:
             print("Unknown model requested.")
             raise(ValueError)
@@ -53,32 +110,177 @@ class Manager:
             self._ph_settings = pHvalue(ph.get("method"),
                                         ph.get("value"))
         # -- Set simulation Configuration
-        self._solver_setting = solver
+        self._solver_setting = solver or self._model.solver or \
+            STANDARD_SOLVER
         # -- Get simulation configuration
         self._step = step_size
-        self.integrator_name = "vode"
+        self.integrator_name = integrator
+        self.diagnostics = diagnostics
+        self._scales = state_scales(self._frame)
+        self._context = RunContext(self._frame)
+        self._recovery = tuple(recovery or ())
+        self._events = [create_event(event) for event in events or ()]
+        self._steady = None
+        if steady_state:
+            self._steady = dict(STEADY_STATE, **(
+                steady_state if isinstance(steady_state, dict) else {}))
+            # -- YAML reads numbers like 1e-5 as strings
+            for key in ("tolerance", "window"):
+                self._steady[key] = float(self._steady.get(key))
+            if self._steady.get("fill") not in ("repeat", "coarse"):
+                raise ValueError("Unknown steady state fill {}".format(
+                    self._steady.get("fill")))
+        # -- Feed followed as a function of time
+        self._profile = profile
+        if isinstance(profile, str):
+            self._profile = FeedProfile(self._frame, kind=profile)
+        if self._profile is not None and self._model.arguments:
+            raise ValueError("Feed profiles need a model reading the feed "
+                             "from the dataset at every call")
 
-    def initialize_solver(self, iname):
+    def initialize_solver(self, iname, settings=None):
         """Initialize the solver for computation"""
-        if iname == "vode":
-            self._solver = scipy.integrate.ode(self._model) \
-                .set_integrator(iname, **self._solver_setting)
-        elif iname == "lsoda":
-            self._solver = scipy.integrate.ode(self._model) \
-                .set_integrator(iname, **self._solver_setting)
-        else:
-            e = "ValueError: Unknown Solver provide"
-            raise(e)
+        scales = self._state_scales(np.size(self.initial_value))
+        if settings is None:
+            settings = self._solver_setting
+        self._solver = create_solver(
+            self._model, iname, scaled_settings(settings, scales))
         # --
         self._solver.set_initial_value(y=self.initial_value,
                                        t=self._initial_time)
 
-    def start(self, dense=False, relaxed=False):
+    def _state_scales(self, n_states):
+        """Scales of the states integrated by the model"""
+        scales = self._scales
+        if self._model.scales:
+            scales = self._model.scales(scales)
+        return np.resize(scales, n_states)
+
+    def _interval_arguments(self, frame, idx, ph=None):
+        """Model arguments for the feed interval idx"""
+        _args_ = [frame, idx, ph or self._ph_settings]
+        if self._model.arguments:
+            _args_ = self._model.arguments(*_args_)
+        return _args_
+
+    def pilot(self, candidates=None, duration=None, tolerance=1e-3):
+        """Select the fastest solver on the first feed interval
+
+        Every candidate (integrator, solver settings) integrates the
+        first feed interval, or its first duration hours, and is
+        compared to a run with tight tolerances. The fastest
+        candidate whose error stays below tolerance becomes the
+        solver of the manager. The dataset is left untouched.
+
+        Returns a report with the integrator, settings, wall time
+        and error of every candidate, fastest first.
+        """
+        if candidates is None:
+            candidates = [(name, settings) for name in BACKENDS
+                          for settings in (self._solver_setting,
+                                           SCALED_SOLVER)]
+        # -- run in a context of its own to leave the run untouched
+        frame = RunContext(self._frame)
+        frame.move_index_for_iteration(index=0)
+        args = self._interval_arguments(frame, 0)
+        end_time = self._frame.feed_payload["tp"][0]
+        if duration is not None:
+            end_time = min(end_time, duration)
+        y0 = np.asarray(self._initial_state(), dtype=float)
+        if self._model.initial:
+            y0 = self._model.initial(y0, *args)
+        scales = self._state_scales(y0.size)
+
+        def run(name, settings):
+            solver = create_solver(self._model, name,
+                                   scaled_settings(settings, scales))
+            solver.set_initial_value(y=y0, t=0)
+            solver.set_f_params(*args)
+            if self._model.jacobian:
+                solver.set_jac_params(*args)
+            start = time.perf_counter()
+            try:
+                y = solver.integrate(end_time)
+            except ValueError:
+                return None, np.inf
+            if not solver.successful():
+                return None, np.inf
+            return np.array(y), time.perf_counter() - start
+
+        reference, _ = run("vode", PILOT_REFERENCE)
+        if reference is None:
+            raise ValueError("Pilot reference integration failed")
+        report = []
+        for name, settings in candidates:
+            y, wall_time = run(name, settings)
+            error = np.inf if y is None else np.max(
+                np.abs(y - reference) / (np.abs(reference) + 1e-3 * scales))
+            report.append(dict(integrator=name, settings=settings,
+                               time=wall_time, error=error,
+                               accepted=bool(error <= tolerance)))
+        report.sort(key=lambda item: item.get("time"))
+        accepted = [item for item in report if item.get("accepted")]
+        if accepted:
+            self.integrator_name = accepted[0].get("integrator")
+            self._solver_setting = accepted[0].get("settings")
+        return report
+
+    def _initial_state(self):
+        """State at the start of the current feed interval"""
+        return self._context.state
+
+    def _update_state(self, state):
+        """Keep the state at the end of a feed interval"""
+        self._context.state = state
+
+    def start(self, dense=False, relaxed=False, progress=None, resume=None):
+        """Run the simulation over all feed intervals
+
+        PARAMETERS
+        ----------
+        dense : bool
+            Store every internal step of the solver
+        relaxed : bool
+            Allow the solver to pass the requested time
+        progress : callable
+            Optional callback called as progress(idx, t) at the end
+            of every feed interval. The simulation stops after the
+            interval when it returns False.
+        resume : tuple
+            Feed interval idx and the result row ending the interval
+            before it, (idx, row). The run starts at idx from the
+            state and time of the row and the result holds the rows
+            from idx on. Not supported with feed profiles.
+
+        Returns the RunContext of the run, holding the results and
+        logs next to the inputs of the dataset. The dataset itself
+        is not changed.
+        """
         # Create result object to store results in
         self.result = []
+        self.statistics = dict(steps=0, rhs_calls=0)
+        self.steady_states = []
+        self.recoveries = []
+        self.events = []
+        self._stopped = None
+        self._context = RunContext(self._frame, self.diagnostics,
+                                   self._profile)
+        if self._model.headers:
+            self._context.headers = {"solution": self._model.headers}
+        if self._profile is not None:
+            if resume is not None:
+                raise ValueError("Runs following a profile can not resume")
+            return self._start_profile(dense, relaxed, progress)
+        skipped = -1
+        if resume is not None and resume[0] > 0:
+            skipped = resume[0] - 1
+            self._end_time = float(resume[1][1])
+            self._update_state(np.asarray(resume[1][2:], dtype=float))
         # -- loop through all available time-points to generate
         # the simulation of feeding on multiple different days.
         for idx in range(0, len(self._frame.feed_payload["tp"])):
+            if idx <= skipped:
+                continue
             if idx == 0:
                 self._initial_time = 0
                 self._end_time = self._frame.feed_payload["tp"][idx]
@@ -91,41 +293,393 @@ class Manager:
                 self._end_time = self._frame.feed_payload["tp"][idx]
             # --
             # -- move the io-object one index to get the required data
-            self._frame.move_index_for_iteration(index=idx)
-            # -- get new inoculum value from the io-object
-            self.initial_value = self._frame.inoculum.get("value")
-            # -- initialise the solver and the details of the solver
-            self.initialize_solver(iname=self.integrator_name)
-            # -- set up function parameters for a particular run_no
-            _args_ = [self._frame, idx, self._ph_settings]
-            self._solver.set_f_params(*_args_)
-            # -- start the solver with teh current run_no
-            _step = dense  # Check if there is a requirement for dense output
-            _relax = relaxed  # Check if there is a req. for relaxed output
-            try:
-                while self._solver.successful() and \
-                        self._solver.t < self._end_time:
-                    try:
-                        y_dot = self._solver.integrate(
-                            self._solver.t + self._step, step=_step,
-                            relax=_relax)
-                        row = np.hstack(
-                            [np.array([idx, self._solver.t]), y_dot])
-                        self.result.append(row)
-                    except ValueError as e:
-                        error = "ValueError: The pH is diverging."
-                        error += " Check the substrate and the pH computation."
-                        error_payload = {"result": self.result,
-                                         "internals": self._frame.debug}
-                        return error_payload
-            except KeyboardInterrupt as e:
-                er = "KEYBOARD INTERRUPT: Stopped."
-                er += " Current Iteration {}".format(self._solver.t)
-            self._end_time = self._solver.t
+            self._context.move_index_for_iteration(index=idx)
+            # -- integrate the interval, retrying it from its start
+            # with the attempts of the recovery policy if it fails
+            rows, crossings = len(self.result), len(self.events)
+            logs = self._log_lengths()
+            failures = []
+            for attempt in (None,) + self._recovery:
+                del self.result[rows:]
+                del self.events[crossings:]
+                self._rollback_logs(logs)
+                self._stopped = None
+                y_dot, error = self._integrate_interval(idx, attempt, dense,
+                                                        relaxed)
+                # -- an interrupted interval is not retried
+                if error is None or error.startswith("KEYBOARD INTERRUPT"):
+                    break
+                failures.append(error)
+                if not self._recovery:
+                    break
+            if failures and self._recovery:
+                self.recoveries.append(dict(
+                    interval=idx, time=self._initial_time, failures=failures,
+                    recovery=None if error else attempt.get("name")))
+            # -- without a recovery policy, a failing solver moves on
+            # to the next interval with the state it reached
+            if error is not None and (self._recovery or not error.startswith(
+                    "Solver failed")):
+                return self._error_payload(error)
+            self._end_time = self._solver.t if self._stopped is None \
+                else self._stopped.get("time")
             # The result chooses the elements from the
             # start of y_dot instead of the initial value set.
             # Forcing to use the result setup is probably not useful
-            self._frame.inoculum.update({"value": y_dot})
+            self._update_state(y_dot)
+            if progress is not None and progress(idx, self._end_time) is False:
+                break
+            if self._stopped is not None:
+                break
+            if self._steady is not None:
+                skipped = self._skip_steady(idx, progress)
+                if skipped is False:
+                    break
         # --
-        self._frame._update("y_hat", self.result)
-        return self._frame
+        self._context.y_hat = self.result
+        self._context.steady_states = self.steady_states
+        self._context.recoveries = self.recoveries
+        self._context.events = self.events
+        return self._context
+
+    def _error_payload(self, error):
+        """Result of a run stopped by an error"""
+        return {"result": self.result,
+                "internals": getattr(self._context, "debug", None),
+                "error": error, "recoveries": self.recoveries}
+
+    def _log_lengths(self):
+        """Lengths of the logs of the run, None for those not started
+
+        The warm starts of the model, see WARM_STARTS, are kept as
+        they are.
+        """
+        lengths = {name: len(self._context.__dict__[name])
+                   if name in self._context.__dict__ else None
+                   for name in ("debug", "mu_max_data", "hc_data")}
+        lengths.update({name: self._context.__dict__.get(name)
+                        for name in WARM_STARTS})
+        return lengths
+
+    def _rollback_logs(self, lengths):
+        """Drop what a failed attempt logged, see _log_lengths"""
+        for name, length in lengths.items():
+            if name in WARM_STARTS and length is not None:
+                setattr(self._context, name, length)
+            elif name not in self._context.__dict__:
+                continue
+            elif length is None:
+                delattr(self._context, name)
+            else:
+                del self._context.__dict__[name][length:]
+
+    def _integrate_interval(self, idx, attempt=None, dense=False,
+                            relaxed=False):
+        """Integrate the feed interval idx from the state at its start
+
+        An attempt of the recovery policy replaces the integrator,
+        tightens or changes the solver settings or the pH mode.
+        Returns the state at the end and None, or the last state
+        and a description of the failure.
+        """
+        attempt = attempt or {}
+        ph = self._ph_settings
+        if attempt.get("ph"):
+            ph = pHvalue(attempt["ph"].get("method"),
+                         attempt["ph"].get("value"))
+        settings = dict(self._solver_setting)
+        tighten = attempt.get("tighten")
+        if tighten:
+            for key in ("rtol", "atol", "atol_scale"):
+                if key in settings:
+                    settings[key] = np.asarray(settings[key]) / tighten
+        settings.update(attempt.get("solver") or {})
+        # -- set up function parameters for a particular run_no
+        _args_ = self._interval_arguments(self._context, idx, ph)
+        # -- get new inoculum value from the io-object
+        self.initial_value = self._initial_state()
+        if self._model.initial:
+            self.initial_value = self._model.initial(self.initial_value,
+                                                     *_args_)
+        # -- initialise the solver and the details of the solver
+        self.initialize_solver(attempt.get("integrator",
+                                           self.integrator_name), settings)
+        self._solver.set_f_params(*_args_)
+        if self._model.jacobian:
+            self._solver.set_jac_params(*_args_)
+        y_dot = self.initial_value
+        error = None
+
+        def values(t, y):
+            if self._model.outputs:
+                y = self._model.outputs(t, y, *_args_)
+            return event_values(self._events, y,
+                                self._context.henry_constants, ph)
+
+        if self._events:
+            watch = (self._solver.t, y_dot, values(self._solver.t, y_dot))
+        try:
+            while self._solver.successful() and \
+                    self._solver.t < self._end_time:
+                try:
+                    y_dot = self._solver.integrate(
+                        self._solver.t + self._step, step=dense,
+                        relax=relaxed)
+                except (ValueError, AssertionError) as e:
+                    error = "The pH is diverging at t={}: {}".format(
+                        self._solver.t, e)
+                    break
+                if not np.all(np.isfinite(y_dot)):
+                    error = "Non-finite state at t={}".format(self._solver.t)
+                    break
+                t = self._solver.t
+                if self._events:
+                    after = values(t, y_dot)
+                    self._stopped = self._watch_events(
+                        idx, values, *watch, t, y_dot, after,
+                        self._model.function, _args_, settings)
+                    watch = (t, y_dot, after)
+                    if self._stopped is not None:
+                        t, y_dot = self._stopped.get("time"), \
+                            self._stopped.pop("state")
+                if self._model.outputs:
+                    y_dot = self._model.outputs(t, y_dot, *_args_)
+                row = np.hstack([np.array([idx, t]), y_dot])
+                self.result.append(row)
+                if self._stopped is not None:
+                    break
+        except KeyboardInterrupt:
+            error = "KEYBOARD INTERRUPT: Stopped. Current time {}".format(
+                self._solver.t)
+        for key, value in solver_statistics(self._solver).items():
+            self.statistics[key] += value
+        if error is None and not self._solver.successful():
+            error = "Solver failed at t={} with return code {}".format(
+                self._solver.t, self._solver.get_return_code())
+        return y_dot, error
+
+    def _watch_events(self, run_no, values, t0, y0, before, t1, y1, after,
+                      function, args, settings):
+        """Record the events crossed on an output step
+
+        The crossings are located by integrating the step again
+        with solve_ivp. A run following a profile takes the run
+        number from the time of a crossing. Returns the record of a
+        terminal crossing together with its state, None otherwise.
+        """
+        conditions = [(event, lambda t, y, k=k: values(t, y)[k])
+                      for k, event in enumerate(self._events)
+                      if crossed(event, before[k], after[k])]
+        if not conditions:
+            return None
+        settings = scaled_settings(settings,
+                                   self._state_scales(np.size(y0)))
+        # -- the integration again is not part of the run, its logs
+        # are not kept
+        logs = self._log_lengths()
+        try:
+            found = locate(function, args, t0, y0, t1, conditions, settings,
+                           self._model.jacobian)
+        except (ValueError, AssertionError):
+            found = []
+        finally:
+            self._rollback_logs(logs)
+        if not found:
+            # -- the crossing time interpolated between the ends
+            found = []
+            for event, _ in conditions:
+                k = self._events.index(event)
+                share = before[k] / (before[k] - after[k])
+                found.append((t0 + share * (t1 - t0),
+                              y0 + share * (np.asarray(y1) - y0), event))
+            found.sort(key=lambda item: item[0])
+        for crossing_time, state, event in found:
+            k = self._events.index(event)
+            record = dict(name=event.name, column=event.column,
+                          threshold=event.threshold,
+                          direction="up" if before[k] < 0 else "down",
+                          time=float(crossing_time), run_no=run_no if
+                          self._profile is None else
+                          self._profile.index(crossing_time),
+                          terminal=event.terminal)
+            self.events.append(record)
+            if event.terminal:
+                return dict(record, state=np.asarray(state))
+        return None
+
+    def _steady_rates(self, idx):
+        """Rates of the states if the run is at steady state
+
+        The rates of change of the model with the feed of interval
+        idx at every output row of the trailing window, relative to
+        the larger of the scale and the value of the states, have to
+        stay below the tolerance. The accumulated gas states only
+        have to grow at a steady rate, which is returned for them
+        from the last row, None if not at steady state.
+        """
+        if not self.result:
+            return None
+        start = self.result[-1][1] - self._steady.get("window")
+        if self.result[0][1] > start:
+            return None
+        rows = []
+        for row in reversed(self.result):
+            if row[1] < start:
+                break
+            rows.append(np.asarray(row))
+        _args_ = self._interval_arguments(self._context, idx)
+        # -- the evaluations are not part of the run, their logs are
+        # not kept
+        logs = self._log_lengths()
+        steady = None
+        try:
+            # -- from the last row back, the latest rates fail first
+            for row in rows:
+                rates = np.asarray(self._model.function(row[1], row[2:],
+                                                        *_args_), dtype=float)
+                if steady is None:
+                    steady = np.zeros(rates.size)
+                    steady[ACCUMULATED] = rates[ACCUMULATED]
+                scales = np.maximum(self._state_scales(rates.size),
+                                    np.abs(row[2:]))
+                changes = np.abs(rates) / scales
+                changes[ACCUMULATED] = 0.
+                if changes.max() >= self._steady.get("tolerance"):
+                    return None
+        finally:
+            self._rollback_logs(logs)
+        return steady
+
+    def _skip_steady(self, idx, progress=None):
+        """Skip the intervals following idx with the same feed
+
+        At steady state the states are held and the accumulated gas
+        grows at its steady rate, so the skipped intervals are filled
+        without integrating them. Every skip is reported in
+        steady_states. Returns the last interval skipped, idx if
+        nothing was skipped and False if progress stopped the run.
+        """
+        feed = self._frame.feed.get("value")
+        times = self._frame.feed_payload["tp"]
+        last = idx
+        while last + 1 < len(times) and \
+                np.array_equal(feed[last + 1, 1:], feed[idx, 1:]):
+            last += 1
+        if last == idx:
+            return idx
+        rates = self._steady_rates(idx)
+        if rates is None:
+            return idx
+        start_time = self._end_time
+        y_steady = np.asarray(self.result[-1][2:])
+        if self._steady.get("fill") == "repeat":
+            steps = np.arange(1, int(np.ceil(
+                (times[last] - start_time) / self._step)) + 1)
+            grid = np.minimum(start_time + self._step * steps, times[last])
+        else:
+            grid = times[idx + 1:last + 1]
+        for t in grid:
+            row_idx = min(int(np.searchsorted(times, t)), last)
+            y = y_steady + rates * (t - start_time)
+            self.result.append(np.hstack([np.array([row_idx, t]), y]))
+        self._end_time = times[last]
+        self._update_state(self.result[-1][2:])
+        self.steady_states.append(dict(start=idx + 1, end=last,
+                                       time=start_time,
+                                       end_time=self._end_time))
+        if progress is not None:
+            for item in range(idx + 1, last + 1):
+                if progress(item, times[item]) is False:
+                    return False
+        return last
+
+    def _start_profile(self, dense=False, relaxed=False, progress=None):
+        """Run the simulation over the feed profile in one integration
+
+        The rows of the result carry the feed interval their time
+        falls in, progress is called once the time passes the end
+        of an interval like in start. A single integration can not
+        go on after a failure, so every error of the solver returns
+        the error payload of start.
+        """
+        times = self._frame.feed_payload["tp"]
+        self._initial_time = 0
+        self._end_time = times[-1]
+        self.initial_value = self._initial_state()
+        scales = self._state_scales(np.size(self.initial_value))
+        self._solver = create_solver(
+            self._model._replace(function=ProfiledModel),
+            self.integrator_name,
+            scaled_settings(self._solver_setting, scales))
+        self._solver.set_initial_value(y=self.initial_value,
+                                       t=self._initial_time)
+        _args_ = (self._context, self._ph_settings, self._model.function)
+        self._solver.set_f_params(*_args_)
+        y_dot = self.initial_value
+
+        def fill(t, y):
+            run_no = self._context.move_to_time(t)
+            if self._model.outputs:
+                y = self._model.outputs(t, y, self._context, run_no,
+                                        self._ph_settings)
+            return run_no, y
+
+        def values(t, y):
+            return event_values(self._events, fill(t, y)[1],
+                                self._context.henry_constants,
+                                self._ph_settings)
+
+        if self._events:
+            watch = (self._solver.t, y_dot, values(self._solver.t, y_dot))
+        idx = 0
+        try:
+            while self._solver.successful() and \
+                    self._solver.t < self._end_time:
+                try:
+                    y_dot = self._solver.integrate(
+                        self._solver.t + self._step, step=dense,
+                        relax=relaxed)
+                except (ValueError, AssertionError) as e:
+                    return self._error_payload(
+                        "The pH is diverging at t={}: {}".format(
+                            self._solver.t, e))
+                if not np.all(np.isfinite(y_dot)):
+                    return self._error_payload(
+                        "Non-finite state at t={}".format(self._solver.t))
+                t = self._solver.t
+                if self._events:
+                    after = values(t, y_dot)
+                    self._stopped = self._watch_events(
+                        None, values, *watch, t,
+                        y_dot, after, ProfiledModel, _args_,
+                        self._solver_setting)
+                    watch = (t, y_dot, after)
+                    if self._stopped is not None:
+                        t, y_dot = self._stopped.get("time"), \
+                            self._stopped.pop("state")
+                run_no, y_dot = fill(t, y_dot)
+                row = np.hstack([np.array([run_no, t]), y_dot])
+                self.result.append(row)
+                stop = self._stopped is not None
+                while idx < len(times) and times[idx] <= t:
+                    stop = stop or (progress is not None and progress(
+                        idx, t) is False)
+                    idx += 1
+                if stop:
+                    break
+        except KeyboardInterrupt:
+            return self._error_payload(
+                "KEYBOARD INTERRUPT: Stopped. Current time {}".format(
+                    self._solver.t))
+        for key, value in solver_statistics(self._solver).items():
+            self.statistics[key] += value
+        if not self._solver.successful():
+            return self._error_payload(
+                "Solver failed at t={} with return code {}".format(
+                    self._solver.t, self._solver.get_return_code()))
+        self._update_state(y_dot)
+        self._end_time = self._solver.t if self._stopped is None \
+            else self._stopped.get("time")
+        self._context.y_hat = self.result
+        self._context.events = self.events
+        return self._context
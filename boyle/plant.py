@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+
+"""
+Plant Simulation
+
+Simulation of several digesters operated in series. The states
+of all reactors are stacked into one vector and integrated
+together. The first reactor receives the feed of the dataset,
+every following reactor receives the effluent of the reactor
+before it at the composition of that reactor. All reactors run
+at the temperature of the feed and share the temperature
+dependent constants of the interval. The columns of the states of
+reactor k are saved with the prefix rk., r1.volume, r2.volume.
+"""
+
+import numpy as np
+from scipy import sparse
+
+from boyle.core.model import Model
+from boyle.core.save import OUTPUT_HEADERS
+from boyle.core.model.network import NetworkModel, network_parameters, \
+    STANDARD_STRUCTURE, STANDARD_SPARSITY
+from boyle.manager import Manager, STANDARD_SOLVER
+
+N_STATES = len(STANDARD_STRUCTURE.get("index"))
+STATE_HEADERS = OUTPUT_HEADERS.get("solution")[2:2 + N_STATES]
+
+
+def PlantModel(time, y0, structure, params, ph_mode, n_reactors):
+    """Right-hand side of reactors in series
+
+    Reactor k > 0 is fed with the outflow of reactor k - 1 and
+    keeps its volume, its outflow equals its inflow.
+    """
+    liquid = structure.get("liquid")
+    y_dot = np.empty_like(y0)
+    reactor_params = params
+    for k in range(n_reactors):
+        block = slice(k * N_STATES, (k + 1) * N_STATES)
+        if k > 0:
+            upstream = y0[(k - 1) * N_STATES:k * N_STATES]
+            flow = reactor_params.get("flow_out")
+            reactor_params = dict(params, flow_in=flow, flow_out=flow,
+                                  inflow=flow * upstream[liquid])
+        y_dot[block] = NetworkModel(time, y0[block], structure,
+                                    reactor_params, ph_mode)
+    return y_dot
+
+
+def plant_sparsity(n_reactors, structure=STANDARD_STRUCTURE,
+                   pattern=STANDARD_SPARSITY):
+    """Block-sparse Jacobian pattern of reactors in series
+
+    The diagonal blocks hold the pattern of a single reactor. A
+    reactor depends on the one before it through its inflow, which
+    enters the balance of the same species and, through the gas
+    transfer, the balances of the dissolved gases and gas flows.
+    """
+    liquid = structure.get("liquid")
+    gas_rows = np.concatenate([structure.get("gas"),
+                               structure.get("gas_liquid")])
+    coupling = np.zeros_like(pattern)
+    coupling[liquid, liquid] = True
+    coupling[gas_rows[:, None], liquid] = True
+    blocks = sparse.kron(sparse.identity(n_reactors), pattern) + \
+        sparse.kron(sparse.eye(n_reactors, k=-1), coupling)
+    return (blocks != 0).tocsr()
+
+
+def plant_headers(n_reactors):
+    """Headers of the solution rows of reactors in series"""
+    return OUTPUT_HEADERS.get("solution")[:2] + [
+        "r{}.{}".format(k + 1, name) for k in range(n_reactors)
+        for name in STATE_HEADERS]
+
+
+class Plant(Manager):
+    def __init__(self, source, reactors=2, inocula=None, ph=None,
+                 solver=STANDARD_SOLVER, step_size=0.5, integrator="bdf"):
+        """Initialize a plant of digesters in series
+
+        PARAMETERS
+        ----------
+        source : Dataset or path
+        reactors : int
+            Number of reactors in series
+        inocula : list
+            Optional initial states of every reactor. The inoculum
+            of the dataset is used for all reactors otherwise.
+        """
+        super().__init__(source, ph=ph, solver=solver, step_size=step_size,
+                         model="network", integrator=integrator)
+        self.reactors = reactors
+        if inocula is None:
+            inocula = [self._frame.inoculum.get("value")] * reactors
+        elif len(inocula) != reactors:
+            raise ValueError("One inoculum is required for every reactor")
+        self._state = np.concatenate([np.asarray(item, dtype=float)
+                                      for item in inocula])
+        self._model = Model(PlantModel, None, self._arguments,
+                            plant_sparsity(reactors),
+                            headers=plant_headers(reactors))
+
+    def _arguments(self, dataset, run_no, ph_mode):
+        """Solver arguments shared by all reactors of an interval"""
+        params = network_parameters(STANDARD_STRUCTURE, dataset)
+        return [STANDARD_STRUCTURE, params, ph_mode, self.reactors]
+
+    def _initial_state(self):
+        return self._state
+
+    def _update_state(self, state):
+        self._state = state
+
+    def split(self, y_hat=None):
+        """Split stacked result rows into one array per reactor
+
+        Every array has the run number and time columns followed
+        by the states of the reactor.
+        """
+        if y_hat is None:
+            y_hat = self.result
+        y_hat = np.asarray(y_hat)
+        return [np.hstack([y_hat[:, :2],
+                           y_hat[:, 2 + k * N_STATES:2 + (k + 1) * N_STATES]])
+                for k in range(self.reactors)]
@@ -0,0 +1,329 @@
+#!/usr/bin/env python
+
+"""
+Job Server
+
+Local service that runs simulations for other applications. The
+server listens on a TCP socket on localhost and reads one JSON
+message per connection:
+
+    {"action": "submit", "job": {...}}      job in simulation.yaml format
+    {"action": "submit", "config": path}    path of a simulation.yaml
+    {"action": "watch", "job": id}
+    {"action": "cancel", "job": id}
+    {"action": "status", "job": id}         or without a job for all
+
+Replies are JSON lines and the connection is closed after the
+last reply. A submitted job is answered with an accepted event
+and, unless watch is false, followed by its events until it
+ends: started, one progress event per feed interval and finally
+done, cancelled or failed.
+
+The jobs run in a bounded pool of worker processes that are
+started with the server. A worker keeps the input data of every
+data folder it has loaded together with the temperature dependent
+constants computed for it, so only the first job on a folder pays
+for loading. A cancelled job stops at the end of its current feed
+interval, a queued job is cancelled before it starts. The server
+keeps the records of the last HISTORY jobs that ended, older ones
+are no longer known.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from boyle.config import load_config, load_dataset, manager_settings, \
+    data_path
+from boyle.manager import Manager
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+# Events after which a job has ended
+FINAL_EVENTS = ("done", "cancelled", "failed")
+# Jobs that ended whose records are kept
+HISTORY = 100
+
+
+def warm_worker(preload=()):
+    """Load the data folders given to the server in a new worker"""
+    for path in preload:
+        load_dataset(path)
+
+
+def ping():
+    """Task used to start the workers of the pool"""
+    return os.getpid()
+
+
+def run_job(job, config, events, cancelled):
+    """Run a job in a worker process
+
+    Progress is sent as events to the server, the result is a
+    summary of the final state of the simulation.
+    """
+    if job in cancelled:
+        return dict(status="cancelled", rows=0)
+    start = time.perf_counter()
+    manager = Manager(load_dataset(data_path(config)),
+                      **manager_settings(config))
+    intervals = len(manager._frame.feed_payload["tp"])
+    events.put(dict(event="started", job=job, intervals=intervals,
+                    worker=os.getpid()))
+
+    def progress(idx, t):
+        events.put(dict(event="progress", job=job, interval=idx + 1,
+                        intervals=intervals, time=float(t)))
+        return job not in cancelled
+
+    frame = manager.start(progress=progress)
+    y_hat = np.asarray(manager.result)
+    result = dict(status="cancelled" if job in cancelled else "done",
+                  rows=len(y_hat), elapsed=time.perf_counter() - start)
+    if isinstance(frame, dict):
+        result.update(status="failed", message=frame.get(
+            "error", "The pH is diverging."))
+    if len(y_hat):
+        result.update(time=float(y_hat[-1, 1]), state=y_hat[-1, 2:].tolist())
+    return result
+
+
+class JobServer:
+    def __init__(self, host=HOST, port=PORT, workers=2, preload=(),
+                 history=HISTORY):
+        """Initialize a job server
+
+        PARAMETERS
+        ----------
+        host : str
+        port : int
+            Port to listen on, 0 picks a free port
+        workers : int
+            Number of worker processes
+        preload : list
+            Data folders loaded by every worker when it starts
+        history : int
+            Number of jobs that ended whose records are kept
+        """
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.preload = tuple(os.path.abspath(path) for path in preload)
+        self.history = history
+        self.jobs = {}
+        self._listeners = {}
+        self._ended = deque()
+
+    async def start(self):
+        """Start the workers and listen for connections"""
+        loop = asyncio.get_running_loop()
+        self._sync = multiprocessing.Manager()
+        self._events = self._sync.Queue()
+        self._cancelled = self._sync.dict()
+        self._pool = ProcessPoolExecutor(self.workers,
+                                         initializer=warm_worker,
+                                         initargs=(self.preload,))
+        await asyncio.gather(*[loop.run_in_executor(self._pool, ping)
+                               for _ in range(self.workers)])
+        self._forwarder = asyncio.ensure_future(self._forward())
+        self._server = await asyncio.start_server(self._handle, self.host,
+                                                  self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        """Stop listening and shut the workers down"""
+        self._server.close()
+        await self._server.wait_closed()
+        for job in self.jobs:
+            self._cancelled[job] = True
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._pool.shutdown)
+        await loop.run_in_executor(None, self._events.put, None)
+        await self._forwarder
+        self._sync.shutdown()
+
+    async def serve_forever(self):
+        await self._server.serve_forever()
+
+    def submit(self, config):
+        """Queue a job and return its id"""
+        job = uuid.uuid4().hex[:12]
+        self.jobs[job] = dict(job=job, status="queued",
+                              name=(config.get("metadata") or {}).get("name"))
+        self._listeners[job] = []
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, run_job, job, config,
+                                      self._events, self._cancelled)
+        asyncio.ensure_future(self._finish(job, future))
+        return job
+
+    def cancel(self, job):
+        """Cancel a queued or running job"""
+        if job not in self.jobs:
+            raise KeyError(job)
+        if self.jobs[job].get("status") not in FINAL_EVENTS:
+            self._cancelled[job] = True
+
+    async def _finish(self, job, future):
+        """Send the final event of a job once its worker returns"""
+        try:
+            result = await future
+            event = dict(event=result.pop("status"), job=job, result=result)
+        except Exception as e:
+            event = dict(event="failed", job=job, message=str(e))
+        # The final event takes the path of the progress events so
+        # that it arrives after all of them
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._events.put, event)
+
+    async def _forward(self):
+        """Pass the events of the workers on to the job listeners"""
+        loop = asyncio.get_running_loop()
+        while True:
+            event = await loop.run_in_executor(None, self._events.get)
+            if event is None:
+                break
+            job = event.get("job")
+            record = self.jobs.get(job)
+            if record is None:
+                continue
+            kind = event.get("event")
+            if kind in FINAL_EVENTS:
+                record.update(status=kind)
+                self._cancelled.pop(job, None)
+            elif record.get("status") == "queued":
+                record.update(status="running")
+            record.update({key: value for key, value in event.items()
+                           if key not in ("event", "job")})
+            for listener in self._listeners.get(job, []):
+                listener.put_nowait(event)
+            if kind in FINAL_EVENTS:
+                self._forget(job)
+
+    def _forget(self, job):
+        """Drop the records of the oldest jobs that ended"""
+        self._ended.append(job)
+        while len(self._ended) > self.history:
+            old = self._ended.popleft()
+            self.jobs.pop(old, None)
+            self._listeners.pop(old, None)
+
+    async def watch(self, job):
+        """Yield the events of a job until it ends"""
+        record = self.jobs.get(job)
+        if record is None:
+            raise KeyError(job)
+        if record.get("status") in FINAL_EVENTS:
+            yield dict(record, event=record.get("status"))
+            return
+        listener = asyncio.Queue()
+        self._listeners[job].append(listener)
+        try:
+            while True:
+                event = await listener.get()
+                yield event
+                if event.get("event") in FINAL_EVENTS:
+                    break
+        finally:
+            listeners = self._listeners.get(job, [])
+            if listener in listeners:
+                listeners.remove(listener)
+
+    async def _handle(self, reader, writer):
+        """Answer the message of a connection"""
+        try:
+            message = json.loads(await reader.readline())
+            action = message.get("action")
+            if action == "submit":
+                config = message.get("job")
+                if config is None:
+                    config = load_config(message.get("config"))
+                job = self.submit(config)
+                await self._send(writer, dict(event="accepted", job=job))
+                if message.get("watch", True):
+                    async for event in self.watch(job):
+                        await self._send(writer, event)
+            elif action == "watch":
+                async for event in self.watch(message.get("job")):
+                    await self._send(writer, event)
+            elif action == "cancel":
+                self.cancel(message.get("job"))
+                await self._send(writer, dict(event="cancelling",
+                                              job=message.get("job")))
+            elif action == "status":
+                job = message.get("job")
+                if job is None:
+                    jobs = list(self.jobs.values())
+                else:
+                    jobs = [self.jobs[job]]
+                await self._send(writer, dict(event="status", jobs=jobs))
+            else:
+                raise ValueError("Unknown action {}".format(action))
+        except KeyError as e:
+            await self._send(writer, dict(event="error",
+                                          message="Unknown job {}".format(e)))
+        except (ValueError, IOError) as e:
+            await self._send(writer, dict(event="error", message=str(e)))
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer, event):
+        writer.write(json.dumps(event).encode() + b"\n")
+        await writer.drain()
+
+
+async def request(message, host=HOST, port=PORT):
+    """Send a message to a job server and yield its replies"""
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(json.dumps(message).encode() + b"\n")
+        await writer.drain()
+        async for line in reader:
+            yield json.loads(line)
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT, workers=2, preload=(),
+                history=HISTORY):
+    server = await JobServer(host, port, workers, preload, history).start()
+    print("Serving boyle jobs on {}:{}".format(server.host, server.port))
+    try:
+        await server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve boyle simulation jobs on localhost.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--preload", nargs="*", default=[],
+                        help="Data folders loaded by every worker")
+    parser.add_argument("--history", type=int, default=HISTORY,
+                        help="Jobs that ended whose records are kept")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.preload,
+                          args.history))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
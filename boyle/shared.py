@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+
+"""
+Shared Memory
+
+Transport of input data and results between processes without
+pickling the arrays. The arrays of a loaded data folder are
+copied once into blocks of shared memory and a pool of workers
+attaches to them by name. Results are written by the workers
+into a preallocated slab holding one block of rows for every
+task. Only the names, shapes and dtypes of the blocks travel
+through pickling.
+
+The owner of the blocks, the process that created them, has to
+close them once the workers are done, e.g. by using SharedInputs
+and ResultSlab as context managers. Workers keep the blocks they
+attached to mapped for the following tasks until they detach
+from them, by the detach method of the inputs or slab or by
+detach for all blocks.
+"""
+
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from boyle.core.generic import Dataset
+from boyle.core.internals.constant import KineticConstant, AcidConstant
+from boyle.manager import Manager
+
+# Array classes of the inputs that are restored when attaching
+ARRAY_CLASSES = {"KineticConstant": KineticConstant,
+                 "AcidConstant": AcidConstant}
+
+SharedArray = namedtuple("SharedArray", "name shape dtype kind")
+
+# Blocks attached by this process, kept open for the following tasks
+_attached = {}
+
+
+def share_array(arr):
+    """Copy an array into a new block of shared memory"""
+    arr = np.asarray(arr)
+    block = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    view = np.ndarray(arr.shape, dtype=arr.dtype, buffer=block.buf)
+    view[...] = arr
+    return block, SharedArray(block.name, arr.shape, arr.dtype, None)
+
+
+def attach_array(spec, writeable=False):
+    """Array backed by a block of shared memory created elsewhere"""
+    block = _attached.get(spec.name)
+    if block is None:
+        block = shared_memory.SharedMemory(name=spec.name)
+        _attached[spec.name] = block
+    arr = np.ndarray(spec.shape, dtype=spec.dtype, buffer=block.buf)
+    arr.flags.writeable = writeable
+    if spec.kind in ARRAY_CLASSES:
+        arr = ARRAY_CLASSES.get(spec.kind)(arr)
+    return arr
+
+
+def detach(names=None):
+    """Close the blocks attached by this process, all by default
+
+    Arrays still using a block keep it mapped until they are
+    collected.
+    """
+    for name in list(_attached) if names is None else names:
+        block = _attached.pop(name, None)
+        if block is None:
+            continue
+        try:
+            block.close()
+        except BufferError:
+            pass
+
+
+class _Blocks:
+    """Blocks of shared memory owned by the creating process"""
+    def __init__(self):
+        self._blocks = []
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_blocks"] = []
+        return state
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def names(self):
+        """Names of the blocks"""
+        return []
+
+    def detach(self):
+        """Close the blocks this process attached to"""
+        detach(self.names())
+
+    def close(self):
+        """Release the blocks, workers can no longer attach to them"""
+        self.detach()
+        for block in self._blocks:
+            block.close()
+            block.unlink()
+        self._blocks = []
+
+
+class SharedInputs(_Blocks):
+    def __init__(self, data):
+        """Copy the input data of a dataset into shared memory
+
+        PARAMETERS
+        ----------
+        data : dict
+            Input arrays as returned by from_localpath
+        """
+        super().__init__()
+        self.specs = {}
+        for key, value in data.items():
+            block, spec = share_array(value)
+            kind = type(value).__name__
+            self.specs[key] = spec._replace(
+                kind=kind if kind in ARRAY_CLASSES else None)
+            self._blocks.append(block)
+
+    def names(self):
+        return [spec.name for spec in self.specs.values()]
+
+    def load(self):
+        """Read-only input arrays, attached without copying"""
+        return {key: attach_array(spec) for key, spec in self.specs.items()}
+
+    def dataset(self):
+        """Dataset backed by the shared input arrays"""
+        return Dataset(**self.load())
+
+
+class ResultSlab(_Blocks):
+    def __init__(self, tasks, rows, columns=35):
+        """Preallocate result rows for a number of tasks
+
+        PARAMETERS
+        ----------
+        tasks : int
+        rows : int
+            Largest number of result rows of a task
+        columns : int
+            Columns of a result row, run_no, time and the states
+        """
+        super().__init__()
+        data, self._data = share_array(np.zeros((tasks, rows, columns)))
+        counts, self._counts = share_array(np.zeros(tasks, dtype=np.int64))
+        self._blocks.extend([data, counts])
+
+    @property
+    def shape(self):
+        return self._data.shape
+
+    def names(self):
+        return [self._data.name, self._counts.name]
+
+    def write(self, task, y_hat):
+        """Store the result rows of a task"""
+        y_hat = np.asarray(y_hat, dtype=float)
+        data = attach_array(self._data, writeable=True)
+        if y_hat.shape[0] > data.shape[1]:
+            raise ValueError("Result of task {} exceeds {} rows".format(
+                task, data.shape[1]))
+        data[task, :y_hat.shape[0], :y_hat.shape[1]] = y_hat
+        attach_array(self._counts, writeable=True)[task] = y_hat.shape[0]
+
+    def read(self, task):
+        """Result rows of a task"""
+        rows = attach_array(self._counts)[task]
+        return attach_array(self._data)[task, :rows]
+
+
+def result_rows(dataset, step_size):
+    """Upper bound of the result rows of a simulation
+
+    An interval ends with the first step passing its feed time, so
+    every interval holds at most one row more than it spans steps.
+    """
+    tp = dataset.feed_payload["tp"]
+    spans = np.diff(np.concatenate([[0.], tp]))
+    return int(np.sum(np.ceil(spans / step_size)) + tp.size)
+
+
+def run_task(inputs, slab, task, settings):
+    """Run a Manager on shared inputs and store its result
+
+    Meant to be run in a worker process. Returns the number of
+    result rows and the wall time of the run, the rows themselves
+    are read from the slab.
+    """
+    start = time.perf_counter()
+    manager = Manager(inputs.dataset(), **settings)
+    manager.start()
+    slab.write(task, manager.result)
+    return dict(task=task, rows=len(manager.result),
+                elapsed=time.perf_counter() - start)
@@ -1,4 +1,6 @@
 from boyle.tools.utility import load_constants, load_client_data, \
     load_data
 
-from boyle.tools.analysis import interpolateData
+from boyle.tools.analysis import interpolateData, compareSolutions, \
+    computeBMP, solutionBMP, summariseBMP, writeBMPSummary, \
+    recomputeDiagnostics, compareModels
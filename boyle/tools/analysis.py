@@ -7,9 +7,40 @@ A collection of tools that are useful
 for performing analysis on the dataset.
 """
 
+import os
+import time
 import numpy as np
+import h5py as h5
+from numpy import testing
 from scipy import interpolate
 
+from boyle.core.computations import ph
+from boyle.core.generic import pHvalue
+from boyle.core.save import OUTPUT_HEADERS, HEADER_CORE, HEADER_VOL, \
+    HEADER_DEGRADERS
+
+
+# Substrates contributing to the methane potential, in the
+# order of the multiplier used by computeBMP. The inert
+# fractions do not contribute and are left out.
+BMP_HEADERS = ["carb_ins", "carb_sol", "prot_ins", "amino", "lipids",
+               "ac_lcfa", "ac_prop", "ac_buty", "ac_val", "ac_ace"]
+BMP_MULTIPLIER = np.array([0.5*373.5, 373.5, 0.8*572.6, 572.6,
+                           1014, 1014, 530, 636.6, 714, 373.5])
+BMP_COLUMNS = [OUTPUT_HEADERS.get("solution").index(item)
+               for item in BMP_HEADERS]
+
+# Columns of the debug output logged by the Standard model, the
+# growth rates, pH and flows followed by the consumption rates of
+# the first 16 species
+DIAGNOSTIC_HEADERS = OUTPUT_HEADERS.get("debug")
+
+# Columns of the per-scenario summary table
+BMP_SUMMARY = np.dtype([("scenario", "U128"), ("rows", "i8"),
+                        ("t_end", "f8"), ("bmp_start", "f8"),
+                        ("bmp_end", "f8"), ("bmp_min", "f8"),
+                        ("bmp_max", "f8"), ("bmp_mean", "f8")])
+
 
 def interpolateData(data, time_col, time_step=1):
     """Interpolate the data"""
@@ -21,10 +52,180 @@ def interpolateData(data, time_col, time_step=1):
     return out_
 
 
+def compareSolutions(reference, result, time_step=1, rtol=1e-5, atol=1e-5):
+    """Compare two solutions on a common time grid
+
+    Both solutions are interpolated to the time grid and compared
+    from its second point on. Raises an AssertionError when they
+    are not close.
+    """
+    reference = interpolateData(np.asarray(reference), time_col=1,
+                                time_step=time_step)
+    result = interpolateData(np.asarray(result), time_col=1,
+                             time_step=time_step)
+    testing.assert_allclose(reference[1:], result[1:], rtol=rtol, atol=atol)
+
+
 def computeBMP(arr, multiplier=None):
-    """Compute BMP from the concentration data"""
-    if not multiplier:
-        multiplier = np.array([0.5*373.5, 373.5, 0.8*572.6, 572.6,
-                               1014, 1014, 530, 636.6, 714, 373.5])
+    """Compute BMP from the concentration data
+
+    The last axis of the array holds the BMP_HEADERS components,
+    so a single run (time x components) and stacked ensemble
+    results (samples x time x components) are both reduced in
+    one contraction.
+    """
+    if multiplier is None:
+        multiplier = BMP_MULTIPLIER
+    # --
+    return np.einsum("...c,c->...", arr, multiplier)
+
+
+def solutionBMP(arr, multiplier=None):
+    """Compute BMP from rows in the Output/solution layout"""
+    return computeBMP(np.asarray(arr)[..., BMP_COLUMNS], multiplier)
+
+
+def summariseBMP(paths, chunk_size=65536, multiplier=None):
+    """Summarise the BMP of many result files
+
+    The Output/solution dataset of every file is read in blocks
+    of chunk_size rows so that long runs never have to be held
+    in memory as a whole. Returns one row per scenario as a
+    structured array with the BMP_SUMMARY fields.
+    """
+    table = np.zeros(len(paths), dtype=BMP_SUMMARY)
+    for idx, path in enumerate(paths):
+        with h5.File(path, "r") as _file:
+            solution = _file["Output"]["solution"]
+            n_rows = solution.shape[0]
+            total, low, high = 0., np.inf, -np.inf
+            first = last = t_end = np.nan
+            for start in range(0, n_rows, chunk_size):
+                chunk = solution[start:start + chunk_size]
+                bmp = solutionBMP(chunk, multiplier)
+                if start == 0:
+                    first = bmp[0]
+                last, t_end = bmp[-1], chunk[-1, 1]
+                total += bmp.sum()
+                low = min(low, bmp.min())
+                high = max(high, bmp.max())
+        # --
+        name = os.path.splitext(os.path.basename(path))[0]
+        mean = total / n_rows if n_rows else np.nan
+        table[idx] = (name, n_rows, t_end, first, last, low, high, mean)
+    return table
+
+
+def writeBMPSummary(path, table):
+    """Write a BMP summary table to a csv file"""
+    fmt = ["%s", "%d"] + ["%.10g"] * (len(BMP_SUMMARY.names) - 2)
+    np.savetxt(path, table, fmt=fmt, delimiter=",",
+               header=",".join(BMP_SUMMARY.names), comments="")
+
+
+def _intervalDiagnostics(y, values, params, consumption, ph_mode):
+    """Debug quantities of the states y of one feed interval"""
+    hc = values.get("henry_constants")
+    growth = values.get("mu_max").get("params")
+    carbo_is, carbo_in, carbon, prot_is, prot_in, amino, lipids, \
+        lcfa, hpr, hbut, hval, hac, nh3, ch4, co2, h2s, z, \
+        h2po4, a = y[:, 1:20].T
+    dead_cells, degraders = y[:, 20], y[:, 21:29]
+    ks, ks_nh3, ki_lcfa = params.get("ks"), params.get("ks_nh3"), \
+        params.get("ki_lcfa")
+    pk_low, pk_high = params.get("pk_low"), params.get("pk_high")
+    ka_nh4 = hc.get("ka_nh4")
+    # -- pH
+    _data = ph.charge_balance(co2, hac, hpr, hbut, hval, a, z, h2po4, nh3, hc)
+    pH, H = ph.solve_array(ph_mode, _data)
+    # -- growth rates, one column per degrader
+    f_ph = (1 + 2 * 10**(0.5 * (pk_low - pk_high))) / \
+        (1 + 10**(pH[:, None] - pk_high) + 10**(pk_low - pH[:, None]))
+    mu = growth.get("mu_max").reshape(-1) * f_ph
+    mu[:, 0] *= carbon * nh3 * ki_lcfa[0] / \
+        ((ks[0] + carbon) * (ks_nh3[0] + nh3) * (lcfa + ki_lcfa[0]))
+    mu[:, 1] *= amino * ki_lcfa[1] / ((ks[1] + amino) * (lcfa + ki_lcfa[1]))
+    mu[:, 2] *= lipids * nh3 * ki_lcfa[2] / \
+        ((ks[2] + lipids) * (ks_nh3[2] + nh3) * (lcfa + ki_lcfa[2]))
+    mu[:, 3] *= nh3 * lcfa / \
+        ((lcfa + ks[3] + lcfa * lcfa / ki_lcfa[3]) * (ks_nh3[3] + nh3))
+    for idx, (acid, ki_acid) in zip((4, 5, 6), (
+            (hpr, params.get("ki_hac_hpr")), (hbut, params.get("ki_hac_hbut")),
+            (hval, params.get("ki_hac_hval")))):
+        mu[:, idx] *= acid * nh3 * ki_lcfa[idx] * ki_acid / \
+            ((ks[idx] + acid) * (ks_nh3[idx] + nh3) *
+             (lcfa + ki_lcfa[idx]) * (hac + ki_acid))
+    ki_nh3_hac = params.get("ki_nh3_hac")
+    mu[:, 7] *= hac * nh3 * ki_lcfa[7] * ki_nh3_hac / \
+        ((ks[7] + hac) * (ks_nh3[7] + nh3) * (lcfa + ki_lcfa[7]) *
+         (nh3 * ka_nh4 / (H + ka_nh4) + ki_nh3_hac))
+    # -- process rates and the consumption of the species
+    acids = hac + 0.811 * hpr + 0.682 * hbut + 0.588 * hval
+    ki_carbon, ki_prot = params.get("ki_carbon"), params.get("ki_prot")
+    rates = np.column_stack([
+        0.01 * dead_cells,
+        carbo_is * growth.get("k0_carbon") * ki_carbon / (ki_carbon + acids),
+        prot_is * growth.get("k0_prot") * ki_prot / (ki_prot + acids),
+        mu * degraders])
+    flow = np.full(y.shape[0], values.get("flow_in"))
+    return np.column_stack([mu, pH, flow, flow, rates @ consumption.T])
+
+
+def recomputeDiagnostics(y_hat, dataset, ph_mode=None):
+    """Recompute the debug output of the Standard model
+
+    The growth rates, pH, flows and consumption rates logged by
+    the Standard model are computed for every row of a solution
+    in the y_hat or Output/solution layout, one vectorised pass
+    per feed interval. The rows are in the DIAGNOSTIC_HEADERS
+    layout. The pH follows ph_mode, fixed at 7.5 by default.
+    """
+    y_hat = np.asarray(y_hat, dtype=float)
+    if ph_mode is None:
+        ph_mode = pHvalue("fixed", 7.5)
+    params = dataset.Const1.get("params")
+    yieldc = np.asarray(dataset.yc.get("value"))
+    consumption = np.minimum(yieldc.T, 0.)
     # --
-    return (arr) @ (multiplier)
+    out = np.empty((y_hat.shape[0], len(DIAGNOSTIC_HEADERS)))
+    out[:, :2] = y_hat[:, :2]
+    for run_no in np.unique(y_hat[:, 0]).astype(int):
+        rows = y_hat[:, 0] == run_no
+        values, _ = dataset.interval(run_no)
+        out[rows, 2:] = _intervalDiagnostics(y_hat[rows, 2:], values, params,
+                                             consumption, ph_mode)
+    return out
+
+
+def compareModels(source, model="reduced", reference="standard", **settings):
+    """Deviation and cost of a model against a reference model
+
+    Both models run the dataset or data folder with the same
+    Manager settings. The deviation of a state is its largest
+    difference over the run relative to the largest magnitude of
+    the state in the reference run.
+
+    Returns the deviations keyed by state name, the largest
+    deviation and the wall time, right-hand side calls and solver
+    steps of both runs.
+    """
+    from boyle.manager import Manager
+    runs = {}
+    for name in (reference, model):
+        manager = Manager(source, model=name, **settings)
+        start = time.perf_counter()
+        manager.start()
+        runs[name] = dict(wall_time=time.perf_counter() - start,
+                          **manager.statistics)
+        runs[name]["result"] = np.asarray(manager.result)
+    expected = runs[reference].pop("result")
+    found = runs[model].pop("result")
+    states = HEADER_VOL + HEADER_CORE + HEADER_DEGRADERS
+    deviation = {}
+    for col, name in enumerate(states, start=2):
+        values = np.interp(expected[:, 1], found[:, 1], found[:, col])
+        scale = np.max(np.abs(expected[:, col]))
+        deviation[name] = float(np.max(np.abs(values - expected[:, col])) /
+                                scale) if scale > 0 else 0.
+    return dict(deviation=deviation, largest=max(deviation.values()),
+                model=runs[model], reference=runs[reference])
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+
+"""
+Monte Carlo Campaigns
+
+Uncertainty studies of the feed that run only as many samples as
+the requested precision needs. A campaign draws batches of feed
+inputs, named and applied as in boyle.tools.emulator, runs them and
+updates the estimates of target quantities of the runs:
+
+    methane     cumulative methane at the end of the run
+    peak_vfa    largest concentration of the volatile fatty acids,
+                propionate, butyrate, valerate and acetate
+
+Every batch is an independent sample of its own: a scrambled Sobol
+or Halton sequence or a Latin hypercube, each drawn with a fresh
+seed. The batch means are then independent, so the confidence
+interval of a target follows from their spread with Student's t,
+and the quasi-random batches give narrower intervals than plain
+random sampling. The campaign stops once the half width of the
+interval of every target is within the requested precision,
+
+    runCampaign("data/", {"lipids": (1, 0.1)}, rtol=0.01)
+"""
+
+import functools
+
+import numpy as np
+from scipy import stats
+from scipy.stats import qmc
+
+from boyle.core.save import OUTPUT_HEADERS
+from boyle.preprocessing import createNormalDistribution
+from boyle.tools.emulator import runEnsemble, sampleInputs
+
+CAMPAIGN_SAMPLERS = ("sobol", "halton", "lhs")
+METHANE_COLUMN = OUTPUT_HEADERS.get("solution").index("gf_ch4")
+VFA_COLUMNS = [OUTPUT_HEADERS.get("solution").index(item) for item in
+               ("ac_prop", "ac_buty", "ac_val", "ac_ace")]
+
+
+def cumulativeMethane(result):
+    """Methane accumulated at the end of the solution rows"""
+    return result[-1, METHANE_COLUMN]
+
+
+def peakVFA(result):
+    """Largest sum of the volatile fatty acids in the solution rows"""
+    return np.max(result[:, VFA_COLUMNS].sum(axis=1))
+
+
+TARGETS = {"methane": cumulativeMethane, "peak_vfa": peakVFA}
+
+
+def targetValues(result, targets):
+    """Values of the targets, functions of the solution rows"""
+    return {name: float(target(result)) for name, target in targets.items()}
+
+
+def sampleBatch(factors, size, sampler="sobol", seed=None):
+    """A batch of inputs drawn by one of CAMPAIGN_SAMPLERS
+
+    PARAMETERS
+    ----------
+    factors : dict
+        Mean and standard deviation of every input by name
+    size : int
+        Samples of the batch, a power of two suits Sobol sequences
+    """
+    if sampler == "lhs":
+        return sampleInputs(factors, size, seed)
+    if sampler not in CAMPAIGN_SAMPLERS:
+        raise ValueError("Unknown sampler {}".format(sampler))
+    spread = np.array([factors.get(name) for name in factors], dtype=float)
+    if np.any(spread[:, 1] <= 0):
+        raise ValueError("Every input needs a positive deviation")
+    engine = qmc.Sobol if sampler == "sobol" else qmc.Halton
+    unit = engine(len(factors), scramble=True, seed=seed).random(size)
+    return createNormalDistribution(spread).ppf(unit)
+
+
+def estimate(batches, confidence=0.95):
+    """Mean and confidence interval from independent batch values
+
+    PARAMETERS
+    ----------
+    batches : list
+        Values of a target of every batch, batches of equal size
+    """
+    means = np.array([np.mean(batch) for batch in batches])
+    values = np.concatenate(batches)
+    mean = float(values.mean())
+    half_width = np.inf
+    if means.size > 1:
+        half_width = float(stats.t.ppf((1 + confidence) / 2, means.size - 1) *
+                           means.std(ddof=1) / np.sqrt(means.size))
+    return dict(mean=mean, half_width=half_width, low=mean - half_width,
+                high=mean + half_width, std=float(values.std(ddof=1))
+                if values.size > 1 else 0., samples=int(values.size))
+
+
+def runCampaign(source, factors, targets=("methane", "peak_vfa"),
+                sampler="sobol", batch_size=16, rtol=0.01, atol=0.,
+                confidence=0.95, min_batches=3, max_samples=1024,
+                processes=1, seed=None, progress=None, **settings):
+    """Run batches of sampled feeds until the targets converge
+
+    PARAMETERS
+    ----------
+    source : str or dict
+        Data folder or its inputs as from_localpath returns them
+    factors : dict
+        Mean and standard deviation of every input by name
+    targets : list or dict
+        Names of TARGETS or functions of the solution rows by name,
+        these have to be picklable with several processes
+    sampler : str
+        One of CAMPAIGN_SAMPLERS
+    rtol, atol : float
+        Precision of the targets, the half width of the confidence
+        interval of a target has to be within atol or rtol times
+        its mean
+    min_batches : int
+        Batches run before convergence is checked, at least two
+    max_samples : int
+        Largest number of runs, the campaign runs only whole batches
+        so that the batch means stay of equal weight
+    progress : callable
+        Called with the batch number and the estimates after every
+        batch, the campaign stops when it returns False
+    settings
+        Keyword arguments of the Manager
+
+    Returns the estimates of the targets, whether they converged,
+    the sampled inputs with the target values of every run and the
+    estimates after every batch.
+    """
+    if not isinstance(targets, dict):
+        targets = {name: TARGETS.get(name) for name in targets}
+    if None in targets.values():
+        raise ValueError("Unknown targets, expected some of {}".format(
+            sorted(TARGETS)))
+    if max_samples < batch_size:
+        raise ValueError("max_samples is smaller than a batch")
+    names = list(factors)
+    reduce = functools.partial(targetValues, targets=targets)
+    seeds = np.random.default_rng(seed)
+    samples, values, history = [], {name: [] for name in targets}, []
+    converged = False
+    while not converged and (len(samples) + 1) * batch_size <= max_samples:
+        batch = sampleBatch(factors, batch_size, sampler,
+                            int(seeds.integers(2**32)))
+        _, runs = runEnsemble(source, names, batch, processes, reduce,
+                              **settings)
+        samples.append(batch)
+        for name in targets:
+            values[name].append(runs.get(name))
+        estimates = {name: estimate(values.get(name), confidence)
+                     for name in targets}
+        history.append(estimates)
+        converged = len(samples) >= max(min_batches, 2) and all(
+            item.get("half_width") <= max(atol, rtol * abs(item.get("mean")))
+            for item in estimates.values())
+        if progress is not None and progress(len(samples),
+                                             estimates) is False:
+            break
+    return dict(estimates=history[-1] if history else {},
+                converged=converged, batches=len(samples), names=names,
+                samples=np.concatenate(samples) if samples else
+                np.empty((0, len(names))),
+                values={name: np.concatenate(items) if items else
+                        np.empty(0) for name, items in values.items()},
+                history=history)
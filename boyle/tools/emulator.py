@@ -0,0 +1,322 @@
+#!/usr/bin/env python
+
+"""
+Emulator
+
+Fast surrogate of Manager runs for what-if questions on the feed.
+An ensemble of runs is made over feed inputs sampled by the Latin
+hypercube sampler of boyle.preprocessing. The inputs are named:
+
+    temp        offset of the feed temperature in degrees
+    flow        multiplier of the inflow and outflow
+    <substrate> multiplier of a substrate column of the feed, named
+                as in HEADER_CORE, e.g. lipids for the fat
+
+Every run is reduced to trajectories at the time points of the
+feed, the gas flow (the growth of the accumulated gas states per
+hour) and the BMP of the reactor contents. The trajectories of an
+output are projected on their leading principal components and
+the coefficients are fitted by ridge regression on polynomials of
+the standardised inputs. A prediction is a small matrix product
+and takes microseconds:
+
+    emulator = trainEmulator("data/", {"lipids": (1, 0.1)})
+    emulator.predict(lipids=1.1).get("gasflow")
+
+A share of the ensemble is held out from the fit and the error of
+the emulator on these runs is reported in emulator.error, before
+the emulator is refitted on the whole ensemble. Emulators are
+saved to and loaded from versioned .npz files.
+"""
+
+import json
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from boyle import __version__
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.core.save import HEADER_CORE
+from boyle.manager import Manager
+from boyle.preprocessing import createNormalDistribution, sampleLHS
+from boyle.shared import SharedInputs
+from boyle.tools.analysis import solutionBMP
+
+# Version of the file format of saved emulators
+EMULATOR_VERSION = 1
+EMULATOR_OUTPUTS = ("gasflow", "bmp")
+# Columns of the accumulated gas states in the solution rows
+GAS_COLUMNS = slice(31, 35)
+# Share of the variance of an output kept by its components
+ENERGY = 1 - 1e-8
+
+
+def applyInputs(feed, inputs):
+    """Feed with the named inputs applied, see the module docs"""
+    feed = np.array(feed, dtype=float)
+    for name, value in inputs.items():
+        if name == "temp":
+            feed[:, 1] += value
+        elif name == "flow":
+            feed[:, 2:4] *= value
+        elif name in HEADER_CORE:
+            feed[:, 4 + HEADER_CORE.index(name)] *= value
+        else:
+            raise ValueError("Unknown emulator input {}".format(name))
+    return feed
+
+
+def sampleInputs(factors, samples, seed=None):
+    """Latin hypercube samples of the inputs
+
+    PARAMETERS
+    ----------
+    factors : dict
+        Mean and standard deviation of every input by name
+    samples : int
+    seed : int
+        Seed of the sampler, the global random state is restored
+    """
+    spread = np.array([factors.get(name) for name in factors], dtype=float)
+    if np.any(spread[:, 1] <= 0):
+        raise ValueError("Every input needs a positive deviation")
+    state = np.random.get_state()
+    if seed is not None:
+        np.random.seed(seed)
+    try:
+        values = sampleLHS(createNormalDistribution(spread), len(factors),
+                           samples)
+    finally:
+        np.random.set_state(state)
+    return np.reshape(values, (samples, len(factors)))
+
+
+def trajectories(result, times):
+    """Gas flow and BMP of solution rows at the given times"""
+    result = np.asarray(result)
+    gas = np.interp(times, result[:, 1], result[:, GAS_COLUMNS].sum(axis=1))
+    # -- the gas states start empty at time zero
+    flow = np.diff(np.concatenate([[0.], gas])) / \
+        np.diff(np.concatenate([[0.], times]))
+    return dict(gasflow=flow, bmp=np.interp(times, result[:, 1],
+                                            solutionBMP(result)))
+
+
+def runSample(_data, names, values, settings, reduce=None):
+    """Trajectories of a run of the inputs with the values
+
+    The input data are given as a dict or as SharedInputs. A
+    reduce function replaces the trajectories by its dict of values
+    of the solution rows.
+    """
+    if isinstance(_data, SharedInputs):
+        _data = _data.load()
+    _data = dict(_data, feed=applyInputs(_data.get("feed"),
+                                         dict(zip(names, values))))
+    manager = Manager(Dataset(**_data), **settings)
+    frame = manager.start()
+    if isinstance(frame, dict):
+        raise ValueError("Run of {} failed: {}".format(
+            dict(zip(names, values)), frame.get("error")))
+    if reduce is not None:
+        return reduce(np.asarray(manager.result))
+    return trajectories(manager.result, _data.get("feed")[:, 0])
+
+
+def runEnsemble(source, names, samples, processes=1, reduce=None,
+                **settings):
+    """Trajectories of the runs of sampled inputs
+
+    Returns the time points and a (samples x time) array of every
+    output, or of every value of the reduce function, see
+    runSample. The diagnostics are not logged unless asked for.
+    With several processes the workers read the input data from
+    shared memory, a reduce function has to be picklable then.
+    """
+    _data = from_localpath(source) if isinstance(source, str) else source
+    settings.setdefault("diagnostics", False)
+    if processes > 1:
+        with SharedInputs(_data) as inputs, \
+                ProcessPoolExecutor(processes) as pool:
+            runs = list(pool.map(runSample, *zip(*[
+                (inputs, names, values, settings, reduce)
+                for values in samples])))
+    else:
+        runs = [runSample(_data, names, values, settings, reduce)
+                for values in samples]
+    outputs = list(runs[0]) if runs else EMULATOR_OUTPUTS
+    return _data.get("feed")[:, 0], {
+        output: np.array([run.get(output) for run in runs])
+        for output in outputs}
+
+
+class Emulator:
+    def __init__(self, names, times, degree=2, alpha=1e-6):
+        """Set up an emulator of the named inputs
+
+        PARAMETERS
+        ----------
+        names : list
+            Inputs of the emulator, see the module docs
+        times : numpy.array
+            Time points of the trajectories
+        degree : int
+            Degree of the polynomials of the inputs
+        alpha : float
+            Ridge penalty relative to the mean square of the
+            polynomial features
+        """
+        self.names = list(names)
+        self.times = np.asarray(times, dtype=float)
+        self.degree = int(degree)
+        self.alpha = float(alpha)
+        self.error = {}
+        self._center = self._scale = None
+        self._outputs = {}
+
+    def _features(self, values):
+        """Polynomials of the standardised inputs up to the degree"""
+        z = (np.atleast_2d(values) - self._center) / self._scale
+        columns = [np.ones(z.shape[0])]
+        for order in range(1, self.degree + 1):
+            for combination in itertools.combinations_with_replacement(
+                    range(z.shape[1]), order):
+                columns.append(np.prod(z[:, combination], axis=1))
+        return np.column_stack(columns)
+
+    def fit(self, values, outputs):
+        """Fit the emulator to inputs and their trajectories
+
+        PARAMETERS
+        ----------
+        values : numpy.array
+            (samples x inputs) values of the inputs
+        outputs : dict
+            (samples x time) trajectories of every output
+        """
+        values = np.asarray(values, dtype=float)
+        self._center = values.mean(axis=0)
+        self._scale = np.where(values.std(axis=0) > 0, values.std(axis=0), 1.)
+        features = self._features(values)
+        gram = features.T @ features
+        penalty = self.alpha * np.trace(gram) / gram.shape[0] * \
+            np.eye(gram.shape[0])
+        # -- the constant term is not penalised
+        penalty[0, 0] = 0.
+        for name, trajectory in outputs.items():
+            trajectory = np.asarray(trajectory, dtype=float)
+            mean = trajectory.mean(axis=0)
+            _, singular, modes = np.linalg.svd(trajectory - mean,
+                                               full_matrices=False)
+            energy = np.cumsum(singular**2)
+            rank = 1 if energy[-1] == 0 else \
+                int(np.searchsorted(energy / energy[-1], ENERGY)) + 1
+            modes = modes[:rank]
+            coefficients = np.linalg.solve(
+                gram + penalty, features.T @ ((trajectory - mean) @ modes.T))
+            self._outputs[name] = dict(mean=mean, modes=modes,
+                                       coefficients=coefficients)
+        return self
+
+    def predict(self, values=None, **inputs):
+        """Trajectories of every output at inputs
+
+        The inputs are given as an array of values in the order
+        of the names, one row per prediction, or by name. Inputs
+        left out take their mean in the ensemble.
+        """
+        if values is None:
+            unknown = set(inputs) - set(self.names)
+            if unknown:
+                raise ValueError("Unknown inputs {}".format(sorted(unknown)))
+            values = [inputs.get(name, center) for name, center in
+                      zip(self.names, self._center)]
+        values = np.asarray(values, dtype=float)
+        features = self._features(values)
+        predicted = {name: output.get("mean") + features @
+                     output.get("coefficients") @ output.get("modes")
+                     for name, output in self._outputs.items()}
+        if values.ndim == 1:
+            predicted = {name: item[0] for name, item in predicted.items()}
+        return predicted
+
+    def heldout(self, values, outputs):
+        """Error of the emulator on runs it was not fitted to
+
+        The error of an output is the root mean square difference
+        relative to the root mean square of its trajectories.
+        """
+        predicted = self.predict(np.atleast_2d(values))
+        return {name: float(np.sqrt(np.mean((predicted.get(name) -
+                                             outputs.get(name))**2) /
+                                    np.mean(np.asarray(outputs.get(name))**2)))
+                for name in self._outputs}
+
+    def save(self, path):
+        """Save the emulator to an .npz file"""
+        arrays = dict(times=self.times, center=self._center,
+                      scale=self._scale)
+        for name, output in self._outputs.items():
+            for key, value in output.items():
+                arrays["{}/{}".format(name, key)] = value
+        metadata = dict(version=EMULATOR_VERSION, boyle=__version__,
+                        names=self.names, degree=self.degree,
+                        alpha=self.alpha, error=self.error,
+                        outputs=list(self._outputs))
+        np.savez(path, metadata=json.dumps(metadata), **arrays)
+
+    @classmethod
+    def load(cls, path):
+        """Load an emulator saved by save"""
+        with np.load(path) as stored:
+            metadata = json.loads(str(stored["metadata"]))
+            if metadata.get("version") != EMULATOR_VERSION:
+                raise ValueError("Emulator file version {} is not "
+                                 "supported, expected {}".format(
+                                     metadata.get("version"),
+                                     EMULATOR_VERSION))
+            emulator = cls(metadata.get("names"), stored["times"],
+                           metadata.get("degree"), metadata.get("alpha"))
+            emulator.error = metadata.get("error")
+            emulator._center = stored["center"]
+            emulator._scale = stored["scale"]
+            for name in metadata.get("outputs"):
+                emulator._outputs[name] = {
+                    key: stored["{}/{}".format(name, key)]
+                    for key in ("mean", "modes", "coefficients")}
+        return emulator
+
+
+def trainEmulator(source, factors, samples=64, holdout=0.2, degree=2,
+                  alpha=1e-6, processes=1, seed=None, **settings):
+    """Train an emulator on an ensemble of runs of sampled inputs
+
+    PARAMETERS
+    ----------
+    source : str or dict
+        Data folder or its inputs as from_localpath returns them
+    factors : dict
+        Mean and standard deviation of every input by name
+    samples : int
+        Runs of the ensemble
+    holdout : float
+        Share of the runs the error is estimated on
+    settings
+        Keyword arguments of the Manager
+    """
+    names = list(factors)
+    values = sampleInputs(factors, samples, seed)
+    times, outputs = runEnsemble(source, names, values, processes,
+                                 **settings)
+    emulator = Emulator(names, times, degree, alpha)
+    # -- LHS samples come in no particular order, the last runs are
+    # held out
+    held = int(round(holdout * samples))
+    if held:
+        emulator.fit(values[:-held], {name: item[:-held]
+                                      for name, item in outputs.items()})
+        emulator.error = emulator.heldout(values[-held:], {
+            name: item[-held:] for name, item in outputs.items()})
+    return emulator.fit(values, outputs)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+
+"""
+Feed Schedule Optimisation
+
+Search for the feed schedule giving the most cumulative methane.
+The decision variables are the inputs of boyle.tools.emulator,
+multipliers of the flows and of substrate columns and offsets of
+the temperature, for every feed interval of a window of the feed,
+each between bounds, e.g.
+
+    optimiseSchedule("data/", {"flow": (0.8, 1.2),
+                               "lipids": (0.5, 1.5)},
+                     intervals=range(10, 20), max_olr=4., vfa_limit=2.)
+
+The schedule has to keep the organic loading rate of every feed
+interval at or below max_olr and the sum of the volatile fatty
+acids in the reactor at or below vfa_limit throughout the run. The
+loading rate is the daily feed of the organic substrates, the
+carbohydrates, proteins, lipids and acids of HEADER_CORE, per
+volume of the reactor at inoculation.
+
+The search is a compass search: every iteration moves each
+variable up and down by its step, evaluates these candidates in
+parallel and moves to the best one, halving the steps when none is
+better. A candidate differs from the current schedule in a single
+feed interval, so it resumes the run of the current schedule at
+that interval and only the intervals from there on are integrated
+again. Feasible schedules rank above infeasible ones, which rank
+by their violation of the constraints.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.core.save import HEADER_CORE
+from boyle.manager import Manager
+from boyle.shared import SharedInputs
+from boyle.tools.campaign import cumulativeMethane, peakVFA
+from boyle.tools.emulator import applyInputs
+
+# Feed columns of the organic substrates counted in the loading rate
+ORGANIC_COLUMNS = slice(4, 4 + HEADER_CORE.index("ac_ace") + 1)
+
+
+def organicLoadingRate(feed, volume):
+    """Daily organic feed per reactor volume of every feed row"""
+    feed = np.asarray(feed, dtype=float)
+    return feed[:, 2] * feed[:, ORGANIC_COLUMNS].sum(axis=1) / volume
+
+
+def scheduleFeed(feed, names, intervals, values):
+    """Feed with the inputs of every decision interval applied
+
+    PARAMETERS
+    ----------
+    values : numpy.array
+        (intervals x names) values of the inputs
+    """
+    feed = np.array(feed, dtype=float)
+    for row, items in zip(intervals, np.atleast_2d(values)):
+        feed[row:row + 1] = applyInputs(feed[row:row + 1],
+                                        dict(zip(names, items)))
+    return feed
+
+
+def runSchedule(_data, feed, settings, resume=None):
+    """Result rows of a run of a feed, resumed at an interval
+
+    Meant to be run in a worker process on SharedInputs as well.
+    Returns None when the run fails.
+    """
+    if isinstance(_data, SharedInputs):
+        _data = _data.load()
+    manager = Manager(Dataset(**dict(_data, feed=feed)), **settings)
+    frame = manager.start(resume=resume)
+    if isinstance(frame, dict) or not manager.result:
+        return None
+    return np.asarray(manager.result)
+
+
+class _Schedule:
+    """An evaluated schedule with its run"""
+    def __init__(self, values, feed, result, olr, max_olr, vfa_limit):
+        self.values = values
+        self.feed = feed
+        self.result = result
+        self.olr = olr
+        if result is None:
+            self.methane, self.peak_vfa = -np.inf, np.inf
+            self.violation = np.inf
+            return
+        self.methane = float(cumulativeMethane(result))
+        self.peak_vfa = float(peakVFA(result))
+        self.violation = 0.
+        if max_olr is not None:
+            self.violation += float(np.sum(np.maximum(olr - max_olr, 0)) /
+                                    max_olr)
+        if vfa_limit is not None:
+            self.violation += max(self.peak_vfa - vfa_limit, 0) / vfa_limit
+
+    def rank(self):
+        """Sort key, feasible schedules by their methane first"""
+        return (self.violation, -self.methane)
+
+
+def optimiseSchedule(source, bounds, intervals=None, max_olr=None,
+                     vfa_limit=None, step=0.25, min_step=0.01,
+                     max_evaluations=200, processes=1, progress=None,
+                     **settings):
+    """Feed schedule with the most methane within the constraints
+
+    PARAMETERS
+    ----------
+    source : str or dict
+        Data folder or its inputs as from_localpath returns them
+    bounds : dict
+        Lower and upper bound of every input by name
+    intervals : list
+        Feed intervals whose inputs are decision variables, all of
+        them by default
+    max_olr : float
+        Largest organic loading rate of a feed interval
+    vfa_limit : float
+        Largest sum of the volatile fatty acids during the run
+    step, min_step : float
+        First and smallest step as share of the range of a variable
+    max_evaluations : int
+        Candidate runs after which the search stops
+    progress : callable
+        Called with the iteration and the best schedule so far as
+        a dict, the search stops when it returns False
+    settings
+        Keyword arguments of the Manager
+
+    Returns the best schedule with its feed, the values of the
+    inputs, its methane, peak VFA and loading rates and its result
+    rows, together with the evaluations made.
+    """
+    _data = from_localpath(source) if isinstance(source, str) else source
+    base = np.asarray(_data.get("feed"), dtype=float)
+    names = list(bounds)
+    intervals = list(range(base.shape[0]) if intervals is None
+                     else intervals)
+    settings.setdefault("diagnostics", False)
+    low = np.array([bounds.get(name)[0] for name in names], dtype=float)
+    high = np.array([bounds.get(name)[1] for name in names], dtype=float)
+    if np.any(low > high):
+        raise ValueError("Lower bounds have to be below the upper bounds")
+    volume = float(np.asarray(_data.get("inoculum"))[0])
+    start = np.clip(np.array([0. if name == "temp" else 1.
+                              for name in names]), low, high)
+    values = np.tile(start, (len(intervals), 1))
+    steps = step * (high - low) * np.ones_like(values)
+
+    def evaluate(candidates, current, pool, inputs):
+        """Evaluate candidates resuming the run of current"""
+        jobs, schedules = [], []
+        for values, first in candidates:
+            feed = scheduleFeed(base, names, intervals, values)
+            olr = organicLoadingRate(feed, volume)
+            resume = None
+            if current is not None and first > 0:
+                # -- rows of the current run before the changed interval
+                rows = int(np.searchsorted(current.result[:, 0], first))
+                resume = (first, current.result[rows - 1])
+            else:
+                rows = 0
+            if max_olr is not None and np.any(olr > max_olr):
+                # -- infeasible before any run, ranked by the loading
+                schedule = _Schedule(values, feed, None, olr, max_olr, None)
+                schedule.violation = float(
+                    np.sum(np.maximum(olr - max_olr, 0)) / max_olr)
+                schedules.append(schedule)
+                jobs.append(None)
+                continue
+            args = (inputs if pool else _data, feed, settings, resume)
+            jobs.append((pool.submit(runSchedule, *args) if pool else
+                         runSchedule(*args), rows))
+            schedules.append((values, feed, olr))
+        evaluated = []
+        for job, schedule in zip(jobs, schedules):
+            if job is None:
+                evaluated.append(schedule)
+                continue
+            result, rows = job
+            if pool:
+                result = result.result()
+            if result is not None and rows:
+                result = np.vstack([current.result[:rows], result])
+            evaluated.append(_Schedule(*schedule[:2], result, schedule[2],
+                                       max_olr, vfa_limit))
+        return evaluated
+
+    history = []
+    evaluations = 1
+    pool = ProcessPoolExecutor(processes) if processes > 1 else None
+    inputs = SharedInputs(_data) if pool else None
+    try:
+        best = evaluate([(values, 0)], None, None, None)[0]
+        if best.result is None:
+            raise ValueError("The run of the feed fails")
+        iteration = 0
+        while np.any(steps >= min_step * (high - low)) and \
+                evaluations < max_evaluations:
+            candidates = []
+            for row in range(len(intervals)):
+                for col in range(len(names)):
+                    for sign in (1, -1):
+                        moved = best.values.copy()
+                        moved[row, col] = np.clip(
+                            moved[row, col] + sign * steps[row, col],
+                            low[col], high[col])
+                        if moved[row, col] != best.values[row, col]:
+                            candidates.append((moved, intervals[row]))
+            candidates = candidates[:max_evaluations - evaluations]
+            if not candidates:
+                break
+            evaluated = evaluate(candidates, best, pool, inputs)
+            evaluations += len(evaluated)
+            found = min(evaluated, key=_Schedule.rank)
+            if found.rank() < best.rank():
+                best = found
+            else:
+                steps /= 2
+            iteration += 1
+            history.append(dict(iteration=iteration, methane=best.methane,
+                                peak_vfa=best.peak_vfa,
+                                violation=best.violation,
+                                evaluations=evaluations))
+            if progress is not None and progress(iteration,
+                                                 history[-1]) is False:
+                break
+    finally:
+        if pool:
+            pool.shutdown()
+            inputs.close()
+    return dict(names=names, intervals=intervals, values=best.values,
+                feed=best.feed, methane=best.methane,
+                peak_vfa=best.peak_vfa, olr=best.olr,
+                feasible=best.violation == 0, result=best.result,
+                evaluations=evaluations, history=history)
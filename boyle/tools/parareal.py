@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+"""
+Parallel-in-Time Integration
+
+Parareal runs of long feeds. The feed intervals are split into
+consecutive chunks, one per worker. A cheap coarse propagator G,
+the Manager with COARSE settings, predicts the state at the start
+of every chunk in a serial sweep. The accurate fine propagator F,
+the Manager with the settings of the run, then integrates all
+chunks from these states at once in a pool of processes, and the
+starting states are corrected by
+
+    U[n + 1] = G(U'[n]) + F(U[n]) - G(U[n])
+
+in a new coarse sweep, with U' the corrected states. After k
+iterations the first k chunks start from their exact states, so
+the run never takes more iterations than chunks. It stops once
+no starting state moves by more than the tolerance relative to
+the scale of the state, see state_scales, and the rows of the
+fine integrations of the chunks form the result. With a coarse
+propagator much cheaper than the fine one and a few iterations,
+the wall time falls with the number of workers,
+
+    runParareal("data/", processes=8, solver={"rtol": 1e-8,
+                                              "atol": 1e-10})
+
+Runs with a feed profile, events or steady state detection can
+not be split into chunks.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.core.solver import state_scales
+from boyle.manager import Manager
+from boyle.shared import SharedInputs
+
+# Settings of the coarse propagator replacing those of the run, the
+# reduced model at loose tolerances takes about a tenth of the time
+# of the Standard model at its default settings. The step size is
+# the output step, only the end of a chunk is needed.
+COARSE = {"model": "reduced", "step_size": 24,
+          "solver": {"method": "bdf", "order": 5, "nsteps": 1e6,
+                     "rtol": 1e-2, "atol_scale": 1e-4}}
+
+
+def propagate(_data, settings, start, stop, state=None):
+    """Result rows of the feed intervals start to stop from a state
+
+    The input data are given as a dict or as SharedInputs. The
+    first chunk, start 0, begins from the inoculum.
+    """
+    if isinstance(_data, SharedInputs):
+        _data = _data.load()
+    feed = np.asarray(_data.get("feed"))
+    manager = Manager(Dataset(**dict(_data, feed=feed[:stop])), **settings)
+    resume = None
+    if start > 0:
+        resume = (start, np.concatenate([[start - 1, feed[start - 1, 0]],
+                                         state]))
+    frame = manager.start(resume=resume)
+    if isinstance(frame, dict):
+        raise ValueError("Run of the intervals {} to {} failed: {}".format(
+            start, stop, frame.get("error")))
+    return np.asarray(manager.result)
+
+
+def runParareal(source, processes=2, chunks=None, coarse=None,
+                tolerance=1e-5, max_iterations=None, progress=None,
+                **settings):
+    """Run a feed by parareal iterations over chunks of intervals
+
+    PARAMETERS
+    ----------
+    source : str or dict
+        Data folder or its inputs as from_localpath returns them
+    processes : int
+        Workers of the fine integrations
+    chunks : int
+        Chunks of feed intervals, one per worker by default
+    coarse : dict
+        Manager settings of the coarse propagator replacing those
+        of the run, COARSE by default
+    tolerance : float
+        Largest change of a starting state relative to its scale
+        at which the iterations stop
+    max_iterations : int
+        Iterations after which the run stops, the chunks by default
+    progress : callable
+        Called with the iteration and the largest change after
+        every iteration, the run stops when it returns False
+    settings
+        Keyword arguments of the Manager of the fine propagator
+
+    Returns the result rows, the starting states of the chunks and
+    the largest change of every iteration, and whether the states
+    converged.
+    """
+    for key in ("profile", "events", "steady_state"):
+        if settings.get(key):
+            raise ValueError("Parareal runs do not support {}".format(key))
+    _data = from_localpath(source) if isinstance(source, str) else source
+    settings.setdefault("diagnostics", False)
+    coarse = dict(settings, **(COARSE if coarse is None else coarse))
+    intervals = np.asarray(_data.get("feed")).shape[0]
+    chunks = min(chunks or processes, intervals)
+    bounds = [(int(part[0]), int(part[-1]) + 1) for part in
+              np.array_split(np.arange(intervals), chunks)]
+    max_iterations = chunks if max_iterations is None else max_iterations
+    scales = state_scales(Dataset(**_data))
+
+    def sweep(states, predicted=None, fine=None):
+        """Coarse sweep correcting the states from the first chunk"""
+        corrected, found = list(states[:1]), []
+        for n, (start, stop) in enumerate(bounds[:-1]):
+            # -- chunks starting from an unchanged state keep their
+            # coarse prediction
+            if predicted is not None and (n == 0 or np.array_equal(
+                    corrected[n], states[n])):
+                state = predicted[n]
+            else:
+                state = propagate(_data, coarse, start, stop,
+                                  corrected[n])[-1, 2:]
+            found.append(state)
+            if fine is not None:
+                state = state + fine[n] - predicted[n]
+            corrected.append(state)
+        return corrected, found
+
+    # -- the first chunk starts from the inoculum in every iteration
+    states, predicted = sweep([None])
+    rows, started, history = [None] * chunks, [None] * chunks, []
+    converged = False
+    pool = ProcessPoolExecutor(processes) if processes > 1 else None
+    inputs = SharedInputs(_data) if pool else None
+    try:
+        for iteration in range(1, max_iterations + 1):
+            # -- chunks starting from the state of their last fine run
+            # are not integrated again
+            todo = [n for n in range(chunks) if started[n] is None or
+                    not np.array_equal(started[n], states[n])]
+            args = [(inputs if pool else _data, settings) + bounds[n] +
+                    (states[n],) for n in todo]
+            runs = pool.map(propagate, *zip(*args)) if pool else \
+                [propagate(*item) for item in args]
+            for n, run in zip(todo, runs):
+                rows[n], started[n] = run, states[n]
+            fine = [run[-1, 2:] for run in rows[:-1]]
+            corrected, found = sweep(states, predicted, fine)
+            change = max([float(np.max(np.abs(new - old) / scales)) for
+                          new, old in zip(corrected[1:], states[1:])] or
+                         [0.])
+            states, predicted = corrected, found
+            history.append(change)
+            if change <= tolerance or iteration >= chunks:
+                converged = True
+                break
+            if progress is not None and progress(iteration, change) is False:
+                break
+    finally:
+        if pool:
+            pool.shutdown()
+            inputs.close()
+    return dict(result=np.vstack(rows), states=states[1:],
+                bounds=bounds, iterations=len(history),
+                converged=converged, history=history)
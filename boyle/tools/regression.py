@@ -0,0 +1,252 @@
+#!/usr/bin/env python
+
+"""
+Performance Regression
+
+Harness that runs the reference case and synthetic long horizon
+feeds and records the wall time, the calls of the right-hand
+side, the solver steps and the peak memory in kB of every case,
+where the resource module is available, in an append-only
+history file of JSON lines. A new record is compared
+with the baseline of its case, the last record marked as baseline
+or the first record otherwise, and a metric growing beyond its
+threshold ratio is reported as a regression. The reference case
+is also checked for accuracy against data/reference.hdf5 like
+tests/test_boyle.py does.
+
+    python -m boyle.tools.regression --cases reference constant
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import multiprocessing
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import scipy
+
+from boyle import __version__
+from boyle.core.generic import Dataset, SimulationResult
+from boyle.core.load import from_localpath, fromHDF5
+from boyle.manager import Manager
+from boyle.tools.analysis import compareSolutions
+
+try:
+    import resource
+except ImportError:
+    # -- Windows has no resource module, the peak memory is not
+    # measured there
+    resource = None
+
+HISTORY = "benchmarks/history.jsonl"
+
+# Largest ratio of a metric to its baseline before it regresses
+THRESHOLDS = {"wall_time": 1.5, "rhs_calls": 1.1, "steps": 1.1,
+              "peak_rss": 1.25}
+
+
+def reference_case(path, days=None):
+    """Inputs of the data folder as they are"""
+    return from_localpath(path)
+
+
+def constant_case(path, days=730):
+    """Daily feed of the mean composition of the data folder"""
+    _data = from_localpath(path)
+    feed = _data.get("feed")
+    synthetic = np.tile(feed.mean(axis=0), (days, 1))
+    synthetic[:, 0] = feed[0, 0] + 24 * np.arange(days)
+    _data["feed"] = synthetic
+    return _data
+
+
+def cyclic_case(path, days=1095):
+    """Feed of the data folder repeated over a longer horizon"""
+    _data = from_localpath(path)
+    feed = _data.get("feed")
+    synthetic = feed[np.arange(days) % feed.shape[0]].copy()
+    synthetic[:, 0] = feed[0, 0] + 24 * np.arange(days)
+    _data["feed"] = synthetic
+    return _data
+
+
+CASES = {"reference": reference_case, "constant": constant_case,
+         "cyclic": cyclic_case}
+
+
+def peak_rss():
+    """Peak resident memory of the process in kB, None if unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # -- ru_maxrss is given in bytes on macOS and in kB elsewhere
+    if sys.platform == "darwin":
+        return peak // 1024
+    return peak
+
+
+def run_case(name, path="data/", days=None, settings=None):
+    """Run a case and measure it
+
+    Returns the metrics of the run together with the outcome of
+    the accuracy check, which is only made for the reference case.
+    """
+    builder = CASES.get(name)
+    _data = builder(path) if days is None else builder(path, days)
+    manager = Manager(Dataset(**_data), **(settings or {}))
+    start = time.perf_counter()
+    frame = manager.start()
+    wall_time = time.perf_counter() - start
+    metrics = dict(wall_time=wall_time, rows=len(manager.result),
+                   **manager.statistics, peak_rss=peak_rss())
+    accuracy = "skipped"
+    if isinstance(frame, dict):
+        accuracy = "failed: pH diverging"
+    elif name == "reference":
+        try:
+            reference = SimulationResult(fromHDF5(
+                "{}/reference.hdf5".format(path.rstrip("/"))))
+        except IOError:
+            pass
+        else:
+            try:
+                compareSolutions(reference.getDataset("debug_solution"),
+                                 frame.y_hat)
+                accuracy = "passed"
+            except AssertionError as e:
+                accuracy = "failed: {}".format(str(e).strip().splitlines()[0])
+    return metrics, accuracy
+
+
+def measure(name, path="data/", days=None, settings=None, isolate=True):
+    """Run a case, in a fresh process of its own with isolate
+
+    A fresh process keeps the peak memory of a case apart from
+    the cases run before it.
+    """
+    if not isolate:
+        return run_case(name, path, days, settings)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(1, mp_context=context) as pool:
+        return pool.submit(run_case, name, path, days, settings).result()
+
+
+def read_history(path):
+    """Records of a history file"""
+    try:
+        with open(path, "r") as stream:
+            return [json.loads(line) for line in stream if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def append_history(path, record):
+    """Append a record to a history file"""
+    folder = os.path.dirname(path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(path, "a") as stream:
+        stream.write(json.dumps(record) + "\n")
+
+
+def baseline_of(history, case, days=None):
+    """Baseline record of a case and horizon in the history"""
+    records = [record for record in history if record.get("case") == case
+               and record.get("days") == days]
+    marked = [record for record in records if record.get("baseline")]
+    if marked:
+        return marked[-1]
+    return records[0] if records else None
+
+
+def regressions(record, baseline, thresholds=THRESHOLDS):
+    """Metrics of a record that regressed against the baseline"""
+    found = []
+    if record.get("accuracy", "").startswith("failed"):
+        found.append("accuracy {}".format(record.get("accuracy")))
+    if baseline is None:
+        return found
+    for metric, ratio in thresholds.items():
+        value = record["metrics"].get(metric)
+        reference = baseline["metrics"].get(metric)
+        if value is None or not reference:
+            continue
+        if value > ratio * reference:
+            found.append("{} {:.4g} exceeds {:.4g} x baseline {:.4g}".format(
+                metric, value, ratio, reference))
+    return found
+
+
+def create_record(case, metrics, accuracy, days=None, baseline=False):
+    """History record of a measured case"""
+    return dict(time=datetime.now(timezone.utc).isoformat(), case=case,
+                days=days, version=__version__,
+                python=platform.python_version(), numpy=np.__version__,
+                scipy=scipy.__version__, host=platform.node(),
+                metrics=metrics, accuracy=accuracy, baseline=baseline)
+
+
+def check(cases=("reference",), path="data/", history=HISTORY, days=None,
+          thresholds=THRESHOLDS, baseline=False, isolate=True,
+          stream=sys.stdout):
+    """Measure cases, record them and report their regressions
+
+    Returns the regressions found for every case.
+    """
+    records = read_history(history)
+    found = {}
+    for case in cases:
+        horizon = None if case == "reference" else days
+        metrics, accuracy = measure(case, path, horizon, isolate=isolate)
+        record = create_record(case, metrics, accuracy, horizon, baseline)
+        found[case] = regressions(record, None if baseline else
+                                  baseline_of(records, case, horizon),
+                                  thresholds)
+        append_history(history, record)
+        records.append(record)
+        if stream is not None:
+            memory = "memory not measured" if metrics.get("peak_rss") is \
+                None else "{} kB".format(metrics.get("peak_rss"))
+            print("{}: {:.2f} s, {} rhs calls, {} steps, {}, "
+                  "accuracy {}".format(case, metrics.get("wall_time"),
+                                       metrics.get("rhs_calls"),
+                                       metrics.get("steps"), memory,
+                                       accuracy),
+                  file=stream)
+            for item in found[case]:
+                print("  REGRESSION {}".format(item), file=stream)
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Check boyle for performance regressions.")
+    parser.add_argument("--cases", nargs="+", default=["reference"],
+                        choices=sorted(CASES))
+    parser.add_argument("--data", default="data/")
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--days", type=int,
+                        help="Horizon of the synthetic cases")
+    parser.add_argument("--threshold", action="append", default=[],
+                        metavar="METRIC=RATIO")
+    parser.add_argument("--baseline", action="store_true",
+                        help="Mark the new records as baseline")
+    parser.add_argument("--no-isolate", action="store_true",
+                        help="Run the cases in this process")
+    args = parser.parse_args(argv)
+    thresholds = dict(THRESHOLDS)
+    for item in args.threshold:
+        metric, ratio = item.split("=")
+        thresholds[metric] = float(ratio)
+    found = check(args.cases, args.data, args.history, args.days,
+                  thresholds, args.baseline, not args.no_isolate)
+    return 1 if any(found.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import numpy as np
+import h5py as h5
+from numpy import testing
+from boyle import Dataset, Manager
+from boyle.core.generic import RunContext, pHvalue
+from boyle.core.load import from_localpath
+from boyle.core.model.standard import Standard
+from boyle.core.save import OUTPUT_HEADERS
+from boyle.tools.analysis import computeBMP, solutionBMP, summariseBMP, \
+    writeBMPSummary, recomputeDiagnostics, BMP_COLUMNS, DIAGNOSTIC_HEADERS
+
+
+def test_ensembleBMP():
+    """Stacked ensembles reduce the same as single runs"""
+    ensemble = np.random.rand(4, 25, len(BMP_COLUMNS))
+    stacked = computeBMP(ensemble)
+    assert stacked.shape == (4, 25)
+    for idx in range(ensemble.shape[0]):
+        testing.assert_allclose(stacked[idx], computeBMP(ensemble[idx]))
+
+
+def test_summariseBMP(tmp_path):
+    """Summaries are independent of the streaming chunk size"""
+    n_cols = len(OUTPUT_HEADERS.get("solution"))
+    paths = []
+    for idx in range(3):
+        solution = np.random.rand(101, n_cols)
+        solution[:, 1] = np.arange(101) * 0.5
+        path = str(tmp_path / "scenario_{}.hdf5".format(idx))
+        with h5.File(path, "w") as _file:
+            _file.create_group("Output")["solution"] = solution
+        paths.append(path)
+    # --
+    table = summariseBMP(paths, chunk_size=7)
+    whole = summariseBMP(paths, chunk_size=1000)
+    assert list(table["scenario"]) == ["scenario_0", "scenario_1",
+                                       "scenario_2"]
+    for name in ("bmp_start", "bmp_end", "bmp_min", "bmp_max", "bmp_mean"):
+        testing.assert_allclose(table[name], whole[name])
+    with h5.File(paths[0], "r") as _file:
+        bmp = solutionBMP(_file["Output"]["solution"][()])
+    testing.assert_allclose(table["bmp_mean"][0], bmp.mean())
+    assert table["t_end"][0] == 50
+    # --
+    out_path = tmp_path / "summary.csv"
+    writeBMPSummary(str(out_path), table)
+    assert out_path.read_text().splitlines()[0].startswith("scenario,rows")
+
+
+def test_recomputeDiagnostics():
+    """Recomputed diagnostics match the debug output of the model"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:2]
+    dataset = Dataset(**_data)
+    for method in ("fixed", "newton-raphson"):
+        ph_mode = pHvalue(method, 7.5)
+        manager = Manager(dataset, ph=ph_mode._asdict(), diagnostics=False)
+        assert not hasattr(manager.start(), "debug")
+        y_hat = np.asarray(manager.result)
+        diagnostics = recomputeDiagnostics(y_hat, dataset, ph_mode)
+        assert diagnostics.shape == (len(y_hat), len(DIAGNOSTIC_HEADERS))
+        # -- the model logs the last row it is evaluated at
+        context = RunContext(dataset)
+        context.debug = []
+        for row in y_hat[::97]:
+            context.move_index_for_iteration(int(row[0]))
+            Standard(row[1], row[2:], context, int(row[0]), ph_mode)
+        testing.assert_allclose(diagnostics[::97], np.array(context.debug),
+                                rtol=1e-8, atol=1e-15)
@@ -1,9 +1,8 @@
 import numpy as np
-from numpy import testing
 from boyle.manager import Manager
 from boyle.tools.utility import load_data
 from boyle import __version__
-from boyle.tools.analysis import interpolateData
+from boyle.tools.analysis import compareSolutions
 from boyle import load, SimulationResult, Dataset
 from collections import namedtuple
 
@@ -54,13 +53,8 @@ def test_initialisation():
     reference = SimulationResult(load.fromHDF5(_path))
     result = manager.start()
     # -- Check if the data is within thresholds
-    reference_result = interpolateData(
-        np.asarray(reference.getDataset("debug_solution")),
-        time_col=1, time_step=1)
-    test_result = interpolateData(np.asarray(result.y_hat), time_col=1,
-                                  time_step=1)
-    testing.assert_allclose(reference_result[1:], test_result[1:],
-                            rtol=1e-5, atol=1e-5)
+    compareSolutions(reference.getDataset("debug_solution"), result.y_hat,
+                     time_step=1, rtol=1e-5, atol=1e-5)
 
 
 def test_loadResult():
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle.core.load import from_localpath
+from boyle.tools.campaign import runCampaign, sampleBatch, estimate
+
+
+def test_sampleBatch():
+    """Batches follow the normal inputs and differ by their seed"""
+    factors = {"lipids": (1., 0.1), "temp": (0., 2.)}
+    for sampler in ("sobol", "halton", "lhs"):
+        batch = sampleBatch(factors, 256, sampler, seed=1)
+        assert batch.shape == (256, 2)
+        testing.assert_allclose(batch.mean(axis=0), [1., 0.], atol=0.05)
+        testing.assert_allclose(batch.std(axis=0), [0.1, 2.], rtol=0.1)
+        assert not np.allclose(batch, sampleBatch(factors, 256, sampler, 2))
+    with pytest.raises(ValueError):
+        sampleBatch(factors, 4, "random")
+
+
+def test_estimate():
+    """Intervals follow from the spread of the batch means"""
+    found = estimate([np.array([1., 3.]), np.array([2., 4.])])
+    assert found["mean"] == 2.5 and found["samples"] == 4
+    testing.assert_allclose(found["half_width"], 12.706205 * 0.5,
+                            rtol=1e-6)
+    assert estimate([np.array([1., 2.])])["half_width"] == np.inf
+
+
+def test_campaign():
+    """Campaigns stop at the requested precision or when asked to"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:2]
+    factors = {"lipids": (1., 0.1)}
+    settings = dict(model="reduced", step_size=24)
+    result = runCampaign(_data, factors, batch_size=4, rtol=0.05, seed=3,
+                         **settings)
+    assert result["converged"] and result["batches"] == 3
+    assert result["samples"].shape == (12, 1)
+    for name in ("methane", "peak_vfa"):
+        item = result["estimates"][name]
+        testing.assert_allclose(item["mean"], result["values"][name].mean())
+        assert item["half_width"] <= 0.05 * item["mean"]
+    seen = []
+    stopped = runCampaign(_data, factors, targets=["methane"], batch_size=4,
+                          rtol=0., seed=3, progress=lambda batch, estimates:
+                          seen.append(batch) or batch < 2, **settings)
+    assert seen == [1, 2] and stopped["batches"] == 2
+    assert not stopped["converged"] and list(stopped["estimates"]) == \
+        ["methane"]
+    # -- the last batch that fits within max_samples is the last one run
+    capped = runCampaign(_data, factors, targets=["methane"], batch_size=4,
+                         rtol=0., max_samples=10, seed=3, **settings)
+    assert capped["batches"] == 2 and capped["samples"].shape == (8, 1)
+    with pytest.raises(ValueError):
+        runCampaign(_data, factors, batch_size=4, max_samples=2)
+    with pytest.raises(ValueError):
+        runCampaign(_data, factors, targets=["ph"])
@@ -0,0 +1,101 @@
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+import yaml
+from numpy import testing
+from boyle import SimulationResult
+from boyle.cli import expand_jobs, run_batch, format_summary
+from boyle.config import expand_sweep
+from boyle.core import save
+from boyle.manager import Manager
+
+
+def job_file(tmp_path, name="job", rows=2, sweep=None):
+    """YAML job on a copy of the test folder limited to feed rows"""
+    folder = tmp_path / "data"
+    if not folder.exists():
+        shutil.copytree("data/", folder)
+        np.save(folder / "feed.npy", np.load(folder / "feed.npy")[:rows])
+    config = {"metadata": {"data": "./data"},
+              "settings": {"step_size": 2.,
+                           "solver": {"method": "bdf", "order": 1,
+                                      "nsteps": 1e6, "relative": "1e-4",
+                                      "absolute": "1e-8"}}}
+    if sweep:
+        config["sweep"] = sweep
+    path = tmp_path / "{}.yaml".format(name)
+    path.write_text(yaml.safe_dump(config))
+    return str(path)
+
+
+def test_expandSweep():
+    """Sweeps expand into every combination of their values"""
+    config = {"metadata": {"name": "run"}, "settings": {"ph": {}},
+              "sweep": {"settings.step_size": [0.5, 1.],
+                        "settings.ph.method": ["fixed", "fsolve"]}}
+    jobs = expand_sweep(config)
+    assert len(jobs) == 4
+    assert jobs[3]["settings"] == {"step_size": 1., "ph": {"method": "fsolve"}}
+    assert jobs[3]["metadata"]["name"] == "run_003"
+    assert "sweep" in config and config["settings"] == {"ph": {}}
+
+
+def test_batch(tmp_path):
+    """Jobs are written to HDF5 and reported in the summary"""
+    paths = [job_file(tmp_path), job_file(tmp_path, "sweep",
+                                          sweep={"settings.step_size":
+                                                 [2., 4.]})]
+    jobs = expand_jobs(paths)
+    names = [job["metadata"]["name"] for job in jobs]
+    assert names == ["job", "sweep_000", "sweep_001"]
+    assert jobs[0]["metadata"]["data"] == str(tmp_path / "data")
+    reports = run_batch(jobs, output=str(tmp_path / "out"), stream=None)
+    assert [report.get("status") for report in reports] == ["done"] * 3
+    with h5py.File(reports[0].get("output"), "r") as stored:
+        solution = stored["Output/solution"][()]
+        assert "debug" in stored["Output"]
+    assert solution.shape == (reports[0].get("rows"), 35)
+    testing.assert_allclose(solution[-1, 1], reports[0].get("t_end"))
+    assert reports[2].get("rows") < reports[1].get("rows")
+    summary = format_summary(reports).splitlines()
+    assert len(summary) == 5 and summary[0].startswith("name")
+
+
+def test_outputProfiles(tmp_path):
+    """Compact outputs read back like full outputs"""
+    jobs = expand_jobs([job_file(tmp_path)])
+    outputs = {}
+    for profile in ("full", "compact", "archive"):
+        report = run_batch(jobs, output=str(tmp_path / profile),
+                           stream=None, profile=profile)[0]
+        outputs[profile] = report.get("output")
+    full = SimulationResult(h5py.File(outputs.get("full"), "r"))
+    compact = SimulationResult(h5py.File(outputs.get("compact"), "r"))
+    archive = SimulationResult(h5py.File(outputs.get("archive"), "r"))
+    solution = full.getDataset("solution")
+    assert full.getHeaders("solution") == \
+        save.OUTPUT_HEADERS.get("solution")[:35]
+    assert full.getHeaders("debug") == save.OUTPUT_HEADERS.get("debug")
+    testing.assert_allclose(compact.getDataset("solution"), solution,
+                            rtol=1e-6)
+    assert compact.getDataset("solution").dtype == np.float64
+    stored = archive.getDataset("solution")
+    testing.assert_allclose(stored[:-1], solution[:-1:2], rtol=1e-6)
+    testing.assert_allclose(stored[-1], solution[-1], rtol=1e-6)
+    assert "debug" not in archive._file["Output"]
+    # -- selected columns keep run_no and time
+    frame = Manager(str(tmp_path / "data"), step_size=2.).start()
+    solution = np.asarray(frame.y_hat)
+    path = str(tmp_path / "columns.hdf5")
+    save.to_hdf5(path, frame, profile={"columns": {"solution": ["ac_ace"]}})
+    with h5py.File(path, "r") as stored:
+        assert list(stored["Output/solution"].attrs["headers"]) == \
+            [b"run_no", b"time", b"ac_ace"]
+        testing.assert_array_equal(stored["Output/solution"][()],
+                                   solution[:, [0, 1, 14]])
+    with pytest.raises(ValueError):
+        save.to_hdf5(path, frame, profile={"columns": {"solution": ["ph"]}})
+    with pytest.raises(ValueError):
+        save.to_hdf5(path, frame, profile={"dtype": "float16"})
@@ -0,0 +1,58 @@
+import json
+import numpy as np
+import pytest
+from numpy import testing
+from boyle.core.load import from_localpath
+from boyle.tools.emulator import Emulator, trainEmulator, runEnsemble, \
+    applyInputs
+
+
+def test_emulatorFit():
+    """Quadratic responses are reproduced by a degree 2 emulator"""
+    rng = np.random.default_rng(4)
+    values = rng.normal([1., 0.], [0.1, 1.], size=(30, 2))
+    times = np.arange(1., 6.)
+    outputs = {"gasflow": np.outer(values[:, 0]**2, times) +
+               np.outer(values[:, 1], np.sqrt(times)),
+               "bmp": np.outer(values[:, 0] * values[:, 1], times)}
+    emulator = Emulator(["lipids", "temp"], times, alpha=0.).fit(values,
+                                                                 outputs)
+    predicted = emulator.predict(lipids=1.1, temp=0.5)
+    testing.assert_allclose(predicted["gasflow"],
+                            1.21 * times + 0.5 * np.sqrt(times))
+    testing.assert_allclose(predicted["bmp"], 0.55 * times, atol=1e-12)
+    assert emulator.heldout(values, outputs)["gasflow"] < 1e-12
+    with pytest.raises(ValueError):
+        emulator.predict(fat=1.1)
+
+
+def test_emulatorRuns(tmp_path):
+    """Emulators trained on runs predict unseen runs and persist"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:3]
+    factors = {"lipids": (1., 0.1), "temp": (0., 1.)}
+    emulator = trainEmulator(_data, factors, samples=12, holdout=0.25,
+                             seed=2, model="reduced", step_size=24)
+    assert set(emulator.error) == {"gasflow", "bmp"}
+    assert max(emulator.error.values()) < 0.05
+    testing.assert_array_equal(emulator.times, _data["feed"][:, 0])
+    times, runs = runEnsemble(_data, ["lipids"], [[1.1]], model="reduced",
+                              step_size=24)
+    predicted = emulator.predict(lipids=1.1)
+    for name in ("gasflow", "bmp"):
+        testing.assert_allclose(predicted[name], runs[name][0], rtol=0.05)
+    # --
+    path = str(tmp_path / "emulator.npz")
+    emulator.save(path)
+    loaded = Emulator.load(path)
+    assert loaded.error == emulator.error
+    testing.assert_array_equal(loaded.predict(lipids=1.1)["bmp"],
+                               predicted["bmp"])
+    with np.load(path) as stored:
+        arrays = dict(stored)
+    metadata = json.loads(str(arrays.pop("metadata")))
+    np.savez(path, metadata=json.dumps(dict(metadata, version=0)), **arrays)
+    with pytest.raises(ValueError):
+        Emulator.load(path)
+    with pytest.raises(ValueError):
+        applyInputs(_data["feed"], {"fat": 1.1})
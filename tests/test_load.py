@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle.core.load import from_localpath, from_bundle, from_arrays, \
+    build_dataset
+from boyle.core.save import to_bundle, to_hdf5, INPUT_NAMES
+from boyle.manager import Manager
+
+SETTINGS = dict(step_size=24, diagnostics=False)
+
+
+def _inputs():
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:2]
+    return {name: _data.get(name) for name in INPUT_NAMES}
+
+
+def test_fromArrays():
+    """Datasets are built from checked arrays"""
+    _data = _inputs()
+    manager = Manager(build_dataset(**_data), **SETTINGS)
+    manager.start()
+    assert len(manager.result) > 0
+    inputs = from_arrays(**dict(_data, feed=_data["feed"].astype(int)))
+    assert inputs["feed"].dtype == np.float64
+    for name, value in (("feed", _data["feed"][:, :10]),
+                        ("inoculum", _data["inoculum"][:-1]),
+                        ("yc", _data["yc"].astype(complex)),
+                        ("feed", _data["feed"][::-1]),
+                        ("Const2", np.zeros(16))):
+        with pytest.raises(ValueError):
+            from_arrays(**dict(_data, **{name: value}))
+    _data["Const1"] = _data["Const1"].copy()
+    _data["Const1"][0, 0] = np.nan
+    with pytest.raises(ValueError):
+        from_arrays(**_data)
+
+
+@pytest.mark.parametrize("extension", ["npz", "hdf5"])
+def test_bundle(tmp_path, extension):
+    """Inputs and result files run again from a single file"""
+    _data = _inputs()
+    path = str(tmp_path / "inputs.{}".format(extension))
+    to_bundle(path, _data)
+    loaded = from_bundle(path)
+    for name in INPUT_NAMES:
+        assert loaded[name].dtype == _data[name].dtype
+        assert np.all(np.asarray(loaded[name]) == np.asarray(_data[name]))
+    manager = Manager(path, **SETTINGS)
+    frame = manager.start()
+    result = str(tmp_path / "result.hdf5")
+    to_hdf5(result, frame)
+    rerun = Manager(result, **SETTINGS)
+    rerun.start()
+    testing.assert_array_equal(rerun.result, manager.result)
+    with pytest.raises(ValueError):
+        to_bundle(path, {"feed": _data["feed"]})
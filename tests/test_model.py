@@ -0,0 +1,155 @@
+import os
+import pytest
+import numpy as np
+from numpy import testing
+from boyle import Dataset, Manager, load, save, SimulationResult
+from boyle.core.generic import RunContext, pHvalue
+from boyle.core.computations import ph
+from boyle.core.load import from_localpath
+from boyle.core.model import MODELS, get_model, jit, network, reduced
+from boyle.core.model.standard import Standard
+from boyle.tools.analysis import interpolateData
+
+
+def short_dataset(rows=5):
+    """Dataset of the test folder limited to the first feed rows"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return Dataset(**_data)
+
+
+def test_jitFallback():
+    """The compiled model is only registered when Numba is available"""
+    if jit.AVAILABLE:
+        assert get_model("jit").function is jit.StandardJIT
+    else:
+        assert get_model("jit") is MODELS.get("standard")
+    assert get_model("unknown") is None
+
+
+@pytest.mark.parametrize("method", ["fixed", "newton-raphson", "fsolve"])
+def test_jitParity(method):
+    """Compiled right-hand side matches the Standard model"""
+    pytest.importorskip("numba")
+    dataset = short_dataset()
+    dataset.move_index_for_iteration(index=2)
+    ph_mode = pHvalue(method, 7.5)
+    y0 = dataset.inoculum.get("value")
+    args = jit.arguments(dataset, 2, ph_mode)
+    testing.assert_allclose(jit.StandardJIT(0., y0, *args),
+                            Standard(0., y0, dataset, 2, ph_mode),
+                            rtol=1e-8, atol=1e-12)
+    assert jit.StandardJacobian(0., y0, *args).shape == (33, 33)
+
+
+def test_jitRun():
+    """Compiled runs agree with the Standard model within tolerance"""
+    pytest.importorskip("numba")
+    reference = np.asarray(Manager(short_dataset()).start().y_hat)
+    result = np.asarray(Manager(short_dataset(), model="jit").start().y_hat)
+    testing.assert_allclose(result, reference, rtol=5e-3, atol=1e-6)
+    # -- compare against the stored reference run when available
+    _path = "data/reference.hdf5"
+    if not os.path.exists(_path):
+        pytest.skip("Reference output is not available")
+    stored = SimulationResult(load.fromHDF5(_path))
+    stored = interpolateData(np.asarray(stored.getDataset("debug_solution")),
+                             time_col=1, time_step=1)
+    full = Manager(short_dataset(rows=None), model="jit").start()
+    testing.assert_allclose(
+        stored[1:], interpolateData(np.asarray(full.y_hat), time_col=1,
+                                    time_step=1)[1:], rtol=5e-3, atol=1e-5)
+
+
+@pytest.mark.parametrize("method", ["fixed", "newton-raphson", "fsolve"])
+def test_networkParity(method):
+    """Model generated from the declared network matches Standard"""
+    dataset = short_dataset()
+    dataset.move_index_for_iteration(index=2)
+    ph_mode = pHvalue(method, 7.5)
+    y0 = dataset.inoculum.get("value")
+    args = network.arguments(dataset, 2, ph_mode)
+    testing.assert_allclose(network.NetworkModel(0., y0, *args),
+                            Standard(0., y0, dataset, 2, ph_mode),
+                            rtol=1e-10, atol=1e-12)
+
+
+def test_networkSparsity():
+    """Every non-zero of the Jacobian is part of the pattern"""
+    dataset = short_dataset()
+    dataset.move_index_for_iteration(index=2)
+    args = network.arguments(dataset, 2, pHvalue("fsolve", None))
+    y0 = dataset.inoculum.get("value") + 0.01
+    f0 = network.NetworkModel(0., y0, *args)
+    for j in range(y0.shape[0]):
+        y = y0.copy()
+        y[j] += 1e-6 * max(abs(y0[j]), 1e-3)
+        changed = network.NetworkModel(0., y, *args) != f0
+        assert network.STANDARD_SPARSITY[changed, j].all()
+
+
+def test_networkRun():
+    """Network model runs with the sparse stiff solver"""
+    reference = np.asarray(Manager(short_dataset()).start().y_hat)
+    result = Manager(short_dataset(), model="network",
+                     integrator="bdf").start()
+    result = np.asarray(result.y_hat)
+    testing.assert_allclose(result[:, 1], reference[:, 1])
+    testing.assert_allclose(result[-1], reference[-1], rtol=1e-2, atol=1e-6)
+
+
+def test_protonRun(tmp_path):
+    """Hydrogen ion state stays on the charge balance"""
+    manager = Manager(short_dataset(rows=2), model="proton",
+                      integrator="bdf")
+    frame = manager.start()
+    result = np.asarray(frame.y_hat)
+    assert result.shape[1] == 36
+    # -- the last column is saved as H
+    path = str(tmp_path / "proton.hdf5")
+    save.to_hdf5(path, frame)
+    with load.fromHDF5(path) as stored:
+        headers = SimulationResult(stored).getHeaders("solution")
+    assert headers[-1] == "H" and "gasrate" not in headers
+    assert headers[:35] == save.OUTPUT_HEADERS.get("solution")[:35]
+    dataset = short_dataset(rows=2)
+    dataset.move_index_for_iteration(index=0)
+    for row in result[::250]:
+        _data = network.ph_data(row[2:-1], network.STANDARD_STRUCTURE,
+                                dataset.henry_constants)
+        testing.assert_allclose(-np.log10(row[-1]),
+                                ph.find_roots(data=_data)[0], atol=1e-3)
+
+
+def test_reducedModel():
+    """Fast substrates balance at quasi-steady state and runs stay close"""
+    dataset = RunContext(short_dataset(rows=3))
+    dataset.move_index_for_iteration(index=1)
+    ph_mode = pHvalue("fixed", 7.5)
+    y0 = np.asarray(dataset.state, dtype=float)
+    y = reduced.quasi_steady(y0, dataset, ph_mode, tolerance=1e-12)
+    y_dot = Standard(0, y, dataset, 1, ph_mode)
+    fast = reduced.FAST_STATES
+    testing.assert_allclose(y_dot[fast], 0, atol=1e-9 * np.abs(y[fast]).max())
+    # --
+    standard = Manager(short_dataset(rows=3), step_size=6)
+    standard.start()
+    screening = Manager(short_dataset(rows=3), model="reduced", step_size=6)
+    screening.start()
+    assert screening._solver_setting is reduced.SOLVER
+    assert screening.statistics["steps"] < standard.statistics["steps"]
+    expected = np.asarray(standard.result)
+    found = np.asarray(screening.result)
+    testing.assert_allclose(found[:, 1], expected[:, 1])
+    testing.assert_allclose(found[-1, 2:], expected[-1, 2:], rtol=0.1,
+                            atol=1e-6)
+    # -- evaluations that are not kept leave the warm start as it was
+    warm = screening._context.quasi_steady
+    logs = screening._log_lengths()
+    last = screening.result[-1]
+    screening._model.function(last[1], 1.5 * last[2:],
+                              *screening._interval_arguments(
+                                  screening._context, 2))
+    assert not np.array_equal(screening._context.quasi_steady, warm)
+    screening._rollback_logs(logs)
+    assert screening._context.quasi_steady is warm
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.manager import Manager
+from boyle.tools.optimise import optimiseSchedule, organicLoadingRate
+
+SETTINGS = dict(model="reduced", step_size=24, diagnostics=False)
+
+
+def _inputs(rows):
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return _data
+
+
+def test_resume():
+    """A run resumed at an interval repeats the rest of the full run"""
+    _data = _inputs(3)
+    manager = Manager(Dataset(**_data), **SETTINGS)
+    manager.start()
+    full = np.asarray(manager.result)
+    rows = int(np.searchsorted(full[:, 0], 2))
+    resumed = Manager(Dataset(**_data), **SETTINGS)
+    resumed.start(resume=(2, full[rows - 1]))
+    testing.assert_allclose(resumed.result, full[rows:])
+
+
+def test_optimiseSchedule():
+    """Schedules gain methane within the loading and VFA limits"""
+    _data = _inputs(3)
+    olr = organicLoadingRate(_data["feed"], _data["inoculum"][0])
+    bounds = {"flow": (0.5, 1.5)}
+    base = optimiseSchedule(_data, bounds, max_evaluations=1, **SETTINGS)
+    assert base["evaluations"] == 1 and not base["history"]
+    max_olr = 1.2 * olr.max()
+    result = optimiseSchedule(_data, bounds, intervals=[1, 2],
+                              max_olr=max_olr, vfa_limit=5., step=0.5,
+                              max_evaluations=16, processes=2, **SETTINGS)
+    assert result["feasible"] and result["methane"] > base["methane"]
+    assert np.all(result["olr"] <= max_olr) and result["peak_vfa"] <= 5.
+    assert result["values"].shape == (2, 1)
+    assert np.all((result["values"] >= 0.5) & (result["values"] <= 1.5))
+    testing.assert_allclose(result["feed"][0], _data["feed"][0])
+    # -- the composed run matches a full run of the best feed
+    manager = Manager(Dataset(**dict(_data, feed=result["feed"])),
+                      **SETTINGS)
+    manager.start()
+    testing.assert_allclose(result["result"], manager.result, rtol=1e-8)
+    with pytest.raises(ValueError):
+        optimiseSchedule(_data, {"flow": (1.5, 0.5)}, **SETTINGS)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle.core.generic import Dataset
+from boyle.core.load import from_localpath
+from boyle.manager import Manager
+from boyle.tools.parareal import runParareal
+
+
+def test_parareal():
+    """Parareal runs converge to the serial run of the feed"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:6]
+    settings = dict(step_size=24, diagnostics=False)
+    manager = Manager(Dataset(**_data), **settings)
+    manager.start()
+    result = runParareal(_data, processes=2, chunks=3, **settings)
+    assert result["converged"] and result["iterations"] <= 3
+    assert result["bounds"] == [(0, 2), (2, 4), (4, 6)]
+    assert np.all(np.diff(result["history"]) < 0)
+    testing.assert_allclose(result["result"], manager.result, rtol=1e-4,
+                            atol=1e-6)
+    single = runParareal(_data, processes=1, chunks=3, max_iterations=1,
+                         **settings)
+    assert single["iterations"] == 1 and not single["converged"]
+    with pytest.raises(ValueError):
+        runParareal(_data, events=[("ac_ace", 1., "up")], **settings)
@@ -0,0 +1,97 @@
+import os
+import warnings
+import numpy as np
+from numpy import testing
+from scipy.optimize import brentq
+from boyle import Dataset
+from boyle.core.generic import pHvalue
+from boyle.core.computations import ph
+from boyle.core.load import from_localpath
+from boyle.core.model import network
+
+
+def ph_states(n=20):
+    """pH arguments for perturbed inoculum states"""
+    dataset = Dataset(**from_localpath("data/"))
+    dataset.move_index_for_iteration(index=0)
+    rng = np.random.RandomState(7)
+    y0 = dataset.inoculum.get("value")
+    return [network.ph_data(y0 * rng.uniform(0.2, 3, y0.shape),
+                            network.STANDARD_STRUCTURE,
+                            dataset.henry_constants) for _ in range(n)]
+
+
+def test_surrogate():
+    """Surrogate pH agrees with the root of the charge balance"""
+    for _data in ph_states():
+        reference = -np.log10(brentq(ph.calculate, 1e-14, 1., args=_data,
+                                     xtol=1e-20))
+        testing.assert_allclose(ph.surrogate(_data), reference, atol=1e-4)
+        testing.assert_allclose(ph.surrogate(_data, newton_steps=1),
+                                reference, atol=1e-8)
+
+
+def test_surrogateCache(tmp_path):
+    """Surrogate tables are written to and read from disk"""
+    _data = ph_states(n=1)[0]
+    ph._surrogate_tables.clear()
+    table = ph.surrogate_table(_data, cache_dir=str(tmp_path))
+    files = os.listdir(str(tmp_path))
+    assert len(files) == 1
+    ph._surrogate_tables.clear()
+    testing.assert_array_equal(
+        ph.surrogate_table(_data, cache_dir=str(tmp_path)), table)
+
+
+def stacked_states(states):
+    """pH arguments of the states as arrays, the constants shared"""
+    stacked = {key: list(values) for key, values in states[0].items()}
+    for key, values in stacked.items():
+        count = 2 if key == "Other" else 1
+        for idx in range(count):
+            values[idx] = np.array([item.get(key)[idx] for item in states])
+    return stacked
+
+
+def test_chargeBalance():
+    """States give the pH arguments of their concentrations"""
+    dataset = Dataset(**from_localpath("data/"))
+    dataset.move_index_for_iteration(index=0)
+    rng = np.random.RandomState(7)
+    y = dataset.inoculum.get("value") * rng.uniform(0.2, 3, (5, 33))
+    states = [network.ph_data(item, network.STANDARD_STRUCTURE,
+                              dataset.henry_constants) for item in y]
+    for key, values in stacked_states(states).items():
+        for value, expected in zip(
+                ph.state_charge_balance(y, dataset.henry_constants)[key],
+                values):
+            testing.assert_array_equal(value, expected)
+
+
+def test_surrogateOutside(monkeypatch):
+    """Elements without a root on the grid are not refined"""
+    stacked = stacked_states(ph_states())
+    stacked["Other"][1] = stacked["Other"][1].copy()
+    stacked["Other"][1][0] = 400.
+    monkeypatch.setattr(ph, "find_roots", lambda data: [14.5])
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        pH = ph.surrogate_array(stacked, newton_steps=2)
+    assert pH[0] == 14.5 and np.all(np.isfinite(pH))
+
+
+def test_solveArray():
+    """Array-aware pH agrees with solving every state on its own"""
+    states = ph_states()
+    stacked = stacked_states(states)
+    for method in ("newton-raphson", "fsolve", "surrogate"):
+        ph_mode = pHvalue(method, 0)
+        pH, H = ph.solve_array(ph_mode, stacked)
+        for idx, _data in enumerate(states):
+            reference, H_ref = ph.solve(ph_mode, _data)
+            if method == "fsolve":
+                # -- fsolve fails on some states, compare to the root
+                reference = -np.log10(brentq(ph.calculate, 1e-14, 1.,
+                                             args=_data, xtol=1e-20))
+            testing.assert_allclose(pH[idx], reference, rtol=1e-7)
+            testing.assert_allclose(H[idx], H_ref, rtol=1e-7)
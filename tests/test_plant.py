@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle import Dataset, Manager, Plant, load, save, SimulationResult
+from boyle.core.load import from_localpath
+from boyle.core.model.network import STANDARD_SPARSITY
+from boyle.plant import plant_sparsity, N_STATES
+
+
+def short_dataset(rows=5):
+    """Dataset of the test folder limited to the first feed rows"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return Dataset(**_data)
+
+
+def test_plantSparsity():
+    """Reactors couple only to the reactor before them"""
+    pattern = plant_sparsity(3).toarray()
+    assert pattern.shape == (3 * N_STATES, 3 * N_STATES)
+    first, second = slice(0, N_STATES), slice(N_STATES, 2 * N_STATES)
+    third = slice(2 * N_STATES, None)
+    testing.assert_array_equal(pattern[first, first], STANDARD_SPARSITY)
+    assert not pattern[first, second].any()
+    assert not pattern[third, first].any()
+    assert pattern[third, second].any()
+
+
+def test_plantSeries(tmp_path):
+    """The first reactor of a plant behaves like a single reactor"""
+    single = Manager(short_dataset(), model="network", integrator="bdf")
+    single = np.asarray(single.start().y_hat)
+    plant = Plant(short_dataset(), reactors=2)
+    frame = plant.start()
+    first, second = plant.split()
+    assert first.shape == single.shape
+    testing.assert_allclose(first[-1], single[-1], rtol=1e-3, atol=1e-6)
+    # -- the second reactor receives the effluent of the first
+    assert not np.allclose(second[-1, 2:], first[-1, 2:])
+    testing.assert_allclose(second[:, 2], first[:, 2])
+    # -- the states of every reactor are saved under their own headers
+    path = str(tmp_path / "plant.hdf5")
+    save.to_hdf5(path, frame)
+    with load.fromHDF5(path) as stored:
+        headers = SimulationResult(stored).getHeaders("solution")
+    assert len(headers) == 2 + 2 * N_STATES and "gasrate" not in headers
+    assert headers[2] == "r1.volume" and headers[2 + N_STATES] == "r2.volume"
+    # -- outputs with more columns than headers are not written
+    frame.headers = {}
+    with pytest.raises(ValueError):
+        save.to_hdf5(str(tmp_path / "unnamed.hdf5"), frame)
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+from numpy import testing
+from boyle import Dataset, Manager
+from boyle.core.load import from_localpath
+from boyle.core.profile import FeedProfile
+
+
+def short_dataset(rows=3):
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return Dataset(**_data)
+
+
+def test_feedProfile():
+    """Profiles pass through the rows of the feed and hold its ends"""
+    dataset = short_dataset()
+    times = dataset.feed_payload["tp"]
+    for kind in ("step", "linear", "cubic"):
+        profile = FeedProfile(dataset, kind=kind)
+        for idx, time in enumerate(times):
+            values, _ = dataset.interval(idx)
+            at = profile(time)
+            testing.assert_allclose(at["flow_in"], values["flow_in"])
+            testing.assert_allclose(at["substrate_flow"],
+                                    values["substrate_flow"])
+            testing.assert_allclose(at["mu_max"]["params"]["mu_max"],
+                                    values["mu_max"]["params"]["mu_max"])
+            testing.assert_allclose(at["henry_constants"]["k_h"],
+                                    values["henry_constants"]["k_h"])
+        testing.assert_allclose(profile(0.)["flow_in"],
+                                profile(times[0])["flow_in"])
+    # -- linear profiles are halfway between the rows at midpoints
+    linear = FeedProfile(dataset, kind="linear")
+    middle = linear((times[0] + times[1]) / 2)
+    testing.assert_allclose(middle["substrate_flow"], np.mean(
+        dataset.feed_payload["substrates"][:2], axis=0))
+    with pytest.raises(ValueError):
+        FeedProfile(dataset, kind="spline")
+
+
+def test_profileRun():
+    """A step profile integrated at once follows the interval run"""
+    dataset = short_dataset()
+    intervals = Manager(dataset)
+    intervals.start()
+    profiled = Manager(dataset, profile="step")
+    seen = []
+    profiled.start(progress=lambda idx, t: seen.append(idx))
+    reference = np.asarray(intervals.result)
+    result = np.asarray(profiled.result)
+    assert seen == [0, 1, 2]
+    testing.assert_array_equal(result[:, :2], reference[:, :2])
+    testing.assert_allclose(result[:, 2:], reference[:, 2:], rtol=1e-3,
+                            atol=1e-6)
+    with pytest.raises(ValueError):
+        Manager(dataset, model="network", profile="linear")
+
+
+def test_profileErrors():
+    """Failed profile runs return the error payload of interval runs"""
+    dataset = short_dataset()
+    failing = Manager(dataset, profile="step",
+                      solver={"method": "bdf", "order": 1, "nsteps": 50,
+                              "rtol": 1e-4, "atol": 1e-8})
+    payload = failing.start()
+    assert isinstance(payload, dict)
+    assert payload["error"].startswith("Solver failed")
+    assert payload["recoveries"] == []
+
+    def interrupt(idx, t):
+        raise KeyboardInterrupt
+
+    payload = Manager(dataset, profile="step").start(progress=interrupt)
+    assert payload["error"].startswith("KEYBOARD INTERRUPT")
+    assert len(payload["result"]) > 0
@@ -0,0 +1,57 @@
+from boyle.tools import regression
+from boyle.tools.regression import check, read_history, baseline_of, \
+    regressions
+
+
+def test_baseline():
+    """The last marked record of a case and horizon is the baseline"""
+    history = [dict(case="constant", days=2, baseline=False, metrics={}),
+               dict(case="constant", days=2, baseline=True, metrics={}),
+               dict(case="constant", days=4, baseline=True, metrics={}),
+               dict(case="constant", days=2, baseline=False, metrics={})]
+    assert baseline_of(history, "constant", 2) is history[1]
+    assert baseline_of(history[:1], "constant", 2) is history[0]
+    assert baseline_of(history, "cyclic", 2) is None
+    record = dict(accuracy="skipped", metrics=dict(wall_time=2., steps=100))
+    baseline = dict(metrics=dict(wall_time=1., steps=100))
+    found = regressions(record, baseline, {"wall_time": 1.5, "steps": 1.1})
+    assert len(found) == 1 and found[0].startswith("wall_time")
+    assert regressions(dict(record, accuracy="failed: x"), None) == \
+        ["accuracy failed: x"]
+
+
+def test_check(tmp_path):
+    """Runs are appended to the history and compared to the baseline"""
+    history = str(tmp_path / "history.jsonl")
+    found = check(["constant"], history=history, days=2, baseline=True,
+                  isolate=False, stream=None)
+    assert found == {"constant": []}
+    found = check(["constant"], history=history, days=2, isolate=False,
+                  thresholds={"rhs_calls": 0.5}, stream=None)
+    assert found.get("constant")[0].startswith("rhs_calls")
+    records = read_history(history)
+    assert len(records) == 2 and records[0].get("baseline")
+    assert records[1]["metrics"]["steps"] > 0
+
+
+def test_peakRSS(monkeypatch):
+    """Peak memory is in kB, None without the resource module"""
+    assert regression.peak_rss() > 0
+
+    class Usage:
+        ru_maxrss = 2048 * 1024
+
+    class Resource:
+        RUSAGE_SELF = 0
+
+        @staticmethod
+        def getrusage(who):
+            return Usage()
+
+    monkeypatch.setattr(regression, "resource", Resource)
+    monkeypatch.setattr(regression.sys, "platform", "darwin")
+    assert regression.peak_rss() == 2048
+    monkeypatch.setattr(regression, "resource", None)
+    assert regression.peak_rss() is None
+    record = dict(accuracy="skipped", metrics=dict(peak_rss=None))
+    assert regressions(record, dict(metrics=dict(peak_rss=100.))) == []
@@ -0,0 +1,77 @@
+import asyncio
+import shutil
+
+import numpy as np
+from numpy import testing
+from boyle import Manager
+from boyle.config import manager_settings
+from boyle.server import JobServer, request
+
+
+def short_folder(tmp_path, rows=3):
+    """Copy of the test folder limited to the first feed rows"""
+    folder = tmp_path / "data_{}".format(rows)
+    shutil.copytree("data/", folder)
+    np.save(folder / "feed.npy", np.load(folder / "feed.npy")[:rows])
+    return str(folder)
+
+
+def job_config(folder):
+    return {"metadata": {"name": "test", "data": folder},
+            "settings": {"step_size": 0.5,
+                         "ph": {"method": "fixed", "value": 7.5},
+                         "solver": {"method": "bdf", "order": 1,
+                                    "relative": "1e-4", "absolute": "1e-8"}}}
+
+
+def test_managerSettings():
+    """Settings of simulation.yaml are translated for the Manager"""
+    settings = manager_settings(job_config("data/"))
+    assert settings.get("solver").get("rtol") == 1e-4
+    assert settings.get("solver").get("atol") == 1e-8
+    assert settings.get("ph") == {"method": "fixed", "value": 7.5}
+
+
+def test_serverJobs(tmp_path):
+    """Jobs stream their progress and can be cancelled"""
+    folder = short_folder(tmp_path)
+    config = job_config(folder)
+
+    async def session():
+        server = await JobServer(port=0, workers=1, preload=[folder],
+                                 history=1).start()
+        try:
+            message = {"action": "submit", "job": config}
+            events = [event async for event in
+                      request(message, port=server.port)]
+            # -- a longer job is cancelled after its current interval
+            message = {"action": "submit", "watch": False,
+                       "job": job_config(short_folder(tmp_path, 50))}
+            first = request(message, port=server.port)
+            job = [event async for event in first][0].get("job")
+            cancel = {"action": "cancel", "job": job}
+            replies = [event async for event in
+                       request(cancel, port=server.port)]
+            watched = [event async for event in
+                       request({"action": "watch", "job": job},
+                               port=server.port)]
+            status = [event async for event in
+                      request({"action": "status"}, port=server.port)]
+            return events, replies, watched, status, job
+        finally:
+            await server.close()
+
+    events, replies, watched, status, job = asyncio.run(session())
+    kinds = [event.get("event") for event in events]
+    assert kinds == ["accepted", "started"] + ["progress"] * 3 + ["done"]
+    assert [event.get("interval") for event in events[2:5]] == [1, 2, 3]
+    # -- the result matches a local run of the same job
+    local = Manager(folder, **manager_settings(config))
+    local.start()
+    result = events[-1].get("result")
+    testing.assert_allclose(result.get("state"), local.result[-1][2:],
+                            rtol=1e-6)
+    assert replies[0].get("event") == "cancelling"
+    assert watched[-1].get("event") == "cancelled"
+    # -- only the record of the last job that ended is kept
+    assert [item.get("job") for item in status[0].get("jobs")] == [job]
@@ -0,0 +1,66 @@
+import pickle
+from multiprocessing import Pool
+
+import numpy as np
+import pytest
+from numpy import testing
+from boyle import Dataset, Manager
+from boyle.core.load import from_localpath
+from boyle.core.internals.constant import KineticConstant, AcidConstant
+from boyle import shared
+from boyle.shared import SharedInputs, ResultSlab, result_rows, run_task
+
+
+def short_data(rows=2):
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return _data
+
+
+def test_sharedInputs():
+    """Shared inputs are read-only views restoring the constant classes"""
+    _data = short_data()
+    with SharedInputs(_data) as inputs:
+        assert len(pickle.dumps(inputs)) < 1024
+        loaded = pickle.loads(pickle.dumps(inputs)).load()
+        assert isinstance(loaded["Const1"], KineticConstant)
+        assert isinstance(loaded["Const2"], AcidConstant)
+        testing.assert_array_equal(loaded["feed"], _data["feed"])
+        with pytest.raises(ValueError):
+            loaded["feed"][0, 0] = 0.
+
+
+def test_sharedRun():
+    """Workers write the same result as a local run into the slab"""
+    _data = short_data()
+    local = Manager(Dataset(**_data))
+    local.start()
+    with SharedInputs(_data) as inputs:
+        rows = result_rows(inputs.dataset(), 0.5)
+        with ResultSlab(2, rows) as slab:
+            with Pool(2) as pool:
+                report = pool.starmap(run_task, [
+                    (inputs, slab, task, dict(step_size=0.5))
+                    for task in range(2)])
+            assert [item.get("rows") for item in report] == \
+                [len(local.result)] * 2
+            testing.assert_array_equal(slab.read(1), np.asarray(local.result))
+
+
+def attached_after_detach(inputs):
+    """Blocks of the inputs attached before and after detaching"""
+    inputs.load()
+    before = sum(name in shared._attached for name in inputs.names())
+    inputs.detach()
+    return before, sum(name in shared._attached for name in inputs.names())
+
+
+def test_detach():
+    """Attached blocks are closed on detach and when the owner closes"""
+    inputs = SharedInputs(short_data())
+    with Pool(1) as pool:
+        assert pool.apply(attached_after_detach, (inputs,)) == (5, 0)
+    inputs.load()
+    assert all(name in shared._attached for name in inputs.names())
+    inputs.close()
+    assert not any(name in shared._attached for name in inputs.names())
@@ -0,0 +1,196 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from numpy import testing
+from boyle import Dataset, Manager
+from boyle.core.load import from_localpath
+from boyle.core.events import Event, state_ph
+from boyle.core.generic import RunContext, pHvalue
+from boyle.core.solver import state_scales, scaled_settings
+from boyle.manager import STANDARD_SOLVER, SCALED_SOLVER
+from boyle.tools.regression import constant_case
+
+
+def short_dataset(rows=5):
+    """Dataset of the test folder limited to the first feed rows"""
+    _data = from_localpath("data/")
+    _data["feed"] = _data["feed"][:rows]
+    return Dataset(**_data)
+
+
+def test_stateScales():
+    """Every state gets a positive scale and a matching atol"""
+    dataset = short_dataset()
+    scales = state_scales(dataset)
+    assert scales.shape == dataset.inoculum.get("value").shape
+    assert (scales > 0).all()
+    assert scales[0] == dataset.inoculum.get("value")[0]
+    settings = scaled_settings(SCALED_SOLVER, scales)
+    assert "atol_scale" not in settings
+    testing.assert_allclose(settings.get("atol"), 1e-6 * scales)
+    assert scaled_settings(STANDARD_SOLVER, scales) == STANDARD_SOLVER
+
+
+def test_pilot():
+    """Pilot picks an accepted candidate and keeps the dataset clean"""
+    manager = Manager(short_dataset(), model="network")
+    candidates = [("vode", STANDARD_SOLVER), ("lsoda", SCALED_SOLVER),
+                  ("bdf", dict(SCALED_SOLVER, rtol=1e-1))]
+    report = manager.pilot(candidates=candidates, duration=48)
+    assert len(report) == 3
+    times = [item.get("time") for item in report]
+    assert times == sorted(times)
+    chosen = [item for item in report if item.get("accepted")][0]
+    assert manager.integrator_name == chosen.get("integrator")
+    assert manager._solver_setting == chosen.get("settings")
+    assert manager._context.mu_max_data == []
+    assert not hasattr(manager._frame, "mu_max_data")
+    # -- the selected solver runs the simulation
+    result = np.asarray(manager.start().y_hat)
+    assert result.shape[1] == 35
+
+
+def test_datasetReuse():
+    """Runs on one dataset neither change it nor each other"""
+    dataset = short_dataset(rows=3)
+    inoculum = dataset.inoculum.get("value").copy()
+    runs = [Manager(dataset).start() for _ in range(2)]
+    # -- vode can not be shared by threads, the bdf solver can
+    with ThreadPoolExecutor(2) as pool:
+        runs += list(pool.map(
+            lambda _: Manager(dataset, integrator="bdf").start(), range(2)))
+    testing.assert_array_equal(dataset.inoculum.get("value"), inoculum)
+    assert not hasattr(dataset, "y_hat") and not hasattr(dataset, "debug")
+    results = [np.asarray(run.y_hat) for run in runs]
+    testing.assert_array_equal(results[0], results[1])
+    testing.assert_array_equal(results[2], results[3])
+    assert len(runs[0].mu_max_data) == 3
+    assert len(runs[0].debug) == len(runs[1].debug)
+    # -- the inputs are read from the dataset
+    assert runs[0].feed is dataset.feed
+
+
+def test_steadyState():
+    """Identical feed intervals at steady state are filled, not run"""
+    _data = constant_case("data/", days=10)
+    # -- a long first interval brings the reactor to steady state
+    _data["feed"][:, 0] += 1e4
+    dataset = Dataset(**_data)
+    settings = dict(model="reduced", step_size=8)
+    full = Manager(dataset, **settings)
+    full.start()
+    skipped = Manager(dataset, steady_state=True, **settings)
+    frame = skipped.start()
+    assert skipped.steady_states == [dict(start=1, end=9, time=10720.,
+                                          end_time=10936.)]
+    assert frame.steady_states == skipped.steady_states
+    assert skipped.statistics.get("steps") < full.statistics.get("steps")
+    reference = np.asarray(full.result)
+    result = np.asarray(skipped.result)
+    testing.assert_array_equal(result[:, :2], reference[:, :2])
+    testing.assert_allclose(result[-1, 2:31], reference[-1, 2:31],
+                            rtol=1e-3, atol=1e-6)
+    tail = result[result[:, 1] > 10720., 2:]
+    testing.assert_array_equal(tail[:, :29], np.tile(tail[0, :29],
+                                                     (len(tail), 1)))
+    assert np.all(np.diff(tail[:, 29:], axis=0) > 0)
+    # -- every row of the window has to be steady, not only the last
+    assert skipped._steady_rates(9) is not None
+    row = skipped.result[-3].copy()
+    row[2:21] *= 2
+    skipped.result[-3] = row
+    assert skipped._steady_rates(9) is None
+    coarse = Manager(dataset, steady_state={"fill": "coarse"}, **settings)
+    coarse.start()
+    days = np.arange(1, 10)
+    testing.assert_array_equal(np.asarray(coarse.result)[-9:, :2],
+                               np.column_stack([days, 10720. + 24 * days]))
+    # -- not yet at steady state after a month
+    early = Manager(Dataset(**constant_case("data/", days=10)),
+                    steady_state=True, **settings)
+    early.start()
+    assert early.steady_states == []
+
+
+def test_recovery():
+    """Failing intervals are retried by the recovery policy"""
+    dataset = short_dataset(rows=3)
+    reference = Manager(dataset)
+    reference.start()
+    failing = dict(STANDARD_SOLVER, nsteps=50)
+    recovered = Manager(dataset, solver=failing)
+    frame = recovered.start()
+    assert [item.get("recovery") for item in frame.recoveries] == ["bdf"]
+    assert len(frame.recoveries[0].get("failures")) == 4
+    # -- the logs of the failed attempts are dropped
+    direct = Manager(dataset, solver=failing, recovery=(
+        {"name": "bdf", "integrator": "bdf"},))
+    direct.start()
+    assert len(direct.recoveries[0].get("failures")) == 1
+    for name in ("debug", "mu_max_data", "hc_data"):
+        assert len(getattr(frame, name)) == \
+            len(getattr(direct._context, name))
+    testing.assert_allclose(np.asarray(recovered.result)[:, 2:],
+                            np.asarray(reference.result)[:, 2:], rtol=0.05,
+                            atol=1e-6)
+    # -- an interrupted interval is neither accepted nor retried
+    interrupted = Manager(dataset)
+    initialize, intervals = interrupted.initialize_solver, []
+
+    def initialize_interrupted(*args):
+        # -- Ctrl-C during the second interval
+        initialize(*args)
+        intervals.append(args)
+        if len(intervals) == 2:
+            def interrupt(t, **kwargs):
+                raise KeyboardInterrupt
+            interrupted._solver.integrate = interrupt
+
+    interrupted.initialize_solver = initialize_interrupted
+    payload = interrupted.start()
+    assert payload["error"].startswith("KEYBOARD INTERRUPT")
+    assert payload["recoveries"] == []
+    assert {row[0] for row in payload["result"]} == {0}
+    # -- without recovery the run goes on from where the solver failed
+    unattended = Manager(dataset, solver=failing, recovery=())
+    unattended.start()
+    assert unattended.recoveries == []
+    assert len(unattended.result) < len(reference.result)
+
+
+def test_events():
+    """Crossings are located between coarse output steps"""
+    dataset = short_dataset(rows=3)
+    watched = Manager(dataset, step_size=24,
+                      events=[Event("ac_ace", 0.19, "both"),
+                              ("ac_ace", 0.19, "up")])
+    watched.start()
+    assert [item.get("direction") for item in watched.events] == ["down"]
+    crossing = watched.events[0].get("time")
+    assert 0 < crossing < 24 and len(watched.result) == 32
+    # -- a terminal event ends the run at the threshold
+    stopped = Manager(dataset, step_size=24, events=[
+        {"column": "ac_ace", "threshold": 0.19, "direction": "down",
+         "terminal": True}])
+    frame = stopped.start()
+    result = np.asarray(stopped.result)
+    assert frame.events[0].get("terminal") and result.shape[0] == 1
+    testing.assert_allclose(result[-1, 1], crossing)
+    testing.assert_allclose(result[-1, 14], 0.19, rtol=1e-3)
+    # -- the pH is computed from the state
+    fsolve = {"method": "fsolve"}
+    acidic = Manager(dataset, step_size=24, ph=fsolve, events=[
+        Event("pH", 6.8, "down", terminal=True)])
+    acidic.start()
+    context = RunContext(dataset)
+    context.move_index_for_iteration(index=0)
+    last = np.asarray(acidic.result)[-1]
+    assert 96 < last[1] < 144
+    testing.assert_allclose(state_ph(last[2:], context.henry_constants,
+                                     pHvalue("fsolve", None)), 6.8,
+                            atol=1e-3)
+    profiled = Manager(dataset, step_size=24, ph=fsolve, profile="step",
+                       events=[Event("pH", 6.8, "down", terminal=True)])
+    profiled.start()
+    testing.assert_allclose(profiled.events[0].get("time"), last[1],
+                            rtol=1e-3)
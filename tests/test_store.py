@@ -0,0 +1,72 @@
+import h5py
+import numpy as np
+import pytest
+from boyle import Dataset, ScenarioStore
+from boyle.core.load import from_localpath
+from boyle.core import store
+from boyle.cli import expand_jobs, run_batch
+from tests.test_cli import job_file
+
+
+def test_scenarioStore(tmp_path):
+    """Runs of parallel workers are indexed and found by their inputs"""
+    jobs = expand_jobs([job_file(tmp_path, "sweep", sweep={
+        "settings.step_size": [2., 4.], "settings.ph.method": ["fixed"]})])
+    folder = str(tmp_path / "store")
+    reports = run_batch(jobs, processes=2, stream=None, store=folder,
+                        profile="compact")
+    assert [report.get("status") for report in reports] == ["done"] * 2
+    store = ScenarioStore(folder)
+    assert len(store) == 2
+    found = store.query(step_size__gt=3, ph_method="fixed")
+    assert [run.name for run in found] == ["sweep_001"]
+    assert found[0].parameters == {"settings.step_size": 4.,
+                                   "settings.ph.method": "fixed"}
+    assert store.query(temp__gt=found[0].inputs["temp"] + 1) == []
+    assert len(store.query(step_size__in=[2., 4.])) == 2
+    solution = found[0].getDataset("solution")
+    assert solution.shape == (found[0].rows, 35)
+    assert found[0].getHeaders("solution")[:2] == ["run_no", "time"]
+    with h5py.File(reports[1].get("output"), "r") as stored:
+        np.testing.assert_allclose(stored["Output/solution"][-1], solution[-1])
+    # -- the same jobs replace their runs
+    run_batch(jobs, stream=None, store=folder)
+    assert len(ScenarioStore(folder)) == 2
+    assert store[found[0].key].record["created"] > found[0].record["created"]
+    with pytest.raises(ValueError):
+        store.query(step_size__near=2)
+
+
+def test_lockFile(tmp_path, monkeypatch):
+    """Without fcntl the index is locked by msvcrt"""
+    calls = []
+
+    class Locking:
+        LK_LOCK, LK_UNLCK = 1, 0
+
+        @staticmethod
+        def locking(fileno, mode, size):
+            calls.append(mode)
+
+    monkeypatch.setattr(store, "fcntl", None)
+    monkeypatch.setattr(store, "msvcrt", Locking, raising=False)
+    scenarios = ScenarioStore(str(tmp_path))
+    scenarios.append(dict(key="a", status="done"))
+    scenarios.append(dict(key="b", status="done"))
+    assert calls == [1, 0, 1, 0]
+    assert [record.get("key") for record in scenarios.records()] == \
+        ["a", "b"]
+
+
+def test_scenarioKey():
+    """Keys follow the input data, not the path they are read from"""
+    _data = from_localpath("data/")
+    config = {"metadata": {"name": "a", "data": "./data"},
+              "settings": {"step_size": 2.}}
+    key = store.scenario_key(config, Dataset(**_data))
+    assert key == store.scenario_key(
+        {"metadata": {"name": "b", "data": "./copy"},
+         "settings": {"step_size": 2.}}, Dataset(**_data))
+    _data["feed"] = _data["feed"].copy()
+    _data["feed"][0, 4] *= 2
+    assert key != store.scenario_key(config, Dataset(**_data))